@@ -1,27 +1,29 @@
 import os
-from flask import Flask, render_template, request, jsonify, make_response
+from flask import Flask, render_template, request, jsonify, make_response, redirect, send_file, url_for
 import pandas as pd
 import pymongo
 from datetime import datetime, timedelta
 import markdown
 from markupsafe import Markup
-import matplotlib
-matplotlib.use('Agg')
 import logging
-from functools import lru_cache
 import threading
-from flask_caching import Cache
-import requests
-from bs4 import BeautifulSoup
 import time
-import random
 import tenacity
 from tenacity import wait_exponential, wait_random
-from collections import deque
 from dotenv import load_dotenv
 import traceback
+import copy
+import hashlib
+from datetime import timezone
 
 from visualizations.stock_plots import (
+    StockDataContext,
+    compute_monthly_returns,
+    get_data_last_modified,
+    get_data_version,
+    is_range_stored,
+    get_indicators,
+    get_shareholders_breakdown,
     get_stock_data,
     plot_volume_chart,
     plot_line_chart,
@@ -31,11 +33,22 @@ from visualizations.stock_plots import (
     plot_monthly_returns_heatmap,
     get_internal_reports
 )
-from models.report_generator import (
-    create_reportlab_pdf,
-    generate_stock_report_data,
-    get_stock_summary,
-)
+from visualizations.chart_cache import chart_key, submit_cached_charts
+from models.chart_data import history_payload, indicators_payload, monthly_returns_payload, shareholders_payload
+from models.article_fetcher import ArticleFetcher, create_article_text_cache
+from models.llm_client import LLM_MODEL, create_llm
+from models.llm_scheduler import PRIORITY_HIGH, LLMScheduler, create_quota_state
+from models.near_duplicates import ArticleClusterIndex, ARTICLE_CLUSTER_COLLECTION
+from models.news_index import NEWS_EMBEDDER, semantic_news
+from models.news_feed import ensure_news_indexes, get_news_page, get_source_stats, get_trending
+from models.news_sources import get_news_collections
+from models.report_jobs import ReportJobQueue, JOB_DONE, JOB_EXPIRED, JOB_FAILED
+from models.ticker_index import get_ticker_index, is_known_ticker
+from models.sentiment import apply_stored_sentiment, classify_articles, SENTIMENT_PROMPT_VERSION
+from models.sentiment_store import SentimentStore, SENTIMENT_COLLECTION
+from models.lazy import lazy_singleton
+from models.single_flight import SingleFlight, single_flight_stats
+from models.tiered_cache import CACHE_DIR, DiskTier, MemoryTier, TieredCache, cache_stats
 
 logging.basicConfig(
     level=logging.INFO,
@@ -54,23 +67,50 @@ app = Flask(__name__,
             template_folder='templates')
 
 
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+# Clients, models and heavy modules below are created on first use through
+# accessor functions, so importing the app stays fast for every worker process.
 
+@lazy_singleton
+def get_db():
+    client = pymongo.MongoClient(MONGO_URI,
+                                 maxPoolSize=10,
+                                 connectTimeoutMS=5000,
+                                 serverSelectionTimeoutMS=5000)
+    return client["Soni_Agent"]
 
-client = pymongo.MongoClient(MONGO_URI,
-                             maxPoolSize=10,
-                             connectTimeoutMS=5000,
-                             serverSelectionTimeoutMS=5000)
-db = client["Soni_Agent"]
+@lazy_singleton
+def get_news_sources():
+    return get_news_collections(get_db())
 
-news_collections = {
-    "cafef": db["cafef_vn"],
-    "vnexpress": db["vnexpress_net"],
-    "tinnhanhchungkhoan": db["www_tinnhanhchungkhoan_vn"]
-}
+@lazy_singleton
+def get_llm():
+    return create_llm()
+
+@lazy_singleton
+def get_sentiment_store():
+    return SentimentStore(get_db()[SENTIMENT_COLLECTION], LLM_MODEL, SENTIMENT_PROMPT_VERSION)
+
+@lazy_singleton
+def get_article_clusters():
+    return ArticleClusterIndex(get_db()[ARTICLE_CLUSTER_COLLECTION])
 
+@lazy_singleton
+def get_article_fetcher():
+    return ArticleFetcher(cache=create_article_text_cache())
+
+def get_report_generator():
+    """Returns models.report_generator, importing ReportLab and Matplotlib on first use."""
+    from models import report_generator
+    return report_generator
+
+def create_news_indexes():
+    try:
+        ensure_news_indexes(get_news_sources())
+    except Exception as e:
+        logger.error(f"Error creating news indexes: {str(e)}")
 
-llm_lock = threading.Lock()
+# Index builds wait on the server, so they run off the import path.
+threading.Thread(target=create_news_indexes, name="news-indexes", daemon=True).start()
 
 
 retry_config = {
@@ -81,47 +121,41 @@ retry_config = {
 }
 
 
-api_call_timestamps = deque(maxlen=100)
-MAX_CALLS_PER_MINUTE = 10
-RATE_LIMIT_WINDOW = 60  
+# Call window and token budget are shared with the other workers on this host
+# and with sentiment_worker.py (LLM_QUOTA_BACKEND=file).
+llm_scheduler = LLMScheduler(create_quota_state())
 
+# One of news_feed.TRENDING_WINDOWS: 24h, 7d, 30d or all.
+TRENDING_WINDOW = os.getenv("TRENDING_WINDOW", "all")
 
-DAILY_TOKEN_BUDGET = 100000
-tokens_used_today = 0
-token_usage_reset_time = datetime.now()
+# "inline" classifies unseen articles during the request; "precomputed" only
+# reads results written by sentiment_worker.py.
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "inline")
 
+# Finished sentiment analyses per (ticker, start, end), shared by all workers;
+# the TTL bounds how long newly published articles can be missing.
+SENTIMENT_CACHE_TTL = int(os.getenv("SENTIMENT_CACHE_TTL", "600"))
+sentiment_cache = TieredCache("sentiment", [
+    MemoryTier(int(os.getenv("SENTIMENT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))), ttl=SENTIMENT_CACHE_TTL),
+    DiskTier(os.path.join(CACHE_DIR, "sentiment"), SENTIMENT_CACHE_TTL,
+             int(os.getenv("SENTIMENT_DISK_CACHE_MAX_BYTES", str(128 * 1024 * 1024))))
+])
+sentiment_flight = SingleFlight("sentiment", copy=copy.deepcopy)
 
-api_priority_queue = []
-PRIORITY_HIGH = 0
-PRIORITY_MEDIUM = 1
-PRIORITY_LOW = 2
+# Up to NEWS_SEMANTIC_K untagged articles whose semantic similarity to the
+# ticker is at least NEWS_SEMANTIC_MIN_SCORE are added to sentiment analysis.
+# Unset, the threshold is calibrated per embedder (see models/news_index.py).
+# Off by default with the lexical hashing embedder, whose scores favour
+# generic company words over the company itself.
+NEWS_SEMANTIC_K = int(os.getenv("NEWS_SEMANTIC_K", "10" if NEWS_EMBEDDER == "vertex" else "0"))
+NEWS_SEMANTIC_MIN_SCORE = float(os.getenv("NEWS_SEMANTIC_MIN_SCORE")) if os.getenv("NEWS_SEMANTIC_MIN_SCORE") else None
 
-try:
-    from langchain_google_vertexai import ChatVertexAI
-    llm = ChatVertexAI(
-        model="gemini-2.0-flash",
-        temperature=0.0,
-        max_tokens=1000,
-        max_retries=3,
-        retry_min_seconds=2,
-        retry_max_seconds=30
-    )
-except Exception as e:
-    logger.error(f"Error initializing LLM: {str(e)}")
-    llm = None
-
-def is_rate_limited():
-    now = time.time()
-    while api_call_timestamps and api_call_timestamps[0] < now - RATE_LIMIT_WINDOW:
-        api_call_timestamps.popleft()
-    return len(api_call_timestamps) >= MAX_CALLS_PER_MINUTE
-
-def is_token_budget_exceeded():
-    global tokens_used_today, token_usage_reset_time
-    if (datetime.now() - token_usage_reset_time).days > 0:
-        tokens_used_today = 0
-        token_usage_reset_time = datetime.now()
-    return tokens_used_today >= DAILY_TOKEN_BUDGET
+# Seconds browsers may reuse chart data before revalidating with ETag/Last-Modified.
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+
+# /generate_report streams the PDF when the job finishes within this many
+# seconds and otherwise returns a page that polls the job status.
+REPORT_SYNC_WAIT = float(os.getenv("REPORT_SYNC_WAIT", "20"))
 
 def is_rate_limit_error(exception):
     error_msg = str(exception).lower()
@@ -141,17 +175,6 @@ def llm_retry_decorator(func):
         before_sleep=lambda retry_state: logger.warning(f"Rate limit hit, retrying in {retry_state.next_action.sleep} seconds...")
     )
     def wrapper(*args, **kwargs):
-        if is_rate_limited():
-            delay = random.uniform(1, 5)
-            logger.info(f"Rate limit approaching, adding delay of {delay:.2f}s")
-            time.sleep(delay)
-        
-        if is_token_budget_exceeded():
-            logger.warning("Token budget exceeded, using fallback method")
-            raise Exception("Token budget exceeded")
-        
-        api_call_timestamps.append(time.time())
-        
         return func(*args, **kwargs)
     
     return wrapper
@@ -184,6 +207,8 @@ def analyze():
     ticker = request.args.get('ticker', '').upper()
     if not ticker:
         return render_template('index.html', error="Vui lòng nhập mã cổ phiếu")
+    if not is_known_ticker(ticker):
+        return render_template('index.html', error=f"Không tìm thấy mã cổ phiếu {ticker}")
     
     end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
     start_date = request.args.get('start_date', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
@@ -196,23 +221,45 @@ def analyze():
     except ValueError:
         return render_template('index.html', error="Định dạng ngày không hợp lệ")
     
-    stock_summary = get_stock_summary(ticker, start_date, end_date)
+    data_context = StockDataContext(ticker, start_date, end_date).load()
+    
+    price_args = (ticker, start_date, end_date)
+    data_version = get_data_version(ticker)
+    chart_keys = {
+        name: chart_key(ticker, name, start_date, end_date, data_version=data_version)
+        for name in ['line_chart', 'volume_chart', 'candlestick_chart', 'volume_price_chart', 'returns_heatmap']
+    }
+    chart_keys['shareholders_chart'] = chart_key(ticker, 'shareholders_chart', data_version=datetime.now().strftime('%Y-%m-%d'))
+    chart_batch = submit_cached_charts({
+        'line_chart': (plot_line_chart, price_args, {'context': data_context}),
+        'volume_chart': (plot_volume_chart, price_args, {'context': data_context}),
+        'candlestick_chart': (plot_candlestick, price_args, {'context': data_context}),
+        'volume_price_chart': (plot_volume_and_closed_price, price_args, {'context': data_context}),
+        # Fetched here rather than in the render process, and only on a cache
+        # miss, so it shares one upstream call with /api/stock/shareholders.
+        'shareholders_chart': lambda: (plot_shareholders_piechart, (ticker,),
+                                       {'breakdown': get_shareholders_breakdown(ticker)}),
+        'returns_heatmap': (plot_monthly_returns_heatmap, price_args, {'context': data_context}),
+    }, chart_keys)
+    
+    stock_summary = get_report_generator().get_stock_summary(ticker, start_date, end_date, context=data_context)
     if stock_summary is None:
         stock_summary = "Không có dữ liệu cho mã cổ phiếu này."
     
-    line_chart, _ = plot_line_chart(ticker, start_date, end_date) or ("Không có dữ liệu", None)
-    volume_chart, _ = plot_volume_chart(ticker, start_date, end_date) or ("Không có dữ liệu", None)
-    candlestick_chart, _ = plot_candlestick(ticker, start_date, end_date) or ("Không có dữ liệu", None)
-    volume_price_chart, _ = plot_volume_and_closed_price(ticker, start_date, end_date) or ("Không có dữ liệu", None)
-    shareholders_chart, _ = plot_shareholders_piechart(ticker) or ("Không có dữ liệu", None)
-    returns_heatmap, _ = plot_monthly_returns_heatmap(ticker, start_date, end_date) or ("Không có dữ liệu", None)
-    
     internal_reports, _ = get_internal_reports(ticker)
     if isinstance(internal_reports, pd.DataFrame):
         internal_reports = internal_reports.to_dict(orient='records') if not internal_reports.empty else []
     
     sentiment_data = get_sentiment_analysis(ticker, start_date, end_date)
     
+    charts = chart_batch.results()
+    line_chart, _ = charts['line_chart'] or ("Không có dữ liệu", None)
+    volume_chart, _ = charts['volume_chart'] or ("Không có dữ liệu", None)
+    candlestick_chart, _ = charts['candlestick_chart'] or ("Không có dữ liệu", None)
+    volume_price_chart, _ = charts['volume_price_chart'] or ("Không có dữ liệu", None)
+    shareholders_chart, _ = charts['shareholders_chart'] or ("Không có dữ liệu", None)
+    returns_heatmap, _ = charts['returns_heatmap'] or ("Không có dữ liệu", None)
+    
     template_data = {
         'ticker': ticker,
         'start_date': start_date,
@@ -281,93 +328,346 @@ def analyze():
 #         logger.error(traceback.format_exc())
 #         return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
 
-@app.route('/generate_report')
-def generate_report():
-    try:
-        ticker = request.args.get('ticker', '').upper()
-        if not ticker:
-            return jsonify({"error": "Vui lòng nhập mã cổ phiếu"}), 400
-            
-        end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
-        start_date = request.args.get('start_date', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-        
-        include_plots = request.args.getlist('include_plots')
-        if not include_plots:
-            include_plots = ['line', 'volume', 'candlestick', 'volume_price', 'shareholders', 'heatmap']
-            
-        include_sentiment = request.args.get('include_sentiment') == 'true'
+def build_report_pdf(ticker, start_date, end_date, include_plots, include_sentiment, data_version=None):
+    """Builds the PDF for a report job; data_version only distinguishes cached results."""
+    sentiment_data = None
+    if include_sentiment:
+        sentiment_data = get_sentiment_analysis(ticker, start_date, end_date)
         
-        sentiment_data = None
-        if include_sentiment:
-            sentiment_data = get_sentiment_analysis(ticker, start_date, end_date)
-            
-        logger.info(f"Generating report for {ticker} from {start_date} to {end_date}")
+    logger.info(f"Generating report for {ticker} from {start_date} to {end_date}")
+    
+    report_generator = get_report_generator()
+    report_data = report_generator.generate_stock_report_data(
+        ticker,
+        start_date,
+        end_date,
+        include_plots=include_plots,
+        sentiment_data=sentiment_data
+    )
+    
+    return report_generator.create_reportlab_pdf(report_data)
+
+report_jobs = ReportJobQueue(build_report_pdf)
+
+def report_params_from_request():
+    """Reads report options from the query string or form; raises ValueError when invalid."""
+    ticker = request.values.get('ticker', '').upper()
+    if not ticker:
+        raise ValueError("Vui lòng nhập mã cổ phiếu")
+    if not is_known_ticker(ticker):
+        raise ValueError(f"Không tìm thấy mã cổ phiếu {ticker}")
         
-        report_data = generate_stock_report_data(
-            ticker,
-            start_date,
-            end_date,
-            include_plots=include_plots,
-            sentiment_data=sentiment_data
+    end_date = request.values.get('end_date', datetime.now().strftime('%Y-%m-%d'))
+    start_date = request.values.get('start_date', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError as e:
+        raise ValueError("Định dạng ngày không hợp lệ") from e
+    
+    include_plots = request.values.getlist('include_plots')
+    if not include_plots:
+        include_plots = ['line', 'volume', 'candlestick', 'volume_price', 'shareholders', 'heatmap']
+        
+    return {
+        "ticker": ticker,
+        "start_date": start_date,
+        "end_date": end_date,
+        "include_plots": sorted(set(include_plots)),
+        "include_sentiment": request.values.get('include_sentiment') == 'true',
+        "data_version": get_data_version(ticker)
+    }
+
+def report_job_response(job, status_code=200):
+    payload = job.to_dict()
+    payload["status_url"] = url_for('api_report_status', job_id=job.id)
+    payload["download_url"] = url_for('api_report_download', job_id=job.id)
+    return jsonify(payload), status_code
+
+def send_report(job):
+    """Sends the job's PDF, or returns None after marking the job expired when the file is gone."""
+    ticker = job.params["ticker"]
+    try:
+        return send_file(
+            job.path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'{ticker}_report_{datetime.now().strftime("%Y%m%d")}.pdf'
         )
+    except FileNotFoundError:
+        logger.warning(f"PDF of report job {job.id} is no longer available")
+        report_jobs.mark_expired(job)
+        return None
+
+def rebuild_report(job):
+    """Sends the user through /generate_report again, which rebuilds an expired report."""
+    params = job.params
+    return redirect(url_for('generate_report',
+                            ticker=params["ticker"],
+                            start_date=params["start_date"],
+                            end_date=params["end_date"],
+                            include_plots=params["include_plots"],
+                            include_sentiment='true' if params["include_sentiment"] else 'false'))
+
+@app.route('/generate_report')
+def generate_report():
+    """Queues the report and returns the PDF if it is ready within REPORT_SYNC_WAIT seconds, else a polling page."""
+    try:
+        params = report_params_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
         
-        pdf_result = create_reportlab_pdf(report_data)
+    try:
+        job = report_jobs.submit(params)
+        job.wait(REPORT_SYNC_WAIT)
         
-        if pdf_result is None:
-            logger.error("PDF generation returned None")
-            return jsonify({"error": "Không thể tạo báo cáo PDF - Kết quả trống"}), 500
-            
-        response = make_response(pdf_result)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={ticker}_report_{datetime.now().strftime("%Y%m%d")}.pdf'
+        if job.status == JOB_FAILED:
+            return jsonify({"error": f"Không thể tạo báo cáo PDF: {job.error}"}), 500
+        if job.status == JOB_DONE:
+            return send_report(job) or rebuild_report(job)
         
-        return response
+        return render_template('report_status.html',
+                               ticker=params["ticker"],
+                               start_date=params["start_date"],
+                               end_date=params["end_date"],
+                               status_url=url_for('api_report_status', job_id=job.id),
+                               download_url=url_for('api_report_download', job_id=job.id))
         
     except Exception as e:
-        logger.error(f"Unexpected error in generate_report_new: {str(e)}")
+        logger.error(f"Unexpected error in generate_report: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
 
+@app.route('/api/reports', methods=['POST'])
+def api_report_submit():
+    try:
+        params = report_params_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = report_jobs.submit(params)
+    return report_job_response(job, 200 if job.status == JOB_DONE else 202)
+
+@app.route('/api/reports/<job_id>')
+def api_report_status(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy yêu cầu tạo báo cáo"}), 404
+    return report_job_response(job)
+
+@app.route('/api/reports/<job_id>/download')
+def api_report_download(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy yêu cầu tạo báo cáo"}), 404
+    if job.status == JOB_FAILED:
+        return jsonify({"error": f"Không thể tạo báo cáo PDF: {job.error}"}), 500
+    if job.status == JOB_EXPIRED:
+        return rebuild_report(job)
+    if job.status != JOB_DONE:
+        return report_job_response(job, 409)
+    return send_report(job) or rebuild_report(job)
+
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '')
+    index = get_ticker_index()
+    if index is None:
+        return jsonify({"error": "Danh sách mã cổ phiếu không khả dụng"}), 503
+    return jsonify({
+        "query": query,
+        "results": index.search(query, limit=request.args.get('limit', 10, type=int))
+    })
+
+@app.route('/api/news')
+def api_news():
+    try:
+        page = get_news_page(
+            get_news_sources(),
+            limit=request.args.get('limit', 20, type=int),
+            cursor=request.args.get('cursor'),
+            ticker=request.args.get('ticker', '').upper() or None,
+            sources=request.args.getlist('source') or None
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in api_news: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
+
+@app.route('/api/news/stats')
+def api_news_stats():
+    try:
+        return jsonify(get_source_stats(get_db(), get_news_sources()))
+    except Exception as e:
+        logger.error(f"Error in api_news_stats: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
+
+def _validators(etag_parts, last_modified):
+    etag = hashlib.sha1(repr(etag_parts).encode('utf-8')).hexdigest() if etag_parts is not None else None
+    modified = None
+    if last_modified is not None:
+        modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+    return etag, modified
+
+def request_not_modified(etag_parts, last_modified=None):
+    """True when the request's If-None-Match or If-Modified-Since matches these validators."""
+    etag, modified = _validators(etag_parts, last_modified)
+    if etag and request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if modified and request.if_modified_since:
+        return modified <= request.if_modified_since
+    return False
+
+def conditional_json(build_payload, etag_parts=None, last_modified=None):
+    """Serves build_payload() as JSON with ETag/Last-Modified validators.
+
+    When etag_parts identifies the data (e.g. it includes the price store
+    version), a matching If-None-Match or If-Modified-Since is answered with
+    304 before the payload is built or serialized. Otherwise the ETag is a
+    hash of the response body.
+    """
+    etag, modified = _validators(etag_parts, last_modified)
+    not_modified = etag_parts is not None and request_not_modified(etag_parts, last_modified)
+
+    response = make_response('', 304) if not_modified else jsonify(build_payload())
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    if modified:
+        response.last_modified = modified
+    response.cache_control.public = True
+    response.cache_control.max_age = API_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+def price_series_json(kind, symbol, start_date, end_date, interval, options, build_payload):
+    """Serves build_payload(df) for a price range with validators from the price store version.
+
+    When the store already covers the range, revalidation is answered from
+    the version alone, before any bars are read or fetched. Ranges that need
+    fetching (e.g. ending today) are loaded first so the version includes
+    the new bars.
+    """
+    if is_range_stored(symbol, start_date, end_date, interval):
+        version = get_data_version(symbol, interval)
+        etag_parts = (kind, symbol, interval, start_date, end_date, options, version)
+        last_modified = get_data_last_modified(symbol, interval)
+        if version is not None and request_not_modified(etag_parts, last_modified):
+            return conditional_json(None, etag_parts, last_modified)
+
+    df = get_stock_data(symbol, start_date, end_date, interval)
+    if df is None or df.empty:
+        return jsonify({"error": "Không thể lấy dữ liệu cổ phiếu"}), 404
+
+    version = get_data_version(symbol, interval)
+    etag_parts = None
+    if version is not None:
+        etag_parts = (kind, symbol, interval, start_date, end_date, options, version)
+    return conditional_json(lambda: build_payload(df), etag_parts, get_data_last_modified(symbol, interval))
+
+def parse_price_args():
+    """Reads symbol/start_date/end_date/interval query args; raises ValueError when invalid."""
+    symbol = request.args.get('symbol', '').upper()
+    if not symbol:
+        raise ValueError("Vui lòng nhập mã cổ phiếu")
+    if not is_known_ticker(symbol):
+        raise ValueError(f"Không tìm thấy mã cổ phiếu {symbol}")
+    end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
+    start_date = request.args.get('start_date', (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d'))
+    interval = request.args.get('interval', '1D')
+    try:
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError as e:
+        raise ValueError("Định dạng ngày không hợp lệ") from e
+    if start_dt > end_dt:
+        raise ValueError("Ngày bắt đầu phải trước ngày kết thúc")
+    return symbol, start_date, end_date, interval
+
+@app.route('/api/stock/history')
+def api_stock_history():
+    try:
+        symbol, start_date, end_date, interval = parse_price_args()
+        max_points = request.args.get('max_points', type=int)
+        if max_points is not None and max_points < 2:
+            raise ValueError("max_points phải lớn hơn 1")
+
+        return price_series_json('history', symbol, start_date, end_date, interval, max_points,
+                                 lambda df: history_payload(symbol, df, interval, max_points))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in api_stock_history: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
+
+@app.route('/api/stock/indicators')
+def api_stock_indicators():
+    try:
+        symbol, start_date, end_date, interval = parse_price_args()
+        names = [name for name in request.args.get('names', '').split(',') if name] or None
+
+        return price_series_json(
+            'indicators', symbol, start_date, end_date, interval, names,
+            lambda df: indicators_payload(symbol, df, get_indicators(symbol, df, interval), interval, names)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in api_stock_indicators: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
+
+@app.route('/api/stock/monthly_returns')
+def api_stock_monthly_returns():
+    try:
+        symbol, start_date, end_date, interval = parse_price_args()
+
+        return price_series_json(
+            'monthly_returns', symbol, start_date, end_date, interval, None,
+            lambda df: monthly_returns_payload(symbol, compute_monthly_returns(df, symbol, interval))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error in api_stock_monthly_returns: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
+
+@app.route('/api/stock/shareholders')
+def api_stock_shareholders():
+    try:
+        symbol = request.args.get('symbol', '').upper()
+        if not symbol:
+            return jsonify({"error": "Vui lòng nhập mã cổ phiếu"}), 400
+        if not is_known_ticker(symbol):
+            return jsonify({"error": f"Không tìm thấy mã cổ phiếu {symbol}"}), 400
+
+        breakdown, error = get_shareholders_breakdown(symbol)
+        if breakdown is None:
+            return jsonify({"error": error}), 404
+        return conditional_json(lambda: shareholders_payload(symbol, breakdown))
+    except Exception as e:
+        logger.error(f"Error in api_stock_shareholders: {str(e)}")
+        return jsonify({"error": f"Lỗi hệ thống: {str(e)}"}), 500
 
 @app.route('/health')
 def health_check():
     status = {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "llm_available": llm is not None,
-        "api_calls_last_minute": len(api_call_timestamps),
-        "token_budget_remaining": DAILY_TOKEN_BUDGET - tokens_used_today
+        # null until the first analysis creates the model; health checks never load it.
+        "llm_available": get_llm() is not None if get_llm.loaded() else None,
+        "llm_scheduler": llm_scheduler.stats(),
+        "caches": cache_stats(),
+        "single_flight": single_flight_stats(),
+        "report_jobs": report_jobs.stats()
     }
     return jsonify(status)
 
-def get_trending_stocks(limit=10):
+def get_trending_stocks(limit=10, window=TRENDING_WINDOW):
     """Get trending stocks based on news frequency"""
     try:
-        pipeline = [
-            {"$match": {"tickers": {"$exists": True, "$ne": None}}},
-            {"$unwind": "$tickers"},  
-            {"$group": {"_id": "$tickers", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": limit}
-        ]
-        
-        results = []
-        for collection_name, collection in news_collections.items():
-            collection_results = list(collection.aggregate(pipeline))
-            results.extend(collection_results)
-        
-        ticker_counts = {}
-        for result in results:
-            ticker = result["_id"]
-            if ticker in ticker_counts:
-                ticker_counts[ticker] += result["count"]
-            else:
-                ticker_counts[ticker] = result["count"]
-        
-        trending = [{"ticker": ticker, "count": count} for ticker, count in ticker_counts.items()]
-        trending.sort(key=lambda x: x["count"], reverse=True)
-        
-        return trending[:limit]
+        return get_trending(get_db(), window=window, limit=limit)
     except Exception as e:
         logger.error(f"Error getting trending stocks: {str(e)}")
         return []
@@ -375,26 +675,7 @@ def get_trending_stocks(limit=10):
 def get_recent_news(limit=20):
     """Get recent news from all collections"""
     try:
-        all_news = []
-        for collection_name, collection in news_collections.items():
-            news = list(collection.find(
-                {"post_time": {"$exists": True}},
-                {"_id": 0, "title": 1, "post_time": 1, "full_url": 1, "tickers": 1, "description": 1}
-            ).sort("post_time", -1).limit(limit))
-            
-            for item in news:
-                item["url"] = item.get("full_url", "")
-                item["source"] = collection_name
-                if "tickers" in item and item["tickers"]:
-                    item["ticker"] = item["tickers"][0]
-                if "post_time" in item:
-                    item["date"] = datetime.fromtimestamp(item["post_time"]).strftime('%Y-%m-%d')
-            
-            all_news.extend(news)
-        
-        all_news.sort(key=lambda x: x.get("post_time", 0), reverse=True)
-        
-        return all_news[:limit]
+        return get_news_page(get_news_sources(), limit=limit)["items"]
     except Exception as e:
         logger.error(f"Error getting recent news: {str(e)}")
         return []
@@ -402,73 +683,58 @@ def get_recent_news(limit=20):
 def get_sources_stats():
     """Get statistics about news sources"""
     try:
-        stats = {}
-        for source, collection in news_collections.items():
-            count = collection.count_documents({})
-            stats[source] = count
-        
-        return stats
+        stats = get_source_stats(get_db(), get_news_sources())
+        return {source: source_stats["total"] for source, source_stats in stats.items()}
     except Exception as e:
         logger.error(f"Error getting source stats: {str(e)}")
         return {}
 
-@lru_cache(maxsize=100)
-def fetch_article_content(url):
-    """Fetch and extract content from a news article URL"""
+def find_semantic_news(ticker, start_timestamp, end_timestamp):
+    """Articles similar to the ticker from the FAISS index, shaped like the tagged news items."""
+    if NEWS_SEMANTIC_K <= 0:
+        return []
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        content = ""
-        
-        if "cafef.vn" in url:
-            article_body = soup.select_one('.detail-content')
-            if article_body:
-                content = article_body.get_text(separator='\n', strip=True)
-        
-        elif "vnexpress.net" in url:
-            article_body = soup.select_one('.fck_detail')
-            if article_body:
-                content = article_body.get_text(separator='\n', strip=True)
-        
-        elif "tinnhanhchungkhoan.vn" in url:
-            article_body = soup.select_one('.detail-content')
-            if article_body:
-                content = article_body.get_text(separator='\n', strip=True)
-        
-        else:
-            for selector in ['.article-content', '.post-content', '.entry-content', 'article', '.content', '#content']:
-                article_body = soup.select_one(selector)
-                if article_body:
-                    content = article_body.get_text(separator='\n', strip=True)
-                    break
-        
-        if not content:
-            paragraphs = soup.find_all('p')
-            content = '\n'.join([p.get_text(strip=True) for p in paragraphs])
-        
-        return content
+        hits = semantic_news(ticker, k=NEWS_SEMANTIC_K, date_range=(start_timestamp, end_timestamp),
+                             min_score=NEWS_SEMANTIC_MIN_SCORE)
     except Exception as e:
-        logger.error(f"Error fetching article content from {url}: {str(e)}")
-        return ""
+        logger.error(f"Error searching semantic news index: {str(e)}")
+        return []
+    
+    news = []
+    for hit in hits:
+        news.append({
+            "title": hit.get("title", ""),
+            "description": hit.get("description", ""),
+            "post_time": hit["post_time"],
+            "full_url": hit.get("url", ""),
+            "url": hit.get("url", ""),
+            "source": hit.get("source", ""),
+            "date": datetime.fromtimestamp(hit["post_time"]).strftime('%Y-%m-%d'),
+            "semantic_score": hit["score"]
+        })
+    return news
+
+def fetch_article_content(url):
+    """Fetch and extract content from a news article URL"""
+    return get_article_fetcher().fetch(url)
 
 @llm_retry_decorator
 def get_sentiment_analysis(ticker, start_date, end_date):
     """Get sentiment analysis for a stock in a date range using LLM with full article content analysis"""
+    cache_key = (ticker.upper(), start_date, end_date, SENTIMENT_MODE)
+    cached = sentiment_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    # Concurrent requests for the same analysis share one run instead of each classifying the news.
+    return sentiment_flight.do(cache_key, _compute_sentiment_analysis, ticker, start_date, end_date, cache_key)
+
+def _compute_sentiment_analysis(ticker, start_date, end_date, cache_key):
     try:
         start_timestamp = datetime.strptime(start_date, '%Y-%m-%d').timestamp()
         end_timestamp = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).timestamp()  
         
-        content_cache = {}
-        sentiment_cache = {}
-        
         all_news = []
-        for collection_name, collection in news_collections.items():
+        for collection_name, collection in get_news_sources().items():
             query = {
                 "tickers": ticker,
                 "post_time": {
@@ -491,89 +757,35 @@ def get_sentiment_analysis(ticker, start_date, end_date):
             
             all_news.extend(news)
         
+        stored_only = SENTIMENT_MODE == "precomputed" or llm_scheduler.budget_exhausted()
+        # The worker only classifies tagged articles, so semantic hits would
+        # have no stored sentiment and count as neutral on the stored-only path.
+        if not stored_only:
+            tagged_urls = {news["url"] for news in all_news}
+            all_news.extend(
+                news for news in find_semantic_news(ticker, start_timestamp, end_timestamp)
+                if news["url"] not in tagged_urls
+            )
+        
         if not all_news:
             return None
         
-        with llm_lock:
-            for news in all_news:
-                full_content = ""
-                if news.get("url"):
-                    url = news["url"]
-                    if url in content_cache:
-                        full_content = content_cache[url]
-                    else:
-                        full_content = fetch_article_content(url)
-                        content_cache[url] = full_content
-                
-                title = news.get('title', '')
-                description = news.get('description', '')
-                
-                if full_content:
-                    content = f"{title} {description} {full_content}"
-                else:
-                    content = f"{title} {description}"
-                
-                if not content.strip():
-                    news["sentiment"] = "neutral"
-                    continue
-                
-                try:
-                    cache_key = hash(content[:1000])
-                    if cache_key in sentiment_cache:
-                        news["sentiment"] = sentiment_cache[cache_key]
-                        continue
-                    
-                    prompt = f"""
-                    Phân tích tình cảm (sentiment) của tin tức tài chính này về cổ phiếu {ticker}:
-                    ---
-                    {content[:3000]}  # Using more content for better analysis but limit length
-                    ---
-                    Phân loại sentient thành một trong các loại: positive (tích cực), neutral (trung lập), negative (tiêu cực).
-                    Chỉ trả về một từ duy nhất: positive, neutral, hoặc negative.
-                    """
-                    
-                    if llm:
-                        response = llm.invoke(prompt).content.strip().lower()
-                        if "positive" in response or "tích cực" in response:
-                            news["sentiment"] = "positive"
-                        elif "negative" in response or "tiêu cực" in response:
-                            news["sentiment"] = "negative"
-                        else:
-                            news["sentiment"] = "neutral"
-                        
-                        if full_content and len(full_content) > 100:
-                            insight_prompt = f"""
-                            Bạn là một chuyên gia phân tích tài chính với kinh nghiệm phân tích cổ phiếu Việt Nam. 
-                            Hãy phân tích nội dung bài báo sau đây về mã cổ phiếu {ticker} và đưa ra nhận định chuyên sâu.
-
-                            Nội dung bài báo:
-                            {full_content[:2000]}
-
-                            Hãy phân tích các yếu tố sau (nếu có trong bài báo):
-                            1. Kết quả kinh doanh gần đây hoặc dự kiến
-                            2. Chiến lược phát triển của công ty
-                            3. Các thay đổi về quản trị, nhân sự cấp cao
-                            4. Các dự án, sản phẩm, dịch vụ mới
-                            5. Tình hình thị trường và đối thủ cạnh tranh
-
-                            Đưa ra nhận định ngắn gọn trong 2-3 câu, tập trung vào thông tin quan trọng nhất.
-                            """
-                            try:
-                                insight_response = llm.invoke(insight_prompt).content.strip()
-                                if not ("không đủ thông tin" in insight_response.lower() or 
-                                        "không có thông tin" in insight_response.lower()):
-                                    news["insight"] = insight_response
-                            except Exception as e:
-                                logger.error(f"Error generating insights: {str(e)}")
-                        
-                        sentiment_cache[cache_key] = news["sentiment"]
-                    else:
-                        news["sentiment"] = "neutral"
-                except Exception as e:
-                    logger.error(f"Error in sentiment analysis: {str(e)}")
-                    news["sentiment"] = "neutral"
-                
-                time.sleep(0.2)
+        # Stored-only results are not cached when they stand in for an exhausted budget.
+        cacheable = True
+        if stored_only:
+            cacheable = SENTIMENT_MODE == "precomputed"
+            apply_stored_sentiment(ticker, all_news, get_sentiment_store())
+        else:
+            article_texts = get_article_fetcher().fetch_many([news.get("url") for news in all_news])
+            full_contents = [article_texts.get(news.get("url"), "") for news in all_news]
+            
+            classify_articles(get_llm(), ticker, all_news, full_contents,
+                              store=get_sentiment_store(), clusters=get_article_clusters(),
+                              scheduler=llm_scheduler, priority=PRIORITY_HIGH)
+            # Articles whose call failed or was refused (budget, queue timeout)
+            # only default to neutral; such a result must not be shared.
+            failed = [news.pop("llm_failed", False) for news in all_news]
+            cacheable = not any(failed)
         
         sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0, "total_count": len(all_news)}
         for news in all_news:
@@ -665,10 +877,13 @@ def get_sentiment_analysis(ticker, start_date, end_date):
                 "top_news": top_news
             })
         
-        return {
+        result = {
             "sentiment_distribution": sentiment_counts,
             "daily_sentiment": daily_sentiment
         }
+        if cacheable:
+            sentiment_cache.put(cache_key, copy.deepcopy(result))
+        return result
     except Exception as e:
         logger.error(f"Error getting sentiment analysis: {str(e)}")
         return None
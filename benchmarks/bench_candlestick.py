@@ -0,0 +1,86 @@
+"""Compares the legacy per-bar candlestick loop with the vectorized renderer.
+
+Run from the repository root:
+
+    python benchmarks/bench_candlestick.py --sizes 100 1000 10000 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+import numpy as np
+import pandas as pd
+
+from visualizations.candlestick import draw_candlesticks
+
+def make_bars(count, seed=0):
+    """Builds a random-walk daily OHLCV frame shaped like vnstock history."""
+    rng = np.random.default_rng(seed)
+    close = 50 + np.cumsum(rng.normal(0, 1, count))
+    open_ = close + rng.normal(0, 0.5, count)
+    high = np.maximum(open_, close) + rng.uniform(0, 1, count)
+    low = np.minimum(open_, close) - rng.uniform(0, 1, count)
+    return pd.DataFrame({
+        'time': pd.bdate_range('2000-01-03', periods=count),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': rng.integers(1_000, 1_000_000, count),
+    })
+
+def legacy_candlestick(ax, df, width=0.6):
+    """The original iterrows renderer: one Rectangle and one Line2D per bar."""
+    for i, (idx, row) in enumerate(df.iterrows()):
+        if row['close'] >= row['open']:
+            color = 'green'
+            bottom = row['open']
+            height = row['close'] - row['open']
+        else:
+            color = 'red'
+            bottom = row['close']
+            height = row['open'] - row['close']
+        ax.add_patch(Rectangle((i - width / 2, bottom), width, height, fill=True, color=color, alpha=0.8))
+        ax.plot([i, i], [row['low'], row['high']], color='black', alpha=0.7)
+    ax.set_xticks(range(0, len(df)))
+    ax.set_xticklabels([d.strftime('%Y-%m-%d') for d in df['time']], rotation=45)
+    ax.set_xlim(-1, len(df))
+
+def vectorized_candlestick(ax, df, width=0.6):
+    draw_candlesticks(ax, df, width=width)
+
+def time_render(renderer, df, repeat):
+    """Returns the best wall time of drawing and encoding one PNG."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
+        renderer(ax, df)
+        fig.savefig(BytesIO(), format='png')
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'bars':>8} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for count in args.sizes:
+        df = make_bars(count)
+        legacy = time_render(legacy_candlestick, df, args.repeat)
+        vectorized = time_render(vectorized_candlestick, df, args.repeat)
+        print(f"{count:>8} {legacy:>12.3f} {vectorized:>15.3f} {legacy / vectorized:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
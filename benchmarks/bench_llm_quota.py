@@ -0,0 +1,88 @@
+"""Checks the shared LLM quota across processes and times admission decisions.
+
+Several processes hammer one SharedFileQuotaState with a short window. Every
+admission time is collected afterwards and the script verifies that no
+window ever held more calls than the limit, then reports the cost of a
+try_admit call.
+
+Run from the repository root:
+
+    python benchmarks/bench_llm_quota.py --processes 8 --limit 50 --window 0.2 --seconds 2
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from models.llm_scheduler import PRIORITY_HIGH, PRIORITY_LOW, SharedFileQuotaState
+
+def hammer(root, limit, window, seconds, priority, queue):
+    state = SharedFileQuotaState(root, max_calls_per_minute=limit, daily_token_budget=10 ** 12,
+                                 window=window)
+    admitted = []
+    timings = []
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        start = time.perf_counter()
+        now = time.time()
+        wait = state.try_admit(1, 1, now, priority)
+        timings.append(time.perf_counter() - start)
+        if wait == 0:
+            admitted.append(now)
+        elif wait:
+            time.sleep(min(wait, 0.001))
+    queue.put((admitted, timings))
+
+def max_in_window(times, window):
+    """Largest number of admissions inside any half-open window of the given length."""
+    times = np.sort(np.asarray(times))
+    if len(times) == 0:
+        return 0
+    ends = np.searchsorted(times, times + window, side='left')
+    return int((ends - np.arange(len(times))).max())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--limit', type=int, default=50, help="calls allowed per window")
+    parser.add_argument('--window', type=float, default=0.2, help="window length in seconds")
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--low-priority', action='store_true',
+                        help="admit as background work (limit minus the interactive reserve)")
+    args = parser.parse_args()
+
+    priority = PRIORITY_LOW if args.low_priority else PRIORITY_HIGH
+    with tempfile.TemporaryDirectory() as root:
+        state = SharedFileQuotaState(root, max_calls_per_minute=args.limit, window=args.window)
+        limit = state.background_limit if args.low_priority else args.limit
+        queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=hammer, args=(root, args.limit, args.window, args.seconds, priority, queue))
+            for _ in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+    admitted = np.concatenate([np.asarray(times, dtype='f8') for times, _ in results])
+    timings = np.concatenate([np.asarray(t, dtype='f8') for _, t in results]) * 1e6
+    peak = max_in_window(admitted, args.window)
+    expected = args.seconds / args.window * limit
+    print(f"processes={args.processes} limit={limit}/{args.window}s admitted={len(admitted)} "
+          f"(ideal ~{expected:.0f}) peak_in_window={peak}")
+    print(f"try_admit: {len(timings)} decisions, median {np.median(timings):.1f} us, "
+          f"p99 {np.percentile(timings, 99):.1f} us")
+    if peak > limit:
+        print(f"FAIL: {peak} calls inside one window, limit is {limit}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Measures the cold-start cost of importing the Flask app with ``-X importtime``.
+
+Each run imports ``app`` in a fresh interpreter and records the wall time, the
+cumulative import time and the slowest top-level modules. Results are appended
+to a JSONL history so startup regressions show up over time.
+
+Run from the repository root:
+
+    python benchmarks/bench_startup.py --repeat 5 --top 15 --budget-ms 1500
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'results', 'startup.jsonl')
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_importtime(stderr):
+    """Returns (module, self_us, cumulative_us, depth) rows from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+def time_import(module):
+    """Imports module in a fresh interpreter; returns (wall seconds, importtime rows)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--no-history', action='store_true')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="exit with status 1 when the median import time exceeds this")
+    args = parser.parse_args()
+
+    # The first run warms the bytecode and filesystem caches and is not counted.
+    time_import(args.module)
+    walls, totals, per_module = [], [], {}
+    for _ in range(args.repeat):
+        wall, rows = time_import(args.module)
+        walls.append(wall)
+        totals.append(sum(row[1] for row in rows) / 1000)
+        for module, _, cumulative_us, depth in rows:
+            if depth <= 1:
+                per_module.setdefault(module, []).append(cumulative_us / 1000)
+
+    wall_ms = statistics.median(walls) * 1000
+    import_ms = statistics.median(totals)
+    slowest = sorted(((statistics.median(v), k) for k, v in per_module.items()), reverse=True)[:args.top]
+
+    print(f"import {args.module}: wall {wall_ms:.0f} ms, imports {import_ms:.0f} ms (median of {args.repeat})")
+    print(f"{'cumulative (ms)':>16}  module")
+    for ms, module in slowest:
+        print(f"{ms:>16.1f}  {module}")
+
+    if not args.no_history:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'python': sys.version.split()[0],
+                'module': args.module,
+                'repeat': args.repeat,
+                'wall_ms': round(wall_ms, 1),
+                'import_ms': round(import_ms, 1),
+                'slowest': [{'module': module, 'ms': round(ms, 1)} for ms, module in slowest]
+            }) + "\n")
+        print(f"Appended to {args.history}")
+
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"Startup budget exceeded: {import_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Checks ArticleFetcher and ArticleTextCache offline against the local HTTP stub.
+
+Serves canned article pages from models/http_stub.py and verifies that:
+  * fetch_many never has more than ARTICLE_FETCH_PER_HOST requests in flight
+    to one host,
+  * a second fetch_many is answered from the disk cache without any request,
+    and two URLs with the same text share one content-addressed blob,
+  * a page slower than the fetcher timeout comes back as "" without stalling
+    the rest of the batch.
+
+Run from the repository root:
+
+    python benchmarks/check_article_fetcher.py --articles 40 --per-host 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.article_fetcher import ArticleFetcher, ArticleTextCache
+from models.http_stub import serve_stub
+
+def article_page(number):
+    return f"<html><body><article><p>Bài viết số {number} về cổ phiếu VNM.</p></article></body></html>"
+
+def check_per_host_limit_and_cache(articles, per_host, delay):
+    pages = {f"/news/{i}.html": article_page(i) for i in range(articles)}
+    # A syndicated copy: same text under another URL.
+    pages["/copy/0.html"] = pages["/news/0.html"]
+    with tempfile.TemporaryDirectory() as root, serve_stub(pages, delay=delay) as stub:
+        cache = ArticleTextCache(root=root)
+        fetcher = ArticleFetcher(cache=cache, max_workers=per_host * 4, per_host_limit=per_host, timeout=5)
+        urls = [stub.url(path) for path in pages]
+
+        start = time.perf_counter()
+        texts = fetcher.fetch_many(urls)
+        elapsed = time.perf_counter() - start
+        assert all(texts[url] for url in urls), "every stub page should yield text"
+        assert stub.max_in_flight <= per_host, \
+            f"{stub.max_in_flight} requests in flight to one host, limit is {per_host}"
+        print(f"fetched {len(urls)} pages in {elapsed:.2f}s, "
+              f"at most {stub.max_in_flight} in flight (limit {per_host})")
+
+        served = len(stub.requests)
+        again = fetcher.fetch_many(urls)
+        assert again == texts, "cached text should match the first fetch"
+        assert len(stub.requests) == served, "a cached URL should not be requested again"
+        blobs = sum(len(files) for _, _, files in os.walk(os.path.join(root, 'blobs')))
+        assert blobs == articles, f"{blobs} blobs for {articles} distinct texts"
+        print(f"second fetch served from cache; {len(urls)} URLs share {blobs} blobs")
+
+def check_timeout(timeout):
+    pages = {"/fast.html": article_page(1), "/slow.html": article_page(2)}
+    with tempfile.TemporaryDirectory() as root, \
+            serve_stub(pages, delays={"/slow.html": timeout * 3}) as stub:
+        fetcher = ArticleFetcher(cache=ArticleTextCache(root=root), per_host_limit=2, timeout=timeout)
+        start = time.perf_counter()
+        texts = fetcher.fetch_many([stub.url("/fast.html"), stub.url("/slow.html")])
+        elapsed = time.perf_counter() - start
+        assert texts[stub.url("/fast.html")], "the fast page should still be fetched"
+        assert texts[stub.url("/slow.html")] == "", "a timed-out page should come back empty"
+        assert elapsed < timeout * 2, f"batch took {elapsed:.2f}s with a {timeout}s timeout"
+        print(f"slow page timed out after {elapsed:.2f}s (timeout {timeout}s) and returned ''")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline checks of the article fetcher and its disk cache.")
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.05, help="stub latency per page in seconds")
+    parser.add_argument("--timeout", type=float, default=0.5, help="fetcher timeout for the timeout check")
+    args = parser.parse_args()
+
+    check_per_host_limit_and_cache(args.articles, args.per_host, args.delay)
+    check_timeout(args.timeout)
+    print("ok")
+
+if __name__ == "__main__":
+    main()
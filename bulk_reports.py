@@ -0,0 +1,236 @@
+"""Generates PDF reports for a whole watchlist from the command line.
+
+Each ticker is handled by one worker process, which loads the price range
+once and reuses it for the summary and every chart. Finished tickers are
+appended to a manifest in the output directory, so an interrupted run picks up
+where it stopped when started again with the same arguments.
+
+    python bulk_reports.py --start-date 2024-01-01 --end-date 2024-12-31 --workers 4
+"""
+import os
+
+# The process pool below already runs one ticker per core, so charts are
+# rendered inside each worker instead of in a second pool.
+os.environ.setdefault("CHART_RENDER_MODE", "sync")
+
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from models.rate_limit import TokenBucket
+from models.report_generator import create_reportlab_pdf, generate_stock_report_data
+from visualizations.stock_plots import StockDataContext
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("bulk_reports")
+
+UNIVERSE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vnstock.json")
+MANIFEST_NAME = "manifest.jsonl"
+SUMMARY_NAME = "summary.json"
+
+def load_universe(path=UNIVERSE_FILE):
+    """Returns every ticker listed in vnstock.json."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return sorted(json.load(f))
+
+def load_tickers(args):
+    if args.tickers:
+        tickers = args.tickers.split(',')
+    elif args.tickers_file:
+        with open(args.tickers_file, 'r', encoding='utf-8') as f:
+            tickers = f.read().split()
+    else:
+        tickers = load_universe()
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+
+def read_manifest(path):
+    """Returns the latest manifest entry per symbol."""
+    entries = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["symbol"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+def build_symbol_report(symbol, start_date, end_date, include_plots, output_dir):
+    """Builds and writes one report; runs in a worker process and never raises."""
+    started = time.perf_counter()
+    entry = {"symbol": symbol, "status": "failed", "path": None, "error": None}
+    try:
+        context = StockDataContext(symbol, start_date, end_date).load()
+        report_data = generate_stock_report_data(
+            symbol,
+            start_date,
+            end_date,
+            include_plots=include_plots,
+            context=context
+        )
+        if report_data['stock_data'] is None:
+            raise RuntimeError("; ".join(report_data['errors']) or "No stock data")
+        pdf = create_reportlab_pdf(report_data)
+        if not pdf:
+            raise RuntimeError("PDF generation returned no content")
+        path = os.path.join(output_dir, f"{symbol}_report_{start_date}_{end_date}.pdf")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+        entry.update(status="done", path=path, warnings=len(report_data['errors']))
+    except Exception as e:
+        entry["error"] = str(e)
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    entry["finished_at"] = datetime.now().isoformat()
+    return entry
+
+def failed_entry(symbol, error):
+    """Manifest entry for a ticker whose worker never returned one."""
+    return {"symbol": symbol, "status": "failed", "path": None, "error": error,
+            "seconds": None, "finished_at": datetime.now().isoformat()}
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def summarize(results, skipped, wall_seconds):
+    durations = [entry["seconds"] for entry in results if entry["status"] == "done"]
+    done = len(durations)
+    return {
+        "done": done,
+        "failed": sum(1 for entry in results if entry["status"] != "done"),
+        "skipped": skipped,
+        "wall_seconds": round(wall_seconds, 2),
+        "reports_per_minute": round(done / wall_seconds * 60, 2) if wall_seconds > 0 else None,
+        "report_seconds_mean": round(sum(durations) / done, 3) if done else None,
+        "report_seconds_p50": percentile(durations, 0.5),
+        "report_seconds_p95": percentile(durations, 0.95),
+        "report_seconds_max": max(durations) if durations else None,
+        "failed_symbols": [entry["symbol"] for entry in results if entry["status"] != "done"]
+    }
+
+def run(tickers, start_date, end_date, include_plots, output_dir, workers, rate, skip_failed=False):
+    """Builds reports for tickers across a process pool and returns the timing summary."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    previous = read_manifest(manifest_path)
+
+    pending = []
+    skipped = 0
+    for symbol in tickers:
+        entry = previous.get(symbol)
+        if entry and entry["status"] == "done" and entry.get("path") and os.path.exists(entry["path"]):
+            skipped += 1
+        elif entry and entry["status"] != "done" and skip_failed:
+            skipped += 1
+        else:
+            pending.append(symbol)
+    logger.info(f"{len(pending)} reports to build, {skipped} already in the manifest")
+
+    # Each ticker costs a few vnstock requests (prices, shareholders, internal
+    # reports), so starts are paced to keep the upstream request rate bounded.
+    limiter = TokenBucket(rate, max(1, workers)) if rate > 0 else None
+    results = []
+    started = time.perf_counter()
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest:
+
+        def record(entry):
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            results.append(entry)
+            if entry["status"] == "done":
+                logger.info(f"[{len(results)}/{len(pending)}] {entry['symbol']} done in {entry['seconds']}s")
+            else:
+                logger.warning(f"[{len(results)}/{len(pending)}] {entry['symbol']} failed: {entry['error']}")
+
+        symbols = {}
+
+        def collect(futures):
+            for future in futures:
+                symbol = symbols.pop(future)
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # BrokenProcessPool when a worker process died, e.g. inside a chart renderer.
+                    entry = failed_entry(symbol, f"{type(e).__name__}: {str(e)}")
+                record(entry)
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            in_flight = set()
+            for symbol in pending:
+                while len(in_flight) >= workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                if limiter is not None:
+                    limiter.acquire()
+                task = (build_symbol_report, symbol, start_date, end_date, include_plots, output_dir)
+                try:
+                    future = executor.submit(*task)
+                except BrokenProcessPool:
+                    logger.error("A worker process died; failing its batch and starting a new pool")
+                    collect(wait(in_flight).done)
+                    in_flight = set()
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    future = executor.submit(*task)
+                symbols[future] = symbol
+                in_flight.add(future)
+            collect(wait(in_flight).done)
+        finally:
+            executor.shutdown()
+
+    summary = summarize(results, skipped, time.perf_counter() - started)
+    summary.update(start_date=start_date, end_date=end_date, workers=workers, finished_at=datetime.now().isoformat())
+    with open(os.path.join(output_dir, SUMMARY_NAME), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate PDF reports for many tickers.")
+    parser.add_argument("--tickers", help="comma-separated tickers (default: every ticker in vnstock.json)")
+    parser.add_argument("--tickers-file", help="file with one ticker per line")
+    parser.add_argument("--start-date", default=(datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
+    parser.add_argument("--end-date", default=datetime.now().strftime('%Y-%m-%d'))
+    parser.add_argument("--include-plots", default="line,volume,candlestick,volume_price,shareholders,heatmap",
+                        help="comma-separated chart kinds to include")
+    parser.add_argument("--output-dir", help="default: reports/<start>_<end>")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="tickers started per second (0 disables throttling)")
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="do not retry tickers the manifest records as failed")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join("reports", f"{args.start_date}_{args.end_date}")
+    summary = run(
+        load_tickers(args),
+        args.start_date,
+        args.end_date,
+        [kind for kind in args.include_plots.split(',') if kind],
+        output_dir,
+        max(1, args.workers),
+        args.rate,
+        skip_failed=args.skip_failed
+    )
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    return 0 if not summary["failed"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
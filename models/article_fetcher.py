@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from models.tiered_cache import DISK_CACHE_EVICT_EVERY, MemoryTier, TieredCache
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_CACHE_DIR = os.getenv("ARTICLE_CACHE_DIR", os.path.join("data", "articles"))
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", str(7 * 24 * 3600)))
+ARTICLE_CACHE_MAX_BYTES = int(os.getenv("ARTICLE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+ARTICLE_MEMORY_CACHE_BYTES = int(os.getenv("ARTICLE_MEMORY_CACHE_BYTES", str(16 * 1024 * 1024)))
+ARTICLE_FETCH_WORKERS = int(os.getenv("ARTICLE_FETCH_WORKERS", "16"))
+ARTICLE_FETCH_PER_HOST = int(os.getenv("ARTICLE_FETCH_PER_HOST", "4"))
+ARTICLE_FETCH_TIMEOUT = float(os.getenv("ARTICLE_FETCH_TIMEOUT", "10"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+def extract_article_text(url, html):
+    """Extracts the article body from a news page."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+
+    content = ""
+
+    if "cafef.vn" in url:
+        article_body = soup.select_one('.detail-content')
+        if article_body:
+            content = article_body.get_text(separator='\n', strip=True)
+
+    elif "vnexpress.net" in url:
+        article_body = soup.select_one('.fck_detail')
+        if article_body:
+            content = article_body.get_text(separator='\n', strip=True)
+
+    elif "tinnhanhchungkhoan.vn" in url:
+        article_body = soup.select_one('.detail-content')
+        if article_body:
+            content = article_body.get_text(separator='\n', strip=True)
+
+    else:
+        for selector in ['.article-content', '.post-content', '.entry-content', 'article', '.content', '#content']:
+            article_body = soup.select_one(selector)
+            if article_body:
+                content = article_body.get_text(separator='\n', strip=True)
+                break
+
+    if not content:
+        paragraphs = soup.find_all('p')
+        content = '\n'.join([p.get_text(strip=True) for p in paragraphs])
+
+    return content
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ArticleTextCache:
+    """Content-addressed on-disk cache of extracted article text.
+
+    Texts live in ``blobs/<hash[:2]>/<hash>.txt`` keyed by the SHA-256 of the
+    text, so syndicated copies are stored once. ``urls/<sha(url)>.json`` maps a
+    URL to its blob and fetch time; entries older than ``ttl`` seconds are
+    treated as missing. Every DISK_CACHE_EVICT_EVERY writes a background ``evict`` removes
+    expired entries and, while the blobs exceed ``max_bytes``, the oldest
+    ones. The files are shared by every worker process on the host.
+    """
+
+    name = "disk"
+
+    def __init__(self, root=ARTICLE_CACHE_DIR, ttl=ARTICLE_CACHE_TTL, max_bytes=ARTICLE_CACHE_MAX_BYTES,
+                 evict_every=DISK_CACHE_EVICT_EVERY):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        self._evicting = False
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._scanned = {"entries": None, "bytes": None}
+
+    def _url_path(self, url):
+        digest = _sha256(url)
+        return os.path.join(self.root, 'urls', digest[:2], f"{digest}.json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], f"{digest}.txt")
+
+    def get(self, url):
+        try:
+            with open(self._url_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['fetched_at'] > self.ttl:
+                return None
+            with open(self._blob_path(entry['content_hash']), 'r', encoding='utf-8') as f:
+                return f.read()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def put(self, url, text):
+        digest = _sha256(text)
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            _atomic_write(blob_path, text)
+        _atomic_write(self._url_path(url), json.dumps({
+            'url': url,
+            'content_hash': digest,
+            'fetched_at': time.time()
+        }))
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self.evict_in_background()
+
+    def _begin_eviction(self):
+        with self._lock:
+            if self._evicting:
+                return False
+            self._evicting = True
+            return True
+
+    def _end_eviction(self):
+        with self._lock:
+            self._evicting = False
+
+    def evict_in_background(self):
+        """Starts an eviction scan on a daemon thread unless one is already running."""
+        if self._begin_eviction():
+            # The scan walks the whole directory, so it runs off the request thread.
+            threading.Thread(target=self._evict_in_background, name="article-cache-evict", daemon=True).start()
+
+    def _evict_in_background(self):
+        try:
+            self._evict()
+        except Exception as e:
+            logger.error(f"Article cache eviction failed: {str(e)}")
+        finally:
+            self._end_eviction()
+
+    def evict(self):
+        """Runs an eviction scan now; returns the files removed, or 0 when another scan is running."""
+        if not self._begin_eviction():
+            return 0
+        try:
+            return self._evict()
+        finally:
+            self._end_eviction()
+
+    def _evict(self):
+        """Deletes expired URL entries, then the oldest until the blobs fit in max_bytes.
+
+        Blobs no remaining entry points to are deleted too. Returns the number
+        of files removed.
+        """
+        now = time.time()
+        removed = 0
+        live = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'urls')):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        entry = json.load(f)
+                    if now - entry['fetched_at'] > self.ttl:
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        live.append((entry['fetched_at'], path, entry['content_hash']))
+                except (FileNotFoundError, ValueError, KeyError):
+                    continue
+
+        blob_sizes = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, 'blobs')):
+            for name in filenames:
+                if name.endswith('.txt'):
+                    try:
+                        blob_sizes[name[:-4]] = os.path.getsize(os.path.join(dirpath, name))
+                    except FileNotFoundError:
+                        pass
+
+        references = {}
+        for _, _, digest in live:
+            references[digest] = references.get(digest, 0) + 1
+        total = sum(size for digest, size in blob_sizes.items() if digest in references)
+        live.sort()
+        kept = len(live)
+        for _, path, digest in live:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            kept -= 1
+            references[digest] -= 1
+            if references[digest] == 0:
+                del references[digest]
+                total -= blob_sizes.get(digest, 0)
+
+        for digest in blob_sizes:
+            if digest not in references:
+                try:
+                    os.remove(self._blob_path(digest))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self.evictions += removed
+            self._scanned = {"entries": kept, "bytes": total}
+        return removed
+
+    def stats(self):
+        """Entry count and size from the last scan (None until one finishes; the first call starts one)."""
+        with self._lock:
+            scanned = self._scanned["entries"] is not None
+        if not scanned:
+            self.evict_in_background()
+        with self._lock:
+            return {
+                "entries": self._scanned["entries"],
+                "bytes": self._scanned["bytes"],
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "evictions": self.evictions
+            }
+
+def create_article_text_cache():
+    """Shared on-disk article text with a small in-process tier in front of it."""
+    return TieredCache("article_text", [
+        MemoryTier(ARTICLE_MEMORY_CACHE_BYTES, ttl=ARTICLE_CACHE_TTL),
+        ArticleTextCache()
+    ])
+
+class ArticleFetcher:
+    """Downloads many article URLs at once over pooled keep-alive connections.
+
+    Each worker thread keeps its own ``requests.Session`` so connections to a
+    host are reused across articles, and a per-host semaphore caps how many
+    requests hit one news site at the same time.
+    """
+
+    def __init__(self, cache=None, max_workers=ARTICLE_FETCH_WORKERS,
+                 per_host_limit=ARTICLE_FETCH_PER_HOST, timeout=ARTICLE_FETCH_TIMEOUT):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self._local = threading.local()
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="article-fetch")
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.per_host_limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({"User-Agent": USER_AGENT})
+            self._local.session = session
+        return session
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slot
+            return slot
+
+    def _download(self, url):
+        try:
+            with self._host_slot(url):
+                response = self._session().get(url, timeout=self.timeout)
+            response.raise_for_status()
+            content = extract_article_text(url, response.content)
+        except Exception as e:
+            logger.error(f"Error fetching article content from {url}: {str(e)}")
+            return ""
+        if content and self.cache is not None:
+            try:
+                self.cache.put(url, content)
+            except OSError as e:
+                logger.warning(f"Could not cache article {url}: {str(e)}")
+        return content
+
+    def fetch(self, url):
+        """Returns the extracted text of one article ("" on failure)."""
+        return self.fetch_many([url]).get(url, "")
+
+    def fetch_many(self, urls):
+        """Returns a dict of url -> extracted text, downloading cache misses concurrently."""
+        results = {}
+        missing = []
+        for url in dict.fromkeys(u for u in urls if u):
+            cached = self.cache.get(url) if self.cache is not None else None
+            if cached is not None:
+                results[url] = cached
+            else:
+                missing.append(url)
+        if len(missing) == 1:
+            results[missing[0]] = self._download(missing[0])
+        elif missing:
+            for url, content in zip(missing, self._executor.map(self._download, missing)):
+                results[url] = content
+        return results
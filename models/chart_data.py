@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+HISTORY_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+def _column(values, decimals=None):
+    """Converts a numeric array to a JSON-safe list (NaN becomes None)."""
+    array = np.asarray(values, dtype=float)
+    if decimals is not None:
+        array = np.round(array, decimals)
+    return [None if np.isnan(v) else v for v in array.tolist()]
+
+def downsample_ohlcv(df, max_points):
+    """Aggregates consecutive bars into at most max_points OHLCV buckets.
+
+    Each bucket keeps the first time and open, the highest high, the lowest
+    low, the last close and the summed volume, so candles stay faithful.
+    """
+    count = len(df)
+    if not max_points or count <= max_points:
+        return df
+    starts = np.linspace(0, count, num=max_points, endpoint=False).astype(int)
+    starts = np.unique(starts)
+    ends = np.append(starts[1:], count) - 1
+    return pd.DataFrame({
+        'time': df['time'].to_numpy()[starts],
+        'open': df['open'].to_numpy(dtype=float)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=float), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=float), starts),
+        'close': df['close'].to_numpy(dtype=float)[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(dtype=float), starts)
+    })
+
+def history_payload(symbol, df, interval='1D', max_points=None):
+    """Builds the columnar /api/stock/history payload (time in Unix seconds)."""
+    source_points = len(df)
+    df = downsample_ohlcv(df, max_points)
+    times = pd.to_datetime(df['time']).to_numpy().astype('datetime64[s]').astype('int64')
+    return {
+        'symbol': symbol,
+        'interval': interval,
+        'columns': HISTORY_COLUMNS,
+        'time': times.tolist(),
+        'open': _column(df['open'], 4),
+        'high': _column(df['high'], 4),
+        'low': _column(df['low'], 4),
+        'close': _column(df['close'], 4),
+        'volume': _column(df['volume'], 0),
+        'points': len(df),
+        'source_points': source_points,
+        'downsampled': len(df) < source_points
+    }
+
+def indicators_payload(symbol, df, indicators, interval='1D', names=None):
+    """Builds the columnar /api/stock/indicators payload aligned with the price bars."""
+    columns = [name for name in indicators.columns if names is None or name in names]
+    times = pd.to_datetime(df['time']).to_numpy().astype('datetime64[s]').astype('int64')
+    payload = {
+        'symbol': symbol,
+        'interval': interval,
+        'time': times.tolist(),
+        'indicators': columns,
+        'points': len(df)
+    }
+    for name in columns:
+        payload[name] = _column(indicators[name], 4)
+    return payload
+
+def monthly_returns_payload(symbol, matrix):
+    """Builds the /api/stock/monthly_returns payload from a year x month DataFrame of fractions."""
+    return {
+        'symbol': symbol,
+        'years': [int(year) for year in matrix.index],
+        'months': list(range(1, 13)),
+        'values': [_column(matrix.loc[year].reindex(range(1, 13)).to_numpy(), 6) for year in matrix.index]
+    }
+
+def shareholders_payload(symbol, breakdown):
+    """Builds the /api/stock/shareholders payload from a share_holder/share_own_percent frame."""
+    return {
+        'symbol': symbol,
+        'labels': [str(label) for label in breakdown['share_holder']],
+        'values': _column(breakdown['share_own_percent'], 4)
+    }
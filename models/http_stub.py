@@ -0,0 +1,86 @@
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubServer:
+    """Local HTTP server that serves canned pages, for exercising fetchers offline.
+
+    ``pages`` maps a path such as ``/cafef/abc.chn`` to an HTML string. Unknown
+    paths return 404. ``delay`` adds a fixed latency to every response and
+    ``delays`` overrides it per path. ``requests`` records the paths served so
+    callers can count round trips, and ``max_in_flight`` is the most requests
+    that were being handled at once.
+    """
+
+    def __init__(self, pages, delay=0.0, delays=None):
+        self.pages = dict(pages)
+        self.delay = delay
+        self.delays = dict(delays or {})
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests.append(self.path)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    delay = stub.delays.get(self.path, stub.delay)
+                    if delay:
+                        time.sleep(delay)
+                finally:
+                    # Released before the response goes out: the client may
+                    # send its next request before this thread runs again.
+                    with stub._lock:
+                        stub.in_flight -= 1
+                body = stub.pages.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+@contextmanager
+def serve_stub(pages, delay=0.0, delays=None):
+    """Runs a StubServer for the duration of a with-block."""
+    server = StubServer(pages, delay=delay, delays=delays).start()
+    try:
+        yield server
+    finally:
+        server.stop()
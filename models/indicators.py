@@ -0,0 +1,273 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Comma-separated "kind:param:param" specs; see INDICATOR_KINDS for the kinds.
+INDICATORS = os.getenv(
+    "INDICATORS",
+    "sma:20,sma:50,ema:12,ema:26,rsi:14,macd:12:26:9,bollinger:20:2,atr:14,volatility:20"
+)
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "64"))
+
+def _param_label(value):
+    return f"{value:g}"
+
+def _windows(values, window):
+    """Rolling windows over values as a strided view (one row per full window)."""
+    return np.lib.stride_tricks.sliding_window_view(values, window)
+
+def ewm_continue(values, alpha, prev=None):
+    """Exponential moving average y[i] = alpha * x[i] + (1 - alpha) * y[i-1], vectorized.
+
+    Continues from prev (the value before values[0]) or seeds with values[0],
+    matching pandas ``ewm(alpha=alpha, adjust=False)``. Blocks are sized so the
+    growing decay powers stay well inside float64 range.
+    """
+    values = np.asarray(values, dtype='f8')
+    out = np.empty(len(values), dtype='f8')
+    if len(values) == 0:
+        return out
+    decay = 1.0 - alpha
+    if alpha >= 1.0:
+        out[:] = values
+        return out
+    if prev is None or np.isnan(prev):
+        prev = values[0]
+    block = 1024 if decay >= 0.99 else max(1, min(1024, int(250 / -np.log10(decay))))
+    powers = decay ** np.arange(1, block + 1)
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        p = powers[:len(chunk)]
+        out[start:start + len(chunk)] = p * (prev + alpha * np.cumsum(chunk / p))
+        prev = out[start + len(chunk) - 1]
+    return out
+
+def rolling_mean(values, window):
+    """Trailing mean over window bars; NaN until the window is full."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        cumulative = np.cumsum(np.insert(np.asarray(values, dtype='f8'), 0, 0.0))
+        out[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return out
+
+def rolling_std(values, window):
+    """Trailing sample standard deviation over window bars; NaN until the window is full."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window and window > 1:
+        out[window - 1:] = _windows(np.asarray(values, dtype='f8'), window).std(axis=1, ddof=1)
+    return out
+
+def true_range(high, low, close, prev_close=None):
+    """Per-bar true range; the first bar uses high - low unless prev_close is given."""
+    shifted = np.concatenate([[np.nan if prev_close is None else prev_close], close[:-1]])
+    ranges = np.vstack([high - low, np.abs(high - shifted), np.abs(low - shifted)])
+    return np.nanmax(ranges, axis=0)
+
+# Each kernel fills out[...][start:stop] from full input arrays. Window kernels
+# read the bars they need before start; recursive kernels continue from state,
+# which holds their value at bar start - 1 and is returned updated to stop - 1.
+
+def _sma(arrays, start, stop, state, window):
+    lo = max(0, start - window + 1)
+    values = rolling_mean(arrays['close'][lo:stop], window)
+    return {f"sma_{window}": values[start - lo:]}, state
+
+def _ema(arrays, start, stop, state, span):
+    name = f"ema_{span}"
+    values = ewm_continue(arrays['close'][start:stop], 2.0 / (span + 1), state.get(name))
+    if len(values):
+        state = {name: values[-1]}
+    return {name: values}, state
+
+def _macd(arrays, start, stop, state, fast, slow, signal):
+    suffix = f"{fast}_{slow}_{signal}"
+    close = arrays['close'][start:stop]
+    fast_ema = ewm_continue(close, 2.0 / (fast + 1), state.get('fast'))
+    slow_ema = ewm_continue(close, 2.0 / (slow + 1), state.get('slow'))
+    macd = fast_ema - slow_ema
+    signal_line = ewm_continue(macd, 2.0 / (signal + 1), state.get('signal'))
+    if len(close):
+        state = {'fast': fast_ema[-1], 'slow': slow_ema[-1], 'signal': signal_line[-1]}
+    return {
+        f"macd_{suffix}": macd,
+        f"macd_signal_{suffix}": signal_line,
+        f"macd_hist_{suffix}": macd - signal_line
+    }, state
+
+def _rsi(arrays, start, stop, state, window):
+    """Wilder's RSI; the first window bars are NaN while the averages warm up."""
+    close = arrays['close']
+    lo = max(1, start)
+    change = close[lo:stop] - close[lo - 1:stop - 1]
+    alpha = 1.0 / window
+    gain = ewm_continue(np.clip(change, 0, None), alpha, state.get('gain'))
+    loss = ewm_continue(np.clip(-change, 0, None), alpha, state.get('loss'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    rsi[(gain == 0) & (loss == 0)] = 50.0
+    values = np.full(stop - start, np.nan)
+    values[lo - start:] = rsi
+    values[:max(0, window - start)] = np.nan
+    if len(change):
+        state = {'gain': gain[-1], 'loss': loss[-1]}
+    return {f"rsi_{window}": values}, state
+
+def _bollinger(arrays, start, stop, state, window, width):
+    suffix = f"{window}_{_param_label(width)}"
+    lo = max(0, start - window + 1)
+    close = arrays['close'][lo:stop]
+    middle = rolling_mean(close, window)[start - lo:]
+    # Bands use the population deviation, as in Bollinger's definition.
+    deviation = rolling_std(close, window)[start - lo:] * np.sqrt((window - 1) / window)
+    return {
+        f"bollinger_middle_{suffix}": middle,
+        f"bollinger_upper_{suffix}": middle + width * deviation,
+        f"bollinger_lower_{suffix}": middle - width * deviation
+    }, state
+
+def _atr(arrays, start, stop, state, window):
+    """Wilder's average true range; NaN for the first window - 1 bars."""
+    prev_close = arrays['close'][start - 1] if start > 0 else None
+    ranges = true_range(arrays['high'][start:stop], arrays['low'][start:stop],
+                        arrays['close'][start:stop], prev_close)
+    values = ewm_continue(ranges, 1.0 / window, state.get('atr'))
+    if len(values):
+        state = {'atr': values[-1]}
+    values = values.copy()
+    values[:max(0, window - 1 - start)] = np.nan
+    return {f"atr_{window}": values}, state
+
+def _volatility(arrays, start, stop, state, window):
+    """Rolling standard deviation of daily returns, in percent."""
+    lo = max(0, start - window)
+    close = arrays['close'][lo:stop]
+    returns = np.full(len(close), np.nan)
+    returns[1:] = close[1:] / close[:-1] - 1.0
+    values = np.full(len(close), np.nan)
+    if len(close) > window:
+        values[window:] = rolling_std(returns[1:], window)[window - 1:] * 100
+    return {f"volatility_{window}": values[start - lo:]}, state
+
+INDICATOR_KINDS = {
+    'sma': (_sma, (int,)),
+    'ema': (_ema, (int,)),
+    'rsi': (_rsi, (int,)),
+    'macd': (_macd, (int, int, int)),
+    'bollinger': (_bollinger, (int, float)),
+    'atr': (_atr, (int,)),
+    'volatility': (_volatility, (int,)),
+}
+
+def parse_indicator_specs(text=INDICATORS):
+    """Parses "sma:20,rsi:14,..." into (kind, params) tuples; raises ValueError on bad specs."""
+    specs = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kind, *raw = item.split(':')
+        if kind not in INDICATOR_KINDS:
+            raise ValueError(f"Unknown indicator: {kind}")
+        types = INDICATOR_KINDS[kind][1]
+        if len(raw) != len(types):
+            raise ValueError(f"Indicator {kind} takes {len(types)} parameter(s)")
+        specs.append((kind, tuple(cast(value) for cast, value in zip(types, raw))))
+    return specs
+
+def compute_range(specs, arrays, start, stop, states):
+    """Runs every indicator over bars [start, stop); returns (name -> values, new states)."""
+    values = {}
+    new_states = []
+    for (kind, params), state in zip(specs, states):
+        kernel = INDICATOR_KINDS[kind][0]
+        outputs, state = kernel(arrays, start, stop, state, *params)
+        values.update(outputs)
+        new_states.append(state)
+    return values, new_states
+
+def compute_indicators(arrays, specs=None):
+    """Computes all indicators over full high/low/close arrays without caching."""
+    specs = parse_indicator_specs() if specs is None else specs
+    arrays = {column: np.asarray(arrays[column], dtype='f8') for column in ('high', 'low', 'close')}
+    values, _ = compute_range(specs, arrays, 0, len(arrays['close']), [{} for _ in specs])
+    return values
+
+class IndicatorEngine:
+    """Computes a configured set of indicators per series and updates them incrementally.
+
+    Results are cached per key (symbol, interval) as full-length arrays. When
+    the series grows, only the appended bars and the last cached bar (which may
+    have been an unfinished bar) are computed: window indicators read just the
+    bars they need before them and recursive ones (EMA, MACD, RSI, ATR) resume
+    from the state saved at the second-to-last bar. Any other change to the
+    series triggers a full recompute.
+    """
+
+    def __init__(self, specs=None, max_entries=INDICATOR_CACHE_SIZE):
+        self.specs = parse_indicator_specs() if specs is None else specs
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'incremental': 0, 'full': 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def compute(self, key, times, high, low, close):
+        """Returns (times, name -> values) for the whole series, reusing cached results."""
+        times = np.asarray(times, dtype='i8')
+        arrays = {
+            'high': np.asarray(high, dtype='f8'),
+            'low': np.asarray(low, dtype='f8'),
+            'close': np.asarray(close, dtype='f8')
+        }
+        count = len(times)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        cached = 0 if entry is None else len(entry['times'])
+        if (cached and count >= cached and times[0] == entry['times'][0]
+                and times[cached - 1] == entry['times'][-1]
+                and np.array_equal(times[:cached - 1], entry['times'][:-1])):
+            last_bar = (arrays['high'][cached - 1], arrays['low'][cached - 1], arrays['close'][cached - 1])
+            if count == cached and last_bar == entry['last_bar']:
+                with self._lock:
+                    self._stats['hits'] += 1
+                return entry['times'], entry['values']
+            start, states, previous = cached - 1, entry['states'], entry['values']
+            kind = 'incremental'
+        else:
+            start, states, previous = 0, [{} for _ in self.specs], None
+            kind = 'full'
+
+        settled, states = compute_range(self.specs, arrays, start, max(start, count - 1), states)
+        latest, _ = compute_range(self.specs, arrays, max(start, count - 1), count, states)
+        values = {}
+        for name, tail in latest.items():
+            parts = [settled[name], tail]
+            if previous is not None:
+                parts.insert(0, previous[name][:start])
+            values[name] = np.concatenate(parts)
+
+        entry = {
+            'times': times.copy(),
+            'values': values,
+            'states': states,
+            'last_bar': (arrays['high'][-1], arrays['low'][-1], arrays['close'][-1]) if count else None
+        }
+        with self._lock:
+            self._stats[kind] += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry['times'], values
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
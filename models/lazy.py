@@ -0,0 +1,30 @@
+import functools
+import threading
+
+def lazy_singleton(factory):
+    """Turns a zero-argument factory into an accessor that builds its value once, on first call.
+
+    Concurrent first calls wait for a single construction; if the factory
+    raises, nothing is stored and the next call tries again.
+    ``accessor.loaded()`` tells whether the value exists yet without creating
+    it, and ``accessor.reset()`` forgets the value (returning it, or None) so
+    the next call builds a new one.
+    """
+    lock = threading.Lock()
+    state = {}
+
+    @functools.wraps(factory)
+    def accessor():
+        if 'value' not in state:
+            with lock:
+                if 'value' not in state:
+                    state['value'] = factory()
+        return state['value']
+
+    def reset():
+        with lock:
+            return state.pop('value', None)
+
+    accessor.loaded = lambda: 'value' in state
+    accessor.reset = reset
+    return accessor
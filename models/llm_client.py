@@ -0,0 +1,24 @@
+import os
+import logging
+
+from models.llm_scheduler import LLM_MAX_OUTPUT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+
+def create_llm():
+    """Builds the Vertex AI chat model, or returns None when it is unavailable."""
+    try:
+        from langchain_google_vertexai import ChatVertexAI
+        return ChatVertexAI(
+            model=LLM_MODEL,
+            temperature=0.0,
+            max_tokens=LLM_MAX_OUTPUT_TOKENS,
+            max_retries=3,
+            retry_min_seconds=2,
+            retry_max_seconds=30
+        )
+    except Exception as e:
+        logger.error(f"Error initializing LLM: {str(e)}")
+        return None
@@ -0,0 +1,388 @@
+import os
+import mmap
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are served first.
+PRIORITY_HIGH = 0    # interactive sentiment for /analyze
+PRIORITY_MEDIUM = 1  # insight generation
+PRIORITY_LOW = 2     # background work such as sentiment_worker.py
+
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_MEDIUM: "medium", PRIORITY_LOW: "low"}
+
+# Counts individual LLM requests across all prompts of a batch.
+MAX_CALLS_PER_MINUTE = int(os.getenv("MAX_CALLS_PER_MINUTE", "300"))
+DAILY_TOKEN_BUDGET = int(os.getenv("DAILY_TOKEN_BUDGET", "100000"))
+RATE_LIMIT_WINDOW = 60
+# Seconds high and medium priority calls may queue before giving up; low
+# priority (background) calls wait as long as needed.
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "1000"))
+# Share of the per-minute calls that background (low priority) work may not use,
+# so other processes' interactive calls still get slots while it runs.
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+# "file" shares quota between every process on the host; "local" keeps it per process.
+LLM_QUOTA_BACKEND = os.getenv("LLM_QUOTA_BACKEND", "file")
+LLM_QUOTA_DIR = os.getenv("LLM_QUOTA_DIR", os.path.join("data", "llm_quota"))
+# Upper bound used while waiting on reservations held by calls in flight.
+_RESERVATION_POLL = 1.0
+# How often a caller waiting for the daily budget to reset checks again; other
+# processes may roll the day first.
+_BUDGET_POLL = 60.0
+
+class TokenBudgetExceeded(Exception):
+    """The daily token budget cannot cover the call."""
+
+class LLMQueueTimeout(Exception):
+    """A call waited longer than its queue timeout for an admission slot."""
+
+def estimate_tokens(prompt, output_tokens=LLM_MAX_OUTPUT_TOKENS):
+    """Upper estimate reserved before a call: ~3 characters per token plus the output cap."""
+    return -(-len(prompt) // 3) + output_tokens
+
+def response_tokens(response):
+    """Total tokens reported in a chat model response, or None when it has no usage data."""
+    usage = getattr(response, 'usage_metadata', None) or {}
+    if usage.get('total_tokens') is not None:
+        return int(usage['total_tokens'])
+    metadata = (getattr(response, 'response_metadata', None) or {}).get('usage_metadata') or {}
+    if metadata.get('total_token_count') is not None:
+        return int(metadata['total_token_count'])
+    return None
+
+def seconds_until_budget_reset(now):
+    """Seconds until local midnight, when the daily token budget starts over."""
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max((today + timedelta(days=1)).timestamp() - now, 0.001)
+
+def background_limit(max_calls_per_minute, interactive_reserve):
+    return max(1, int(max_calls_per_minute * (1.0 - interactive_reserve)))
+
+class LocalQuotaState:
+    """Sliding one-minute call window and daily token budget held in this process.
+
+    Tokens are reserved from an estimate when a call is admitted and settled
+    with the real usage when it returns, so calls in flight can never push
+    usage past the budget.
+    """
+
+    def __init__(self, max_calls_per_minute=MAX_CALLS_PER_MINUTE, daily_token_budget=DAILY_TOKEN_BUDGET,
+                 window=RATE_LIMIT_WINDOW, interactive_reserve=LLM_INTERACTIVE_RESERVE):
+        self.max_calls_per_minute = max_calls_per_minute
+        self.daily_token_budget = daily_token_budget
+        self.window = window
+        self.background_limit = background_limit(max_calls_per_minute, interactive_reserve)
+        self._calls = deque()
+        self._day = None
+        self._used = 0
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def _roll(self, now):
+        day = datetime.fromtimestamp(now).date().isoformat()
+        if day != self._day:
+            self._day = day
+            self._used = 0
+        while self._calls and self._calls[0] <= now - self.window:
+            self._calls.popleft()
+
+    def try_admit(self, calls, tokens, now, priority=PRIORITY_HIGH):
+        """Admits calls and reserves tokens; returns 0 when admitted.
+
+        Otherwise returns the seconds to wait before trying again, or None
+        when today's budget cannot cover the tokens even after calls in flight
+        settle.
+        """
+        limit = self.background_limit if priority >= PRIORITY_LOW else self.max_calls_per_minute
+        with self._lock:
+            self._roll(now)
+            if self._used + tokens > self.daily_token_budget:
+                return None
+            if self._used + self._reserved + tokens > self.daily_token_budget:
+                return _RESERVATION_POLL
+            excess = len(self._calls) + calls - limit
+            if excess > 0:
+                return max(self._calls[excess - 1] + self.window - now, 0.001)
+            self._calls.extend([now] * calls)
+            self._reserved += tokens
+            return 0
+
+    def settle(self, reserved, used):
+        with self._lock:
+            self._reserved = max(0, self._reserved - reserved)
+            self._used += used
+
+    def snapshot(self, now):
+        with self._lock:
+            self._roll(now)
+            return {
+                "backend": "local",
+                "calls_last_minute": len(self._calls),
+                "max_calls_per_minute": self.max_calls_per_minute,
+                "tokens_used_today": self._used,
+                "tokens_reserved": self._reserved,
+                "daily_token_budget": self.daily_token_budget,
+                "token_budget_remaining": max(0, self.daily_token_budget - self._used)
+            }
+
+class SharedFileQuotaState:
+    """Call window and token budget shared by all processes on the host.
+
+    State lives in a small memory-mapped file: a header (layout tag, ring
+    position, budget day, tokens used and reserved) followed by a ring of the
+    last max_calls_per_minute admission times. Admitting n calls only checks
+    the ring slot of the call that must have left the window, under an flock,
+    so a decision costs a few microseconds and holds across every gunicorn
+    worker and the sentiment worker. The file name includes the call limit,
+    so processes configured differently never share a layout.
+    """
+
+    _MAGIC, _HEAD, _DAY, _USED, _RESERVED = range(5)
+    _HEADER_WORDS = 8
+
+    def __init__(self, root=LLM_QUOTA_DIR, max_calls_per_minute=MAX_CALLS_PER_MINUTE,
+                 daily_token_budget=DAILY_TOKEN_BUDGET, window=RATE_LIMIT_WINDOW,
+                 interactive_reserve=LLM_INTERACTIVE_RESERVE):
+        if fcntl is None:
+            raise RuntimeError("SharedFileQuotaState needs fcntl (POSIX)")
+        self.max_calls_per_minute = max_calls_per_minute
+        self.daily_token_budget = daily_token_budget
+        self.window = window
+        self.background_limit = background_limit(max_calls_per_minute, interactive_reserve)
+        self.path = os.path.join(root, f"quota_{max_calls_per_minute}.bin")
+        os.makedirs(root, exist_ok=True)
+        size = 8 * (self._HEADER_WORDS + max_calls_per_minute)
+        self._day_bounds = (0.0, 0.0, 0)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._header = np.frombuffer(self._map, dtype='i8', count=self._HEADER_WORDS)
+        self._ring = np.frombuffer(self._map, dtype='f8', offset=8 * self._HEADER_WORDS)
+        with self._locked():
+            if self._header[self._MAGIC] != max_calls_per_minute:
+                self._header[:] = 0
+                self._header[self._MAGIC] = max_calls_per_minute
+                self._ring[:] = 0.0
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _today(self, now):
+        # Cached so the common case skips calendar arithmetic.
+        if not self._day_bounds[0] <= now < self._day_bounds[1]:
+            start = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+            end = (start + timedelta(days=1)).timestamp()
+            self._day_bounds = (start.timestamp(), end, int(start.strftime('%Y%m%d')))
+        return self._day_bounds[2]
+
+    def _roll(self, now):
+        day = self._today(now)
+        if self._header[self._DAY] != day:
+            self._header[self._DAY] = day
+            self._header[self._USED] = 0
+            # Reservations of processes that died mid-call would otherwise leak forever.
+            self._header[self._RESERVED] = 0
+
+    def try_admit(self, calls, tokens, now, priority=PRIORITY_HIGH):
+        """Same contract as LocalQuotaState.try_admit."""
+        limit = self.background_limit if priority >= PRIORITY_LOW else self.max_calls_per_minute
+        capacity = self.max_calls_per_minute
+        with self._locked():
+            header = self._header
+            self._roll(now)
+            if header[self._USED] + tokens > self.daily_token_budget:
+                return None
+            if header[self._USED] + header[self._RESERVED] + tokens > self.daily_token_budget:
+                return _RESERVATION_POLL
+            head = int(header[self._HEAD])
+            # At most limit - calls earlier admissions may remain inside the window.
+            blocking = self._ring[(head - (limit - calls) - 1) % capacity] if calls <= limit else now
+            if blocking > now - self.window:
+                return max(blocking + self.window - now, 0.001)
+            self._ring[(head + np.arange(calls)) % capacity] = now
+            header[self._HEAD] = (head + calls) % capacity
+            header[self._RESERVED] += tokens
+            return 0
+
+    def settle(self, reserved, used):
+        with self._locked():
+            self._header[self._RESERVED] = max(0, int(self._header[self._RESERVED]) - reserved)
+            self._header[self._USED] += used
+
+    def snapshot(self, now):
+        with self._locked():
+            self._roll(now)
+            used = int(self._header[self._USED])
+            return {
+                "backend": "file",
+                "calls_last_minute": int(np.count_nonzero(self._ring > now - self.window)),
+                "max_calls_per_minute": self.max_calls_per_minute,
+                "tokens_used_today": used,
+                "tokens_reserved": int(self._header[self._RESERVED]),
+                "daily_token_budget": self.daily_token_budget,
+                "token_budget_remaining": max(0, self.daily_token_budget - used)
+            }
+
+def create_quota_state(backend=LLM_QUOTA_BACKEND, **kwargs):
+    """Returns the quota state for the configured backend, falling back to local without fcntl."""
+    if backend == "file":
+        try:
+            return SharedFileQuotaState(**kwargs)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Shared LLM quota unavailable ({str(e)}); limits apply per process")
+    elif backend != "local":
+        raise ValueError(f"Unknown LLM quota backend: {backend}")
+    kwargs.pop('root', None)
+    return LocalQuotaState(**kwargs)
+
+class LLMScheduler:
+    """Admits LLM calls in priority order under the call rate limit and token budget.
+
+    Waiting callers form a priority queue; only the head asks the quota state
+    for admission and, when refused, sleeps until the computed moment a slot
+    frees up (or until another caller settles or leaves the queue).
+    """
+
+    def __init__(self, state=None, queue_timeout=LLM_QUEUE_TIMEOUT):
+        self.state = state or create_quota_state()
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    @property
+    def max_batch(self):
+        """Largest chunk every priority can be admitted with."""
+        return self.state.background_limit
+
+    def acquire(self, calls=1, tokens=0, priority=PRIORITY_MEDIUM, timeout=None, wait_for_budget=False):
+        """Blocks until calls are admitted with tokens reserved.
+
+        Raises TokenBudgetExceeded when today's budget cannot cover the tokens
+        (unless wait_for_budget is set, in which case it waits for the budget
+        to reset, provided the tokens fit in a whole day's budget) and
+        LLMQueueTimeout when timeout seconds pass first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == entry:
+                        wait = self.state.try_admit(calls, tokens, time.time(), priority)
+                        if wait == 0:
+                            return
+                        if wait is None:
+                            if not wait_for_budget or tokens > self.state.daily_token_budget:
+                                raise TokenBudgetExceeded(
+                                    f"Daily token budget of {self.state.daily_token_budget} exhausted")
+                            wait = min(seconds_until_budget_reset(time.time()), _BUDGET_POLL)
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise LLMQueueTimeout(f"Waited {timeout:.0f}s for an LLM call slot")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def settle(self, reserved, used):
+        """Replaces a call's token reservation with the tokens it actually used."""
+        self.state.settle(reserved, used)
+        with self._cond:
+            self._cond.notify_all()
+
+    def timeout_for(self, priority):
+        return None if priority >= PRIORITY_LOW else self.queue_timeout
+
+    def budget_exhausted(self, tokens=None):
+        """True when the remaining budget cannot cover a call of tokens.
+
+        Admission reserves each prompt's estimate including the output cap, so
+        by default the budget counts as exhausted once even an empty prompt
+        (LLM_MAX_OUTPUT_TOKENS) no longer fits.
+        """
+        if tokens is None:
+            tokens = estimate_tokens("")
+        return self.state.snapshot(time.time())["token_budget_remaining"] < tokens
+
+    def stats(self):
+        with self._cond:
+            waiting = [priority for priority, _ in self._waiting]
+        stats = self.state.snapshot(time.time())
+        stats["queue_depth"] = len(waiting)
+        stats["queued_by_priority"] = {name: waiting.count(priority) for priority, name in PRIORITY_NAMES.items()}
+        return stats
+
+def run_scheduled(scheduler, llm, prompts, priority, max_concurrency):
+    """Sends one batch of prompts through the scheduler and meters the tokens it used.
+
+    A batch the remaining budget cannot cover is split in halves, so as many
+    prompts as possible still run. What still does not fit waits for the
+    budget to reset at PRIORITY_LOW and fails at higher priorities. Failed
+    prompts come back as exception objects in their slot.
+    """
+    reserved = sum(estimate_tokens(prompt) for prompt in prompts)
+    try:
+        scheduler.acquire(len(prompts), reserved, priority, timeout=scheduler.timeout_for(priority))
+    except TokenBudgetExceeded as e:
+        if len(prompts) > 1 and not scheduler.budget_exhausted(min(estimate_tokens(prompt) for prompt in prompts)):
+            half = len(prompts) // 2
+            return (run_scheduled(scheduler, llm, prompts[:half], priority, max_concurrency)
+                    + run_scheduled(scheduler, llm, prompts[half:], priority, max_concurrency))
+        if priority < PRIORITY_LOW:
+            logger.warning(f"LLM call not admitted: {str(e)}")
+            return [e] * len(prompts)
+        logger.info("Daily token budget exhausted; background LLM calls wait for it to reset")
+        try:
+            scheduler.acquire(len(prompts), reserved, priority, wait_for_budget=True)
+        except TokenBudgetExceeded as e:
+            logger.warning(f"LLM call not admitted: {str(e)}")
+            return [e] * len(prompts)
+    except LLMQueueTimeout as e:
+        logger.warning(f"LLM call not admitted: {str(e)}")
+        return [e] * len(prompts)
+
+    used = 0
+    try:
+        responses = llm.batch(prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+        for prompt, response in zip(prompts, responses):
+            if isinstance(response, Exception):
+                continue
+            tokens = response_tokens(response)
+            if tokens is None:
+                tokens = estimate_tokens(prompt, output_tokens=-(-len(getattr(response, 'content', '') or '') // 3))
+            used += tokens
+    except Exception as e:
+        responses = [e] * len(prompts)
+    finally:
+        scheduler.settle(reserved, used)
+    return responses
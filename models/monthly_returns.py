@@ -0,0 +1,169 @@
+import os
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from models.price_store import CACHEABLE_INTERVALS
+
+logger = logging.getLogger(__name__)
+
+MONTHLY_RETURNS_FILE = 'monthly_returns.npz'
+
+def month_keys(times):
+    """Months since 1970-01 for datetime64 (or int nanosecond) times."""
+    return np.asarray(times).astype('datetime64[ns]').astype('datetime64[M]').astype('i8')
+
+def month_return_sums(times, close, prev_close=None):
+    """Sums and counts of daily returns per calendar month for sorted bars.
+
+    Returns (months, sums, counts). The first bar's return is taken against
+    prev_close when given and skipped otherwise, as is any non-finite return.
+    """
+    close = np.asarray(close, dtype='f8')
+    if len(close) == 0:
+        return np.zeros(0, dtype='i8'), np.zeros(0), np.zeros(0, dtype='i8')
+    returns = np.empty(len(close))
+    returns[0] = close[0] / prev_close - 1.0 if prev_close else np.nan
+    returns[1:] = close[1:] / close[:-1] - 1.0
+    valid = np.isfinite(returns)
+    keys = month_keys(times)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+    sums = np.add.reduceat(np.where(valid, returns, 0.0), starts)
+    counts = np.add.reduceat(valid.astype('i8'), starts)
+    return keys[starts], sums, counts
+
+def returns_matrix(months, sums, counts):
+    """Turns per-month sums and counts into a year x month DataFrame of mean returns.
+
+    Rows are years and columns month numbers (1-12); only months with data
+    appear as columns, like a pivot table of the daily returns.
+    """
+    months = np.asarray(months, dtype='i8')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    years = months // 12 + 1970
+    if len(months) == 0:
+        return pd.DataFrame(dtype=float)
+    year_index = np.arange(years.min(), years.max() + 1)
+    grid = np.full((len(year_index), 12), np.nan)
+    grid[years - year_index[0], months % 12] = means
+    present = ~np.isnan(grid)
+    rows = present.any(axis=1)
+    columns = present.any(axis=0)
+    return pd.DataFrame(grid[rows][:, columns], index=year_index[rows], columns=np.arange(1, 13)[columns])
+
+class MonthlyReturnsStore:
+    """Per-symbol monthly return sums kept next to the stored price series.
+
+    Each series gets a ``monthly_returns.npz`` with the sum and count of daily
+    returns for every calendar month of its history, tagged with the price
+    store version it was built from. When new bars arrive only the last stored
+    month (which may have been open) and the new months are recomputed; other
+    changes to the history rebuild the file. Render workers in other processes
+    read the same file.
+    """
+
+    def __init__(self, price_store):
+        self.price_store = price_store
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, interval):
+        return self.price_store.series_path(symbol, interval, MONTHLY_RETURNS_FILE)
+
+    def _load(self, symbol, interval):
+        try:
+            with np.load(self._path(symbol, interval)) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, symbol, interval, record):
+        path = self._path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **record)
+        os.replace(tmp_path, path)
+
+    def get(self, symbol, interval='1D'):
+        """Returns (months, sums, counts) for the whole stored series, updating it if stale."""
+        key = (symbol.upper(), interval)
+        version = self.price_store.data_version(symbol, interval)
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None and int(cached['version']) == version:
+            return cached['months'], cached['sums'], cached['counts']
+
+        record = self._load(symbol, interval)
+        if record is None or int(record['version']) != version:
+            record = self._rebuild(symbol, interval, record, version)
+        with self._lock:
+            self._memory[key] = record
+        return record['months'], record['sums'], record['counts']
+
+    def _rebuild(self, symbol, interval, record, version):
+        bars = self.price_store.read_bars(symbol, interval)
+        times = bars['time']
+        close = np.asarray(bars['close'])
+        stored = 0 if record is None else int(record['bar_count'])
+
+        if (stored and len(times) >= stored and len(record['months'])
+                and times[0] == record['first_time'] and times[stored - 1] == record['last_time']):
+            # Appended bars: recompute from the first bar of the last stored month.
+            keep = len(record['months']) - 1
+            month_start = np.datetime64(int(record['months'][-1]), 'M').astype('datetime64[ns]').astype('i8')
+            start = int(np.searchsorted(times, month_start, side='left'))
+            prev_close = close[start - 1] if start > 0 else None
+            months, sums, counts = month_return_sums(times[start:], close[start:], prev_close)
+            months = np.concatenate([record['months'][:keep], months])
+            sums = np.concatenate([record['sums'][:keep], sums])
+            counts = np.concatenate([record['counts'][:keep], counts])
+        else:
+            months, sums, counts = month_return_sums(times, close)
+
+        record = {
+            'version': np.int64(version or 0),
+            'bar_count': np.int64(len(times)),
+            'first_time': np.int64(times[0] if len(times) else 0),
+            'last_time': np.int64(times[-1] if len(times) else 0),
+            'months': months,
+            'sums': sums,
+            'counts': counts
+        }
+        try:
+            self._save(symbol, interval, record)
+        except OSError as e:
+            logger.error(f"Could not save monthly returns for {symbol}: {str(e)}")
+        return record
+
+    def matrix(self, symbol, df, interval='1D'):
+        """Year x month mean daily returns (fractions) over the bars of df.
+
+        Months fully inside df are read from the store. The first and last
+        month may be partial, so they are computed from df itself; the result
+        equals grouping df's own daily returns by month.
+        """
+        times = df['time'].to_numpy().astype('datetime64[ns]')
+        close = df['close'].to_numpy(dtype='f8')
+        if len(times) == 0:
+            return pd.DataFrame(dtype=float)
+        first_month, last_month = month_keys(times[[0, -1]])
+        if interval not in CACHEABLE_INTERVALS or last_month - first_month < 2:
+            return returns_matrix(*month_return_sums(times, close))
+
+        first_end = np.datetime64(int(first_month) + 1, 'M').astype('datetime64[ns]')
+        last_start = np.datetime64(int(last_month), 'M').astype('datetime64[ns]')
+        head = int(np.searchsorted(times, first_end, side='left'))
+        tail = int(np.searchsorted(times, last_start, side='left'))
+        head_months, head_sums, head_counts = month_return_sums(times[:head], close[:head])
+        tail_months, tail_sums, tail_counts = month_return_sums(times[tail:], close[tail:], close[tail - 1])
+
+        months, sums, counts = self.get(symbol, interval)
+        inner = (months > first_month) & (months < last_month)
+        return returns_matrix(
+            np.concatenate([head_months, months[inner], tail_months]),
+            np.concatenate([head_sums, sums[inner], tail_sums]),
+            np.concatenate([head_counts, counts[inner], tail_counts])
+        )
@@ -0,0 +1,201 @@
+import os
+import zlib
+import hashlib
+import logging
+from datetime import datetime
+
+import numpy as np
+import pymongo
+from bson import Binary
+
+from models.sentiment_store import content_hash
+from models.ticker_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_CLUSTER_COLLECTION = "article_clusters"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+
+MINHASH_PERMUTATIONS = 128
+# 32 bands of 4 rows: a pair collides in at least one band with probability
+# 1 - (1 - J**4)**32, i.e. ~0.9998 at Jaccard 0.7 and ~0.87 at 0.5, so pairs at
+# the threshold are all found; candidates are then checked against it.
+LSH_BANDS = 32
+SHINGLE_WORDS = 4
+
+# Prefixes every band key, so keys from another banding never match.
+_BAND_LAYOUT = f"{LSH_BANDS}x{MINHASH_PERMUTATIONS // LSH_BANDS}"
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS).astype('int64')
+_PERM_B = _rng.randint(0, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS).astype('int64')
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """Hashes of the accent-folded word shingles of text (stable across processes)."""
+    tokens = tokenize(text or "")
+    if len(tokens) < size:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.array([zlib.crc32(s.encode('utf-8')) % _MERSENNE_PRIME for s in shingles], dtype='int64')
+
+def minhash_signature(text):
+    """MinHash signature of text, or None when it has no words."""
+    hashes = shingle_hashes(text)
+    if len(hashes) == 0:
+        return None
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _MERSENNE_PRIME
+    return permuted.min(axis=0).astype('uint32')
+
+def estimated_jaccard(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+def band_keys(signature):
+    """LSH bucket keys; near-duplicates share at least one with high probability."""
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * rows:(band + 1) * rows].tobytes()
+        keys.append(f"{_BAND_LAYOUT}:{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+    return keys
+
+class ArticleClusterIndex:
+    """Persistent MinHash/LSH index that groups near-duplicate article texts.
+
+    Each distinct text is stored once in Mongo with its signature, LSH band
+    keys and cluster id. Assigning a batch costs one indexed query on the band
+    keys plus one bulk upsert; a text close to a stored one joins its cluster,
+    so syndicated copies seen in later runs map to the same cluster id.
+    """
+
+    def __init__(self, collection, threshold=NEAR_DUP_THRESHOLD):
+        self.collection = collection
+        self.threshold = threshold
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        try:
+            self.collection.create_index([("bands", pymongo.ASCENDING)], name="bands")
+            self._indexes_ready = True
+        except Exception as e:
+            logger.error(f"Error creating article cluster indexes: {str(e)}")
+
+    def rebuild_bands(self, batch_size=1000):
+        """Recomputes band keys stored under an older LSH layout from their signatures.
+
+        Returns the number of entries updated; until then they cannot be
+        matched by new texts.
+        """
+        self.ensure_indexes()
+        updated = 0
+        while True:
+            docs = list(self.collection.find(
+                {"bands": {"$not": {"$regex": f"^{_BAND_LAYOUT}:"}}},
+                {"signature": 1}
+            ).limit(batch_size))
+            if not docs:
+                break
+            self.collection.bulk_write([
+                pymongo.UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {"bands": band_keys(np.frombuffer(doc["signature"], dtype='uint32'))}}
+                )
+                for doc in docs
+            ], ordered=False)
+            updated += len(docs)
+        if updated:
+            logger.info(f"Rebuilt LSH bands of {updated} article cluster entries")
+        return updated
+
+    def assign(self, texts):
+        """Returns key -> cluster id for a dict of key -> article text.
+
+        Texts without words get no entry. The cluster id of a new group is the
+        content hash of its first text, so ids are stable once stored.
+        """
+        items = {}
+        for key, text in texts.items():
+            signature = minhash_signature(text)
+            if signature is not None:
+                items[key] = (content_hash(text), signature, band_keys(signature))
+        if not items:
+            return {}
+
+        self.ensure_indexes()
+        all_bands = sorted({band for _, _, bands in items.values() for band in bands})
+        try:
+            stored = list(self.collection.find(
+                {"bands": {"$in": all_bands}},
+                {"cluster_id": 1, "signature": 1, "bands": 1}
+            ))
+        except Exception as e:
+            logger.error(f"Error reading article clusters: {str(e)}")
+            stored = []
+
+        buckets = {}
+        for doc in stored:
+            signature = np.frombuffer(doc["signature"], dtype='uint32')
+            for band in doc["bands"]:
+                buckets.setdefault(band, []).append(("stored", doc["_id"], signature, doc["cluster_id"]))
+        for key, (text_hash, signature, bands) in items.items():
+            for band in bands:
+                buckets.setdefault(band, []).append(("new", key, signature, None))
+
+        parent = {key: key for key in items}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        stored_cluster = {}
+        for key, (text_hash, signature, bands) in items.items():
+            checked = set()
+            for band in bands:
+                for kind, other, other_signature, cluster_id in buckets[band]:
+                    if (kind, other) in checked or (kind == "new" and other == key):
+                        continue
+                    checked.add((kind, other))
+                    if estimated_jaccard(signature, other_signature) < self.threshold:
+                        continue
+                    if kind == "stored":
+                        current = stored_cluster.get(key)
+                        stored_cluster[key] = cluster_id if current is None else min(current, cluster_id)
+                    else:
+                        root_a, root_b = find(key), find(other)
+                        if root_a != root_b:
+                            parent[max(root_a, root_b, key=str)] = min(root_a, root_b, key=str)
+
+        groups = {}
+        for key in items:
+            groups.setdefault(find(key), []).append(key)
+
+        assignments = {}
+        for members in groups.values():
+            known = [stored_cluster[key] for key in members if key in stored_cluster]
+            cluster_id = min(known) if known else items[members[0]][0]
+            for key in members:
+                assignments[key] = cluster_id
+
+        operations = []
+        now = datetime.now()
+        for key, (text_hash, signature, bands) in items.items():
+            operations.append(pymongo.UpdateOne(
+                {"_id": text_hash},
+                {"$setOnInsert": {
+                    "cluster_id": assignments[key],
+                    "signature": Binary(signature.tobytes()),
+                    "bands": bands,
+                    "created_at": now
+                }},
+                upsert=True
+            ))
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing article clusters: {str(e)}")
+        return assignments
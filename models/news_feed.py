@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import heapq
+import base64
+import logging
+import threading
+from itertools import islice
+from datetime import datetime
+
+import pymongo
+from bson import ObjectId
+
+from models.news_sources import NEWS_COLLECTION_NAMES
+
+logger = logging.getLogger(__name__)
+
+TRENDING_SNAPSHOT_COLLECTION = "trending_snapshots"
+TRENDING_SNAPSHOT_TTL = int(os.getenv("TRENDING_SNAPSHOT_TTL", "300"))
+TRENDING_SNAPSHOT_SIZE = 50
+
+SOURCE_STATS_COLLECTION = "source_stats"
+SOURCE_STATS_TTL = int(os.getenv("SOURCE_STATS_TTL", "600"))
+
+NEWS_FEED_MAX_LIMIT = 100
+
+NEWS_FEED_PROJECTION = {"_id": 1, "title": 1, "post_time": 1, "full_url": 1, "tickers": 1, "description": 1}
+
+TRENDING_WINDOWS = {
+    "24h": 24 * 3600,
+    "7d": 7 * 24 * 3600,
+    "30d": 30 * 24 * 3600,
+    "all": None
+}
+
+def trending_pipeline(since=None, limit=TRENDING_SNAPSHOT_SIZE):
+    """One aggregation counting ticker mentions across every news collection.
+
+    Runs on the first collection and pulls the others in with $unionWith, so
+    the $group and $limit apply to global counts rather than per source.
+    """
+    match = {"tickers": {"$exists": True, "$ne": None}}
+    if since is not None:
+        match["post_time"] = {"$gte": since}
+    per_source = [{"$match": match}, {"$project": {"_id": 0, "tickers": 1}}]
+
+    pipeline = list(per_source)
+    for name in list(NEWS_COLLECTION_NAMES.values())[1:]:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": per_source}})
+    pipeline += [
+        {"$unwind": "$tickers"},
+        {"$group": {"_id": "$tickers", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": limit}
+    ]
+    return pipeline
+
+def compute_trending(db, window="all", limit=TRENDING_SNAPSHOT_SIZE):
+    seconds = TRENDING_WINDOWS[window]
+    since = time.time() - seconds if seconds else None
+    first_collection = db[list(NEWS_COLLECTION_NAMES.values())[0]]
+    results = first_collection.aggregate(trending_pipeline(since, limit), allowDiskUse=True)
+    return [{"ticker": row["_id"], "count": row["count"]} for row in results]
+
+def refresh_trending_snapshot(db, window="all"):
+    items = compute_trending(db, window)
+    db[TRENDING_SNAPSHOT_COLLECTION].replace_one(
+        {"_id": window},
+        {"_id": window, "items": items, "computed_at": time.time(), "updated_at": datetime.now()},
+        upsert=True
+    )
+    return items
+
+def refresh_trending_snapshots(db, windows=None):
+    """Recomputes the snapshot of every window; run by the sentiment worker every TRENDING_SNAPSHOT_TTL."""
+    for window in windows or TRENDING_WINDOWS:
+        refresh_trending_snapshot(db, window)
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _refresh_in_background(name, func, *args):
+    """Runs func(*args) on a daemon thread unless a refresh with this name is running."""
+    with _refreshing_lock:
+        if name in _refreshing:
+            return
+        _refreshing.add(name)
+
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f"Error refreshing {name}: {str(e)}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(name)
+
+    threading.Thread(target=run, name=f"refresh-{name}", daemon=True).start()
+
+def get_trending(db, window="all", limit=10, max_age=TRENDING_SNAPSHOT_TTL):
+    """Returns trending tickers from the precomputed snapshot.
+
+    Reading costs one small document; the sentiment worker keeps the snapshots
+    fresh. A stale or missing snapshot is recomputed on a background thread
+    (in case no worker runs) and, when missing, an empty list is returned
+    rather than scanning every news collection on the request.
+    """
+    if window not in TRENDING_WINDOWS:
+        raise ValueError(f"Unknown trending window: {window}")
+    snapshot = db[TRENDING_SNAPSHOT_COLLECTION].find_one({"_id": window})
+    if snapshot is None or time.time() - snapshot["computed_at"] > max_age:
+        _refresh_in_background(f"trending-{window}", refresh_trending_snapshot, db, window)
+    if snapshot is None:
+        return []
+    return snapshot["items"][:limit]
+
+def ensure_news_indexes(news_collections):
+    """Creates the indexes the news feed and ticker lookups rely on."""
+    for source, collection in news_collections.items():
+        collection.create_index(
+            [("post_time", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+            name="post_time_id"
+        )
+        collection.create_index(
+            [("tickers", pymongo.ASCENDING), ("post_time", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)],
+            name="tickers_post_time_id"
+        )
+
+def encode_feed_cursor(post_time, doc_id):
+    payload = json.dumps({"t": post_time, "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_feed_cursor(token):
+    """Returns (post_time, ObjectId) from a cursor token; raises ValueError if malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return payload["t"], ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid news cursor: {token}") from e
+
+def _source_stream(collection, source, ticker, after, limit):
+    query = {"post_time": {"$exists": True}}
+    if ticker:
+        query["tickers"] = ticker
+    if after is not None:
+        post_time, doc_id = after
+        query = {"$and": [query, {"$or": [
+            {"post_time": {"$lt": post_time}},
+            {"post_time": post_time, "_id": {"$lt": doc_id}}
+        ]}]}
+    cursor = collection.find(query, NEWS_FEED_PROJECTION).sort(
+        [("post_time", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+    ).limit(limit)
+    for item in cursor:
+        item["source"] = source
+        yield item
+
+def format_news_item(item):
+    """Adds the url/source/ticker/date fields the templates expect."""
+    item["url"] = item.get("full_url", "")
+    if "tickers" in item and item["tickers"]:
+        item["ticker"] = item["tickers"][0]
+    if "post_time" in item:
+        item["date"] = datetime.fromtimestamp(item["post_time"]).strftime('%Y-%m-%d')
+    return item
+
+def get_news_page(news_collections, limit=20, cursor=None, ticker=None, sources=None):
+    """Returns one page of the newest news across sources, keyset-paginated.
+
+    Each source contributes an index-ordered cursor on (post_time, _id), and
+    the streams are merged lazily with a heap, so a page reads at most
+    limit + 1 documents per source no matter how deep it is.
+
+    Returns:
+        Dictionary with "items" and "next_cursor" (None on the last page)
+    """
+    limit = max(1, min(int(limit), NEWS_FEED_MAX_LIMIT))
+    after = decode_feed_cursor(cursor) if cursor else None
+    selected = {
+        source: collection for source, collection in news_collections.items()
+        if not sources or source in sources
+    }
+    streams = [
+        _source_stream(collection, source, ticker, after, limit + 1)
+        for source, collection in selected.items()
+    ]
+    merged = heapq.merge(*streams, key=lambda item: (item["post_time"], item["_id"]), reverse=True)
+    page = list(islice(merged, limit + 1))
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_feed_cursor(last["post_time"], last["_id"])
+
+    items = []
+    for item in page:
+        item["id"] = str(item.pop("_id"))
+        items.append(format_news_item(item))
+    return {"items": items, "next_cursor": next_cursor}
+
+def compute_source_stats(news_collections):
+    """Collects per-source statistics using collection metadata and index-backed queries only."""
+    now = time.time()
+    stats = {}
+    for source, collection in news_collections.items():
+        latest = collection.find_one(
+            {"post_time": {"$exists": True}},
+            {"_id": 0, "post_time": 1},
+            sort=[("post_time", pymongo.DESCENDING)]
+        )
+        stats[source] = {
+            "total": collection.estimated_document_count(),
+            "last_24h": collection.count_documents({"post_time": {"$gte": now - 24 * 3600}}),
+            "last_7d": collection.count_documents({"post_time": {"$gte": now - 7 * 24 * 3600}}),
+            "distinct_tickers": len(collection.distinct("tickers")),
+            "latest_post_time": latest["post_time"] if latest else None
+        }
+    return stats
+
+def refresh_source_stats(db, news_collections):
+    stats = compute_source_stats(news_collections)
+    db[SOURCE_STATS_COLLECTION].replace_one(
+        {"_id": "sources"},
+        {"_id": "sources", "sources": stats, "computed_at": time.time(), "updated_at": datetime.now()},
+        upsert=True
+    )
+    return stats
+
+def get_source_stats(db, news_collections, max_age=SOURCE_STATS_TTL):
+    """Returns the stored per-source statistics without scanning any news collection.
+
+    A stale document is served while it is refreshed in the background. Before
+    the first refresh finishes, only estimated_document_count totals are
+    returned.
+    """
+    doc = db[SOURCE_STATS_COLLECTION].find_one({"_id": "sources"})
+    if doc is None or time.time() - doc["computed_at"] > max_age:
+        _refresh_in_background("source-stats", refresh_source_stats, db, news_collections)
+    if doc is None:
+        return {
+            source: {"total": collection.estimated_document_count()}
+            for source, collection in news_collections.items()
+        }
+    return doc["sources"]
@@ -0,0 +1,371 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+import pymongo
+from bson import ObjectId
+
+from models.lazy import lazy_singleton
+from models.ticker_index import get_ticker_index, tokenize
+
+faiss = None
+
+logger = logging.getLogger(__name__)
+
+NEWS_INDEX_DIR = os.getenv("NEWS_INDEX_DIR", os.path.join("data", "news_index"))
+# "hashing" is a local deterministic embedder; "vertex" uses Vertex AI embeddings.
+NEWS_EMBEDDER = os.getenv("NEWS_EMBEDDER", "hashing")
+NEWS_EMBEDDING_MODEL = os.getenv("NEWS_EMBEDDING_MODEL", "text-multilingual-embedding-002")
+NEWS_INDEX_BATCH_SIZE = int(os.getenv("NEWS_INDEX_BATCH_SIZE", "256"))
+NEWS_INDEX_BODY_CHARS = 2000
+
+INDEX_DOC_PROJECTION = {"_id": 1, "title": 1, "description": 1, "full_url": 1, "post_time": 1, "tickers": 1}
+
+def load_faiss():
+    """Imports faiss on first use; returns None when faiss-cpu is not installed."""
+    global faiss
+    if faiss is None:
+        try:
+            import faiss as faiss_module
+        except ImportError:
+            return None
+        faiss = faiss_module
+    return faiss
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype='float32')
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder that needs no model or network.
+
+    Accent-folded unigrams and bigrams are hashed into ``dim`` signed buckets
+    and the vector is L2-normalized, so inner product is cosine similarity.
+    Scores are purely lexical, and generic name words ("ngân hàng", "cổ
+    phần", "việt nam") can rank another company's story above the ticker's
+    own, so ticker hits must also name the ticker or company
+    (``requires_mention``).
+    """
+
+    min_score = 0.1
+    requires_mention = True
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype='float32')
+        tokens = tokenize(text or "")
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            vector[value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        return vector
+
+    def embed_documents(self, texts):
+        if not texts:
+            return np.zeros((0, self.dim), dtype='float32')
+        return _normalize_rows([self._embed(text) for text in texts])
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+class VertexEmbedder:
+    """Vertex AI text embeddings through langchain, normalized for cosine search."""
+
+    min_score = 0.3
+    requires_mention = False
+
+    def __init__(self, model=NEWS_EMBEDDING_MODEL):
+        from langchain_google_vertexai import VertexAIEmbeddings
+        self._embeddings = VertexAIEmbeddings(model_name=model)
+        self.name = f"vertex-{model}"
+
+    def embed_documents(self, texts):
+        return _normalize_rows(self._embeddings.embed_documents(list(texts)))
+
+    def embed_query(self, text):
+        return _normalize_rows([self._embeddings.embed_query(text)])[0]
+
+def create_embedder(kind=NEWS_EMBEDDER):
+    if kind == "vertex":
+        return VertexEmbedder()
+    if kind == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown news embedder: {kind}")
+
+def article_text(doc, body=""):
+    """Text embedded for one article: title, description and the start of the body."""
+    parts = [doc.get("title") or "", doc.get("description") or "", (body or "")[:NEWS_INDEX_BODY_CHARS]]
+    return "\n".join(part for part in parts if part)
+
+class SemanticNewsIndex:
+    """On-disk FAISS index of news articles that grows incrementally.
+
+    Vectors live in ``index.faiss`` (inner-product search over normalized
+    embeddings, so scores are cosine similarities) with article metadata in an
+    append-only ``docs.jsonl`` and per-source (post_time, _id) watermarks in
+    ``state.json``; each embedder gets its own directory. Readers load the
+    index memory-mapped and reload it when the file changes, while ``sync``
+    (run by the background worker) appends new articles and swaps the file in
+    atomically.
+    """
+
+    def __init__(self, root=NEWS_INDEX_DIR, embedder=None):
+        if load_faiss() is None:
+            raise ImportError("faiss-cpu is required for semantic news search")
+        self.embedder = embedder or create_embedder()
+        self.root = os.path.join(root, self.embedder.name)
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_mtime = None
+        self._docs = {}
+        self._docs_offset = 0
+        self._times = np.zeros(0, dtype='float64')
+        self._ids = np.zeros(0, dtype='int64')
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.root, 'index.faiss')
+
+    @property
+    def _docs_path(self):
+        return os.path.join(self.root, 'docs.jsonl')
+
+    @property
+    def _state_path(self):
+        return os.path.join(self.root, 'state.json')
+
+    def _read_new_docs(self):
+        try:
+            with open(self._docs_path, 'r', encoding='utf-8') as f:
+                f.seek(self._docs_offset)
+                lines = f.readlines()
+                self._docs_offset = f.tell()
+        except FileNotFoundError:
+            return
+        added = []
+        rewritten = False
+        for line in lines:
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            # A sync interrupted before its watermark moved re-appends its batch
+            # under the same ids; the later line is the one in the index.
+            rewritten = rewritten or doc["id"] in self._docs
+            self._docs[doc["id"]] = doc
+            added.append(doc)
+        if rewritten:
+            docs = list(self._docs.values())
+            self._ids = np.array([d["id"] for d in docs], dtype='int64')
+            self._times = np.array([d.get("post_time") or 0 for d in docs], dtype='float64')
+        elif added:
+            self._ids = np.concatenate([self._ids, np.array([d["id"] for d in added], dtype='int64')])
+            self._times = np.concatenate([self._times, np.array([d.get("post_time") or 0 for d in added], dtype='float64')])
+
+    def _refresh(self):
+        """Loads (memory-mapped) or reloads the index if the file changed since the last read."""
+        try:
+            mtime = os.path.getmtime(self._index_path)
+        except OSError:
+            return
+        if mtime == self._index_mtime:
+            return
+        self._read_new_docs()
+        self._index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        self._index_mtime = mtime
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return 0 if self._index is None else self._index.ntotal
+
+    def search(self, query, k=20, date_range=None):
+        """Returns up to k article dicts most similar to query, each with a "score".
+
+        date_range is an optional (start_timestamp, end_timestamp) pair on post_time.
+        """
+        with self._lock:
+            self._refresh()
+            if self._index is None or self._index.ntotal == 0:
+                return []
+            params = None
+            if date_range is not None:
+                start, end = date_range
+                mask = (self._times >= start) & (self._times <= end)
+                if not mask.any():
+                    return []
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(self._ids[mask]))
+            vector = self.embedder.embed_query(query).reshape(1, -1)
+            scores, ids = self._index.search(vector, k, params=params)
+            results = []
+            for score, doc_id in zip(scores[0], ids[0]):
+                if doc_id < 0 or int(doc_id) not in self._docs:
+                    continue
+                doc = dict(self._docs[int(doc_id)])
+                doc["score"] = float(score)
+                results.append(doc)
+            return results
+
+    def _load_state(self):
+        try:
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"next_id": 1, "sources": {}}
+        for mark in state["sources"].values():
+            if ObjectId.is_valid(mark["last_id"]):
+                mark["last_id"] = ObjectId(mark["last_id"])
+        return state
+
+    def _write_json(self, path, payload):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def sync(self, news_collections, fetcher=None, batch_size=NEWS_INDEX_BATCH_SIZE):
+        """Embeds articles added to the collections since the last sync; returns how many were added.
+
+        Only one process should sync a given directory at a time.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        state = self._load_state()
+        try:
+            index = faiss.read_index(self._index_path)
+        except RuntimeError:
+            index = None
+        if index is not None:
+            # Vectors of a batch whose watermark was never written are dropped
+            # so that re-embedding it does not add their ids a second time.
+            stale = index.remove_ids(faiss.IDSelectorRange(state["next_id"], np.iinfo('int64').max))
+            if stale:
+                logger.warning(f"Semantic news index: dropped {stale} vectors of an unfinished sync")
+        total = 0
+        for source, collection in news_collections.items():
+            while True:
+                mark = state["sources"].get(source)
+                query = {"post_time": {"$exists": True}}
+                if mark is not None:
+                    query = {"$or": [
+                        {"post_time": {"$gt": mark["post_time"]}},
+                        {"post_time": mark["post_time"], "_id": {"$gt": mark["last_id"]}}
+                    ]}
+                docs = list(collection.find(query, INDEX_DOC_PROJECTION).sort(
+                    [("post_time", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+                ).limit(batch_size))
+                if not docs:
+                    break
+
+                bodies = {}
+                if fetcher is not None:
+                    bodies = fetcher.fetch_many([doc.get("full_url", "") for doc in docs])
+                vectors = self.embedder.embed_documents(
+                    [article_text(doc, bodies.get(doc.get("full_url", ""), "")) for doc in docs]
+                )
+                if index is None:
+                    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+                ids = np.arange(state["next_id"], state["next_id"] + len(docs), dtype='int64')
+                index.add_with_ids(vectors, ids)
+
+                with open(self._docs_path, 'a', encoding='utf-8') as f:
+                    for doc_id, doc in zip(ids, docs):
+                        f.write(json.dumps({
+                            "id": int(doc_id),
+                            "source": source,
+                            "doc_id": str(doc["_id"]),
+                            "title": doc.get("title", ""),
+                            "description": doc.get("description", ""),
+                            "url": doc.get("full_url", ""),
+                            "post_time": doc.get("post_time"),
+                            "tickers": doc.get("tickers") or []
+                        }, ensure_ascii=False) + "\n")
+                # The index is written before the watermark moves, so a crash
+                # re-embeds at most one batch instead of skipping it; the next
+                # sync drops that batch's vectors first and reuses its ids.
+                tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+                faiss.write_index(index, tmp_path)
+                os.replace(tmp_path, self._index_path)
+
+                last = docs[-1]
+                state["next_id"] = int(ids[-1]) + 1
+                state["sources"][source] = {"post_time": last["post_time"], "last_id": last["_id"]}
+                self._write_json(self._state_path, self._serializable_state(state))
+                total += len(docs)
+                if len(docs) < batch_size:
+                    break
+        if total:
+            logger.info(f"Semantic news index: added {total} articles")
+        return total
+
+    def _serializable_state(self, state):
+        sources = {
+            source: {"post_time": mark["post_time"], "last_id": str(mark["last_id"])}
+            for source, mark in state["sources"].items()
+        }
+        return {"next_id": state["next_id"], "sources": sources, "updated_at": datetime.now().isoformat()}
+
+# Leading words of company names that say nothing about which company it is.
+_GENERIC_NAME_TOKENS = {"cong", "ty", "co", "phan", "ngan", "hang", "thuong", "mai", "tmcp",
+                        "tnhh", "tap", "doan", "tong", "dau", "tu"}
+
+def mentions_ticker(ticker, text):
+    """True when text names the ticker symbol or the distinctive part of its company name."""
+    tokens = tokenize(text or "")
+    if ticker.lower() in tokens:
+        return True
+    index = get_ticker_index()
+    if index is None or not index.contains(ticker):
+        return False
+    name = tokenize(index.name(ticker.upper()))
+    while name and name[0] in _GENERIC_NAME_TOKENS:
+        name = name[1:]
+    if not name:
+        return False
+    return f" {' '.join(name)} " in f" {' '.join(tokens)} "
+
+def ticker_query(ticker_or_query):
+    """Expands a listed ticker to "TICKER company name"; other text is used as is."""
+    index = get_ticker_index()
+    candidate = ticker_or_query.strip().upper()
+    if index is not None and index.contains(candidate):
+        return f"{candidate} {index.name(candidate)}"
+    return ticker_or_query
+
+@lazy_singleton
+def get_semantic_index():
+    """Returns the shared reader index, or None when faiss is not installed."""
+    if load_faiss() is None:
+        return None
+    return SemanticNewsIndex()
+
+def semantic_news(ticker_or_query, k=20, date_range=None, index=None, min_score=None):
+    """Returns up to k articles close to a ticker (or free-text query), optionally within a post_time range.
+
+    Hits scoring below min_score are dropped; it defaults to the embedder's
+    own ``min_score``, since score scales differ between embedders. With a
+    lexical embedder, hits for a listed ticker must also mention it.
+    """
+    index = index or get_semantic_index()
+    if index is None:
+        return []
+    if min_score is None:
+        min_score = index.embedder.min_score
+    hits = [
+        hit for hit in index.search(ticker_query(ticker_or_query), k=k, date_range=date_range)
+        if hit["score"] >= min_score
+    ]
+    ticker = ticker_or_query.strip().upper()
+    ticker_index = get_ticker_index()
+    if index.embedder.requires_mention and ticker_index is not None and ticker_index.contains(ticker):
+        hits = [hit for hit in hits if mentions_ticker(ticker, f"{hit.get('title', '')} {hit.get('description', '')}")]
+    return hits
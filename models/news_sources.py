@@ -0,0 +1,9 @@
+NEWS_COLLECTION_NAMES = {
+    "cafef": "cafef_vn",
+    "vnexpress": "vnexpress_net",
+    "tinnhanhchungkhoan": "www_tinnhanhchungkhoan_vn"
+}
+
+def get_news_collections(db):
+    """Returns a dict of source name -> news collection."""
+    return {source: db[name] for source, name in NEWS_COLLECTION_NAMES.items()}
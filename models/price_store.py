@@ -0,0 +1,244 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join("data", "prices"))
+
+# Weekly and monthly bars are rebuilt by the source as the period progresses,
+# so only intervals whose past bars are final are persisted.
+CACHEABLE_INTERVALS = ('1m', '5m', '15m', '30m', '1H', '1D')
+
+BAR_DTYPE = np.dtype([
+    ('time', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if hasattr(value, 'year') and hasattr(value, 'month'):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def _merge_ranges(ranges):
+    """Merges overlapping or adjacent [start, end] date ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def missing_ranges(covered, start, end):
+    """Returns the parts of [start, end] that are not inside any covered range."""
+    gaps = []
+    cursor = start
+    for cov_start, cov_end in _merge_ranges(covered):
+        if cov_end < cursor:
+            continue
+        if cov_start > end:
+            break
+        if cov_start > cursor:
+            gaps.append((cursor, cov_start - timedelta(days=1)))
+        cursor = max(cursor, cov_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+def frame_to_bars(df):
+    """Converts a vnstock history frame to the structured bar array."""
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['time'] = pd.to_datetime(df['time']).values.astype('datetime64[ns]').astype('i8')
+    for column in PRICE_COLUMNS:
+        bars[column] = df[column].to_numpy(dtype='f8')
+    return bars
+
+def bars_to_frame(bars):
+    """Converts a structured bar array back to the vnstock history layout."""
+    df = pd.DataFrame({'time': pd.to_datetime(np.asarray(bars['time']).astype('datetime64[ns]'))})
+    for column in PRICE_COLUMNS:
+        df[column] = np.asarray(bars[column])
+    df['volume'] = df['volume'].astype('int64')
+    return df
+
+class PriceStore:
+    """On-disk OHLCV store keyed by symbol and interval with incremental backfill.
+
+    Each (symbol, interval) pair is kept as one structured ``.npy`` file that is
+    memory-mapped on read, plus a ``meta.json`` listing the date ranges already
+    fetched from the source. Requests only fetch the days that are not covered.
+    """
+
+    def __init__(self, root, fetcher):
+        self.root = root
+        self.fetcher = fetcher
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def data_version(self, symbol, interval='1D'):
+        """Returns a counter that changes whenever bars for the series change."""
+        if interval not in CACHEABLE_INTERVALS:
+            return None
+        return self.read_meta(symbol, interval).get('version', 0)
+
+    def last_modified(self, symbol, interval='1D'):
+        """Returns when the series last changed as a Unix timestamp, or None if unknown."""
+        if interval not in CACHEABLE_INTERVALS:
+            return None
+        return self.read_meta(symbol, interval).get('modified_at')
+
+    def covers(self, symbol, start_date, end_date, interval='1D'):
+        """True when every day of [start_date, end_date] is stored, so get_range would not fetch."""
+        if interval not in CACHEABLE_INTERVALS:
+            return False
+        meta = self.read_meta(symbol, interval)
+        return not missing_ranges(meta['covered'], _to_date(start_date), _to_date(end_date))
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, interval, symbol.upper())
+
+    def series_path(self, symbol, interval, filename):
+        """Path of a file stored alongside a series (for data derived from its bars)."""
+        series_dir = self._series_dir(symbol, interval)
+        os.makedirs(series_dir, exist_ok=True)
+        return os.path.join(series_dir, filename)
+
+    def _bars_path(self, symbol, interval):
+        return os.path.join(self._series_dir(symbol, interval), 'bars.npy')
+
+    def _meta_path(self, symbol, interval):
+        return os.path.join(self._series_dir(symbol, interval), 'meta.json')
+
+    @contextmanager
+    def _lock(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            series_dir = self._series_dir(symbol, interval)
+            os.makedirs(series_dir, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(series_dir, '.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_meta(self, symbol, interval):
+        try:
+            with open(self._meta_path(symbol, interval), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'covered': [], 'version': 0}
+        meta['covered'] = [[_to_date(s), _to_date(e)] for s, e in meta.get('covered', [])]
+        return meta
+
+    def _write_meta(self, symbol, interval, meta):
+        payload = dict(meta)
+        payload['covered'] = [[s.isoformat(), e.isoformat()] for s, e in meta['covered']]
+        path = self._meta_path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def read_bars(self, symbol, interval):
+        """Returns the memory-mapped bar array for a series, or an empty array."""
+        try:
+            return np.load(self._bars_path(symbol, interval), mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return np.empty(0, dtype=BAR_DTYPE)
+
+    def _write_bars(self, symbol, interval, bars):
+        path = self._bars_path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, bars)
+        os.replace(tmp_path, path)
+
+    def get_range(self, symbol, start_date, end_date, interval='1D'):
+        """Returns bars for [start_date, end_date], fetching only uncovered days."""
+        if interval not in CACHEABLE_INTERVALS:
+            return self.fetcher(symbol, start_date, end_date, interval)
+
+        start = _to_date(start_date)
+        end = _to_date(end_date)
+        # Today's bar is still forming, so it is fetched but never marked covered.
+        last_final_day = datetime.now().date() - timedelta(days=1)
+
+        meta = self.read_meta(symbol, interval)
+        gaps = missing_ranges(meta['covered'], start, end)
+        if gaps:
+            with self._lock(symbol, interval):
+                meta = self.read_meta(symbol, interval)
+                gaps = missing_ranges(meta['covered'], start, end)
+                if gaps:
+                    self._backfill(symbol, interval, meta, gaps, last_final_day)
+
+        bars = self.read_bars(symbol, interval)
+        lo = np.datetime64(start, 'ns').astype('i8')
+        hi = np.datetime64(end + timedelta(days=1), 'ns').astype('i8')
+        times = bars['time']
+        selected = bars[np.searchsorted(times, lo, side='left'):np.searchsorted(times, hi, side='left')]
+        if len(selected) == 0:
+            return None
+        return bars_to_frame(selected)
+
+    def _backfill(self, symbol, interval, meta, gaps, last_final_day):
+        fetched = []
+        covered = list(meta['covered'])
+        changed = False
+        for gap_start, gap_end in gaps:
+            df = self.fetcher(symbol, gap_start.isoformat(), gap_end.isoformat(), interval)
+            if df is None:
+                logger.warning(f"Price backfill failed for {symbol} {interval} {gap_start}..{gap_end}")
+                continue
+            if not df.empty:
+                fetched.append(frame_to_bars(df))
+            if gap_start <= last_final_day:
+                covered.append([gap_start, min(gap_end, last_final_day)])
+
+        if fetched:
+            existing = np.array(self.read_bars(symbol, interval))
+            # New bars come first so they win over stored bars with the same timestamp.
+            combined = np.concatenate(fetched[::-1] + [existing])
+            _, first_index = np.unique(combined['time'], return_index=True)
+            merged = combined[first_index]
+            # Today's bar is refetched on every request; readers in other
+            # processes keep the file mapped, so it is only rewritten (and the
+            # version bumped) when a bar was added or actually changed.
+            if len(merged) != len(existing) or not np.array_equal(merged, existing):
+                self._write_bars(symbol, interval, merged)
+                meta['version'] = meta.get('version', 0) + 1
+                meta['last_time'] = int(merged['time'][-1])
+                meta['modified_at'] = datetime.now().timestamp()
+                changed = True
+
+        covered = _merge_ranges(covered)
+        if changed or covered != meta['covered']:
+            meta['covered'] = covered
+            self._write_meta(symbol, interval, meta)
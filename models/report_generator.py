@@ -7,29 +7,32 @@ from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-import matplotlib.pyplot as plt
 import base64
 from visualizations.stock_plots import (
-    get_stock_data,
-    get_internal_reports
+    compute_monthly_returns,
+    figure_to_png,
+    get_data_version,
+    get_indicators,
+    get_internal_reports,
+    load_stock_data
 )
+from visualizations.chart_cache import chart_key, submit_cached_charts
 import pandas as pd
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')  
+from matplotlib.figure import Figure
 
 logger = logging.getLogger(__name__)
 
 def plot_to_image_bytes(fig):
     """Convert matplotlib figure to bytes for embedding in ReportLab PDF"""
-    img_buffer = io.BytesIO()
-    fig.savefig(img_buffer, format='png', dpi=100, bbox_inches='tight')
-    img_buffer.seek(0)
-    return img_buffer.getvalue()
+    return figure_to_png(fig, dpi=100, bbox_inches='tight')
 
 def create_line_chart(stock_df, symbol):
     """Create a line chart of closing prices"""
-    fig, ax = plt.subplots(figsize=(8, 4))
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
     ax.plot(stock_df.index, stock_df['close'], label='Closing Price')
     ax.set_title(f'{symbol} Price History')
     ax.set_xlabel('Date')
@@ -40,7 +43,8 @@ def create_line_chart(stock_df, symbol):
 
 def create_volume_chart(stock_df, symbol):
     """Create a volume chart"""
-    fig, ax = plt.subplots(figsize=(8, 4))
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
     ax.bar(stock_df.index, stock_df['volume'], label='Volume')
     ax.set_title(f'{symbol} Trading Volume')
     ax.set_xlabel('Date')
@@ -51,7 +55,8 @@ def create_volume_chart(stock_df, symbol):
 
 def create_candlestick_chart(stock_df, symbol):
     """Create a candlestick chart"""
-    fig, ax = plt.subplots(figsize=(8, 4))
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
     
     width = 0.6
     
@@ -77,14 +82,15 @@ def create_candlestick_chart(stock_df, symbol):
     ax.set_ylabel('Price')
     ax.grid(True)
     
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
     
     return fig
 
 def create_volume_price_chart(stock_df, symbol):
     """Create a combined volume and price chart"""
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 6), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    fig = Figure(figsize=(8, 6))
+    ax1, ax2 = fig.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
     
     ax1.plot(stock_df.index, stock_df['close'], label='Closing Price')
     ax1.set_title(f'{symbol} Price and Volume')
@@ -97,12 +103,13 @@ def create_volume_price_chart(stock_df, symbol):
     ax2.set_ylabel('Volume')
     ax2.grid(True)
     
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
 def create_mock_shareholders_chart(symbol):
     """Create a mock shareholders chart"""
-    fig, ax = plt.subplots(figsize=(6, 6))
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
     
     shareholders = {
         'Institutional': 45,
@@ -118,29 +125,18 @@ def create_mock_shareholders_chart(symbol):
     
     return fig
 
-def create_monthly_returns_heatmap(stock_df, symbol):
-    """Create a monthly returns heatmap"""
-    if not stock_df.empty and len(stock_df) > 30: 
-        if not isinstance(stock_df.index, pd.DatetimeIndex):
-            stock_df.index = pd.to_datetime(stock_df.index)
-            
-        stock_df['returns'] = stock_df['close'].pct_change()
-        
-        monthly_returns = stock_df['returns'].groupby([stock_df.index.year, stock_df.index.month]).mean() * 100
-        
-        years = sorted(set(stock_df.index.year))
+def create_monthly_returns_heatmap(monthly_returns, symbol):
+    """Create a monthly returns heatmap from a year x month matrix of mean daily returns"""
+    if not monthly_returns.empty:
+        monthly_returns = monthly_returns.reindex(columns=range(1, 13))
+        years = list(monthly_returns.index)
         months = range(1, 13)
+        heatmap_data = monthly_returns.to_numpy() * 100
         
-        heatmap_data = np.full((len(years), 12), np.nan)
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
         
-        for i, year in enumerate(years):
-            for j, month in enumerate(months):
-                if (year, month) in monthly_returns.index:
-                    heatmap_data[i, j] = monthly_returns[(year, month)]
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        cmap = plt.cm.RdYlGn
+        cmap = matplotlib.colormaps['RdYlGn']
         
         im = ax.imshow(heatmap_data, cmap=cmap)
         
@@ -152,21 +148,51 @@ def create_monthly_returns_heatmap(stock_df, symbol):
         ax.set_xticklabels(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
         ax.set_yticklabels(years)
         
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
+        for label in ax.get_xticklabels():
+            label.set(rotation=45, ha="right", rotation_mode="anchor")
         
         ax.set_title(f"{symbol} Monthly Returns (%)")
         fig.tight_layout()
         
         return fig
     else:
-        fig, ax = plt.subplots(figsize=(8, 4))
+        fig = Figure(figsize=(8, 4))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Not enough data for heatmap', 
                 horizontalalignment='center', verticalalignment='center',
                 transform=ax.transAxes, fontsize=14)
         ax.axis('off')
         return fig
 
-def generate_stock_report_data(symbol, start_date, end_date, include_plots=None, sentiment_data=None):
+REPORT_CHARTS = [
+    ('line', 'line_chart'),
+    ('volume', 'volume_chart'),
+    ('candlestick', 'candlestick_chart'),
+    ('volume_price', 'volume_price_chart'),
+    ('shareholders', 'shareholders_chart'),
+    ('heatmap', 'returns_heatmap'),
+]
+
+def render_report_chart(kind, stock_df, symbol):
+    """Build one report chart and return it as PNG bytes (runs inside render workers)"""
+    if kind == 'line':
+        fig = create_line_chart(stock_df, symbol)
+    elif kind == 'volume':
+        fig = create_volume_chart(stock_df, symbol)
+    elif kind == 'candlestick':
+        fig = create_candlestick_chart(stock_df, symbol)
+    elif kind == 'volume_price':
+        fig = create_volume_price_chart(stock_df, symbol)
+    elif kind == 'shareholders':
+        fig = create_mock_shareholders_chart(symbol)
+    elif kind == 'heatmap':
+        monthly_returns = compute_monthly_returns(stock_df, symbol) if len(stock_df) > 30 else pd.DataFrame()
+        fig = create_monthly_returns_heatmap(monthly_returns, symbol)
+    else:
+        raise ValueError(f"Unknown report chart: {kind}")
+    return plot_to_image_bytes(fig)
+
+def generate_stock_report_data(symbol, start_date, end_date, include_plots=None, sentiment_data=None, context=None):
     """
     Generate stock report data with selected visualizations.
     
@@ -176,6 +202,7 @@ def generate_stock_report_data(symbol, start_date, end_date, include_plots=None,
         end_date: End date for analysis
         include_plots: List of plot types to include
         sentiment_data: Optional sentiment analysis data
+        context: Optional StockDataContext sharing the price frame of the request
         
     Returns:
         Dictionary with report data
@@ -196,7 +223,7 @@ def generate_stock_report_data(symbol, start_date, end_date, include_plots=None,
     }
     
     try:
-        stock_df = get_stock_data(symbol, start_date, end_date)
+        stock_df = load_stock_data(symbol, start_date, end_date, context=context)
         
         if stock_df is not None and not stock_df.empty:
             if not isinstance(stock_df.index, pd.DatetimeIndex):
@@ -212,35 +239,18 @@ def generate_stock_report_data(symbol, start_date, end_date, include_plots=None,
                 'summary_stats': stock_df.describe().to_dict()
             }
             
-            if 'line' in include_plots:
-                fig = create_line_chart(stock_df, symbol)
-                report_data['plots']['line_chart'] = plot_to_image_bytes(fig)
-                plt.close(fig)
+            data_version = get_data_version(symbol)
+            chart_tasks = {}
+            chart_keys = {}
+            for kind, plot_key in REPORT_CHARTS:
+                if kind in include_plots:
+                    chart_tasks[plot_key] = (render_report_chart, (kind, stock_df, symbol), {})
+                    chart_keys[plot_key] = chart_key(symbol, f"report_{plot_key}", start_date, end_date, data_version=data_version)
             
-            if 'volume' in include_plots:
-                fig = create_volume_chart(stock_df, symbol)
-                report_data['plots']['volume_chart'] = plot_to_image_bytes(fig)
-                plt.close(fig)
-                
-            if 'candlestick' in include_plots:
-                fig = create_candlestick_chart(stock_df, symbol)
-                report_data['plots']['candlestick_chart'] = plot_to_image_bytes(fig)
-                plt.close(fig)
-                
-            if 'volume_price' in include_plots:
-                fig = create_volume_price_chart(stock_df, symbol)
-                report_data['plots']['volume_price_chart'] = plot_to_image_bytes(fig)
-                plt.close(fig)
-                
-            if 'shareholders' in include_plots:
-                fig = create_mock_shareholders_chart(symbol)
-                report_data['plots']['shareholders_chart'] = plot_to_image_bytes(fig)
-                plt.close(fig)
-                
-            if 'heatmap' in include_plots:
-                fig = create_monthly_returns_heatmap(stock_df, symbol)
-                report_data['plots']['returns_heatmap'] = plot_to_image_bytes(fig)
-                plt.close(fig)
+            for plot_key, png in submit_cached_charts(chart_tasks, chart_keys).results().items():
+                if png is None:
+                    report_data['errors'].append(f"Error rendering {plot_key}")
+                report_data['plots'][plot_key] = png
         else:
             report_data['errors'].append(f"No stock data found for {symbol} in the specified date range")
             
@@ -455,7 +465,7 @@ def get_sentiment_analysis(symbol, start_date, end_date):
         'daily_sentiment': daily_sentiment
     }
 
-def get_stock_summary(symbol, start_date, end_date, interval='1D'):
+def get_stock_summary(symbol, start_date, end_date, interval='1D', context=None):
     """
     Generate a summary of stock performance.
     
@@ -464,30 +474,32 @@ def get_stock_summary(symbol, start_date, end_date, interval='1D'):
         start_date: Start date for analysis
         end_date: End date for analysis
         interval: Data interval
+        context: Optional StockDataContext sharing the price frame of the request
         
     Returns:
         Dictionary with summary data
     """
-    stock_df = get_stock_data(symbol, start_date, end_date, interval)
+    stock_df = load_stock_data(symbol, start_date, end_date, interval, context)
     if stock_df is None or stock_df.empty:
         return None
     
-    latest_price = stock_df['close'].iloc[-1]
-    start_price = stock_df['close'].iloc[0]
+    close = stock_df['close'].to_numpy(dtype=float)
+    latest_price = close[-1]
+    start_price = close[0]
     price_change = latest_price - start_price
     price_change_pct = (price_change / start_price) * 100
     
-    stock_df['MA20'] = stock_df['close'].rolling(window=20).mean()
-    stock_df['MA50'] = stock_df['close'].rolling(window=50).mean()
+    indicators = get_indicators(symbol, stock_df, interval)
+    latest = {name: (None if np.isnan(value) else float(value)) for name, value in indicators.iloc[-1].items()}
     
-    if len(stock_df) >= 20:
-        current_ma20 = stock_df['MA20'].iloc[-1]
+    current_ma20 = latest.get('sma_20')
+    if current_ma20 is not None:
         trend = "Tăng" if latest_price > current_ma20 else "Giảm"
     else:
         trend = "Không xác định (không đủ dữ liệu)"
     
-    returns = stock_df['close'].pct_change().dropna()
-    volatility = returns.std() * 100
+    returns = close[1:] / close[:-1] - 1
+    volatility = returns.std(ddof=1) * 100 if len(returns) > 1 else float('nan')
     
     summary = {
         'symbol': symbol,
@@ -499,6 +511,9 @@ def get_stock_summary(symbol, start_date, end_date, interval='1D'):
         'avg_volume': stock_df['volume'].mean(),
         'trend': trend,
         'volatility': volatility,
+        'ma20': current_ma20,
+        'ma50': latest.get('sma_50'),
+        'indicators': latest,
         'start_date': start_date,
         'end_date': end_date
     }
@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_RESULT_DIR = os.getenv("REPORT_RESULT_DIR", os.path.join("data", "reports"))
+REPORT_RESULT_TTL = int(os.getenv("REPORT_RESULT_TTL", str(6 * 3600)))
+# A queued or running job not updated for this long is assumed lost with its process.
+REPORT_JOB_STALE = int(os.getenv("REPORT_JOB_STALE", "900"))
+REPORT_EVICT_INTERVAL = int(os.getenv("REPORT_EVICT_INTERVAL", "3600"))
+REPORT_JOB_HISTORY = 500
+# Seconds between status reads while waiting on a job run by another process.
+_REMOTE_POLL = 0.5
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# Finished, but its PDF has since been evicted or removed.
+JOB_EXPIRED = "expired"
+
+def report_job_key(params):
+    """Returns a stable key for a report request; identical requests share it."""
+    payload = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _atomic_write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+class ReportJob:
+    """State of one report build, as reported by the status endpoint."""
+
+    def __init__(self, key, params):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = JOB_QUEUED
+        self.error = None
+        self.path = None
+        self.cached = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.updated_at = self.created_at
+        self._done = threading.Event()
+        # Set for jobs run by another process: re-reads their stored state.
+        self._reload = None
+
+    @classmethod
+    def from_record(cls, record, reload=None):
+        job = cls(record["key"], record["params"])
+        job.id = record["job_id"]
+        for name in ("status", "error", "path", "cached", "created_at", "started_at", "finished_at", "updated_at"):
+            setattr(job, name, record.get(name))
+        job._reload = reload
+        if job.finished:
+            job._done.set()
+        return job
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED, JOB_EXPIRED)
+
+    def wait(self, timeout=None):
+        """Blocks until the job finishes; returns True if it did within timeout."""
+        if self._reload is None:
+            return self._done.wait(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(_REMOTE_POLL if remaining is None else min(_REMOTE_POLL, remaining))
+            record = self._reload(self.id)
+            if record is not None:
+                for name in ("status", "error", "path", "cached", "started_at", "finished_at", "updated_at"):
+                    setattr(self, name, record.get(name))
+        return True
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "cached": self.cached,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    def to_record(self):
+        record = self.to_dict()
+        record.update({"key": self.key, "path": self.path, "updated_at": self.updated_at})
+        return record
+
+class ReportJobQueue:
+    """Builds PDF reports on a bounded thread pool and caches the finished files.
+
+    ``build_report(**params)`` must return the PDF bytes. Submitting parameters
+    that match a queued or running job returns that job instead of starting a
+    second build, and a PDF finished less than ``ttl`` seconds ago is served
+    from ``result_dir`` without building anything. Job state is written to
+    ``result_dir/jobs`` and the running job of each key to
+    ``result_dir/inflight``, so status polls and duplicate submissions work
+    whichever worker process they reach. Expired PDFs and job records are
+    removed in the background every REPORT_EVICT_INTERVAL seconds.
+    """
+
+    def __init__(self, build_report, max_workers=REPORT_JOB_WORKERS,
+                 result_dir=REPORT_RESULT_DIR, ttl=REPORT_RESULT_TTL):
+        self.build_report = build_report
+        self.result_dir = result_dir
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}
+        self._next_eviction = 0.0
+
+    def _result_path(self, key):
+        return os.path.join(self.result_dir, f"{key}.pdf")
+
+    def _job_path(self, job_id):
+        return os.path.join(self.result_dir, 'jobs', f"{job_id}.json")
+
+    def _inflight_path(self, key):
+        return os.path.join(self.result_dir, 'inflight', f"{key}.json")
+
+    def _cached_result(self, key):
+        path = self._result_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) <= self.ttl:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def _save(self, job):
+        job.updated_at = time.time()
+        try:
+            _atomic_write_json(self._job_path(job.id), job.to_record())
+        except OSError as e:
+            logger.error(f"Could not save report job {job.id}: {str(e)}")
+
+    def _load_record(self, job_id):
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return _read_json(self._job_path(job_id))
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        if len(self._jobs) > REPORT_JOB_HISTORY:
+            finished = [j for j in self._jobs.values() if j.finished]
+            finished.sort(key=lambda j: j.finished_at or j.created_at)
+            for old in finished[:len(self._jobs) - REPORT_JOB_HISTORY]:
+                del self._jobs[old.id]
+
+    def _remote_inflight(self, key):
+        """The live queued or running job another process holds for key, if any."""
+        marker = _read_json(self._inflight_path(key))
+        record = self._load_record(marker.get("job_id")) if marker else None
+        if record is None or record.get("status") not in (JOB_QUEUED, JOB_RUNNING):
+            return None
+        if time.time() - (record.get("updated_at") or 0) > REPORT_JOB_STALE:
+            return None
+        return ReportJob.from_record(record, reload=self._load_record)
+
+    def submit(self, params):
+        """Queues a report build for params (a JSON-serializable dict) and returns its job."""
+        self._schedule_eviction()
+        key = report_job_key(params)
+        with self._lock:
+            running = self._inflight.get(key)
+            if running is not None:
+                return running
+
+            cached_path = self._cached_result(key)
+            if cached_path is None:
+                remote = self._remote_inflight(key)
+                if remote is not None:
+                    return remote
+
+            job = ReportJob(key, params)
+            self._remember(job)
+            if cached_path is not None:
+                job.status = JOB_DONE
+                job.path = cached_path
+                job.cached = True
+                job.finished_at = time.time()
+                job._done.set()
+                self._save(job)
+                return job
+
+            self._inflight[key] = job
+            self._save(job)
+            try:
+                _atomic_write_json(self._inflight_path(key), {"job_id": job.id})
+            except OSError as e:
+                logger.error(f"Could not mark report job {job.id} in flight: {str(e)}")
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            pdf = self.build_report(**job.params)
+            if not pdf:
+                raise RuntimeError("Không thể tạo báo cáo PDF - Kết quả trống")
+            path = self._result_path(job.key)
+            os.makedirs(self.result_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf)
+            os.replace(tmp_path, path)
+            job.path = path
+            job.status = JOB_DONE
+            logger.info(f"Report job {job.id} finished in {time.time() - job.started_at:.2f}s")
+        except Exception as e:
+            logger.error(f"Report job {job.id} failed: {str(e)}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            with self._lock:
+                self._inflight.pop(job.key, None)
+                marker = _read_json(self._inflight_path(job.key))
+                if marker and marker.get("job_id") == job.id:
+                    try:
+                        os.remove(self._inflight_path(job.key))
+                    except OSError:
+                        pass
+            job._done.set()
+
+    def get(self, job_id):
+        """Returns a job by id, from this process or from the shared job records."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        record = self._load_record(job_id)
+        if record is None:
+            return None
+        return ReportJob.from_record(record, reload=self._load_record)
+
+    def mark_expired(self, job):
+        """Records that a finished job's PDF is gone; submitting its parameters again rebuilds it."""
+        job.status = JOB_EXPIRED
+        job.error = "Báo cáo đã hết hạn, vui lòng tạo lại"
+        job.path = None
+        self._save(job)
+
+    def stats(self):
+        """Job counts by status for the jobs submitted to this process."""
+        with self._lock:
+            counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_DONE: 0, JOB_FAILED: 0, JOB_EXPIRED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def _schedule_eviction(self):
+        now = time.time()
+        with self._lock:
+            if now < self._next_eviction:
+                return
+            self._next_eviction = now + REPORT_EVICT_INTERVAL
+        self._executor.submit(self.evict_expired)
+
+    def evict_expired(self):
+        """Deletes cached PDFs and job records older than ttl, and stale in-flight markers.
+
+        Returns the number of files removed.
+        """
+        removed = 0
+        now = time.time()
+        targets = (
+            (self.result_dir, '.pdf', self.ttl),
+            (os.path.join(self.result_dir, 'jobs'), '.json', self.ttl),
+            (os.path.join(self.result_dir, 'inflight'), '.json', REPORT_JOB_STALE)
+        )
+        for directory, suffix, max_age in targets:
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if name.endswith(suffix) and now - os.path.getmtime(path) > max_age:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            logger.info(f"Removed {removed} expired report files")
+        return removed
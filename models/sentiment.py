@@ -0,0 +1,255 @@
+import os
+import logging
+
+from models.llm_scheduler import PRIORITY_HIGH, PRIORITY_MEDIUM, run_scheduled
+from models.sentiment_store import content_hash
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Bump whenever SENTIMENT_PROMPT, INSIGHT_PROMPT or the parsing rules change so
+# results stored under the previous prompts are not reused.
+SENTIMENT_PROMPT_VERSION = "1"
+
+SENTIMENT_PROMPT = """
+                    Phân tích tình cảm (sentiment) của tin tức tài chính này về cổ phiếu {ticker}:
+                    ---
+                    {content}  # Using more content for better analysis but limit length
+                    ---
+                    Phân loại sentient thành một trong các loại: positive (tích cực), neutral (trung lập), negative (tiêu cực).
+                    Chỉ trả về một từ duy nhất: positive, neutral, hoặc negative.
+                    """
+
+INSIGHT_PROMPT = """
+                            Bạn là một chuyên gia phân tích tài chính với kinh nghiệm phân tích cổ phiếu Việt Nam. 
+                            Hãy phân tích nội dung bài báo sau đây về mã cổ phiếu {ticker} và đưa ra nhận định chuyên sâu.
+
+                            Nội dung bài báo:
+                            {content}
+
+                            Hãy phân tích các yếu tố sau (nếu có trong bài báo):
+                            1. Kết quả kinh doanh gần đây hoặc dự kiến
+                            2. Chiến lược phát triển của công ty
+                            3. Các thay đổi về quản trị, nhân sự cấp cao
+                            4. Các dự án, sản phẩm, dịch vụ mới
+                            5. Tình hình thị trường và đối thủ cạnh tranh
+
+                            Đưa ra nhận định ngắn gọn trong 2-3 câu, tập trung vào thông tin quan trọng nhất.
+                            """
+
+def build_article_text(news, full_content):
+    """Joins title, description and the fetched body into the text that gets classified."""
+    title = news.get('title', '')
+    description = news.get('description', '')
+    if full_content:
+        return f"{title} {description} {full_content}"
+    return f"{title} {description}"
+
+def build_sentiment_prompt(ticker, content):
+    return SENTIMENT_PROMPT.format(ticker=ticker, content=content[:3000])
+
+def build_insight_prompt(ticker, full_content):
+    return INSIGHT_PROMPT.format(ticker=ticker, content=full_content[:2000])
+
+def parse_sentiment(text):
+    """Maps a raw LLM answer to positive, negative or neutral."""
+    response = text.strip().lower()
+    if "positive" in response or "tích cực" in response:
+        return "positive"
+    if "negative" in response or "tiêu cực" in response:
+        return "negative"
+    return "neutral"
+
+def parse_insight(text):
+    """Returns the insight text, or None when the model found nothing to say."""
+    insight = text.strip()
+    if "không đủ thông tin" in insight.lower() or "không có thông tin" in insight.lower():
+        return None
+    return insight
+
+def invoke_batch(llm, prompts, limiter=None, max_concurrency=LLM_MAX_CONCURRENCY,
+                 scheduler=None, priority=PRIORITY_MEDIUM):
+    """Runs prompts through llm.batch with bounded concurrency.
+
+    When a limiter is given, prompts are sent in chunks no larger than its
+    burst capacity and each chunk waits for enough tokens first. When an
+    LLMScheduler is given, each chunk also queues at the given priority for
+    the per-minute call limit and daily token budget, and its real token
+    usage is recorded. Failed or refused prompts come back as exception
+    objects in their slot.
+    """
+    if not prompts:
+        return []
+    chunk_size = len(prompts)
+    if limiter is not None:
+        chunk_size = min(chunk_size, max(1, int(limiter.capacity)))
+    if scheduler is not None:
+        chunk_size = min(chunk_size, max(1, scheduler.max_batch))
+    results = []
+    for start in range(0, len(prompts), chunk_size):
+        chunk = prompts[start:start + chunk_size]
+        if limiter is not None:
+            limiter.acquire(len(chunk))
+        if scheduler is not None:
+            results.extend(run_scheduled(scheduler, llm, chunk, priority, max_concurrency))
+            continue
+        try:
+            results.extend(llm.batch(chunk, config={"max_concurrency": max_concurrency}, return_exceptions=True))
+        except Exception as e:
+            results.extend([e] * len(chunk))
+    return results
+
+def classify_articles(llm, ticker, news_items, full_contents, limiter=None,
+                      max_concurrency=LLM_MAX_CONCURRENCY, store=None, clusters=None,
+                      scheduler=None, priority=PRIORITY_HIGH):
+    """Sets "sentiment" (and "insight" where available) on each news item in place.
+
+    Articles are grouped before any LLM call: by near-duplicate cluster when an
+    ArticleClusterIndex is given, otherwise by their first 1000 characters.
+    Only one representative per group (the one with the longest body) is
+    classified and its labels are copied to the rest; only bodies longer than
+    100 characters get an insight. When a SentimentStore is given, stored
+    results for the same article or for another copy in its cluster are
+    reused and fresh ones are saved back with their cluster id, so only
+    never-seen stories reach the LLM. With a scheduler, sentiment calls queue
+    at priority and insight calls at no better than PRIORITY_MEDIUM. Items
+    whose sentiment or insight call failed (including calls refused for the
+    token budget or queue timeout) get "llm_failed": True.
+    """
+    texts = {}
+    record_ids = {}
+    for index, news in enumerate(news_items):
+        content = build_article_text(news, full_contents[index])
+        if not content.strip():
+            news["sentiment"] = "neutral"
+            continue
+        texts[index] = content
+        if store is not None:
+            record_ids[index] = store.record_id(news.get("url", ""), ticker, content)
+
+    stored = store.get_many(list(record_ids.values())) if store is not None else {}
+
+    pending = []
+    for index in texts:
+        record = stored.get(record_ids.get(index))
+        if record is not None:
+            _apply_record(news_items[index], record)
+            continue
+        pending.append(index)
+
+    cluster_ids = {}
+    if clusters is not None and pending:
+        cluster_ids = clusters.assign({index: texts[index] for index in pending})
+    cluster_records = {}
+    if store is not None and cluster_ids:
+        cluster_records = store.get_by_clusters(ticker, cluster_ids.values())
+
+    completed = set()
+    groups = {}
+    for index in pending:
+        cluster_id = cluster_ids.get(index)
+        record = cluster_records.get(cluster_id)
+        if record is not None:
+            _apply_record(news_items[index], record)
+            completed.add(index)
+            continue
+        if llm is None:
+            news_items[index]["sentiment"] = "neutral"
+            continue
+        groups.setdefault(cluster_id or texts[index][:1000], []).append(index)
+
+    representatives = {}
+    followers = []
+    for group, members in groups.items():
+        representative = max(members, key=lambda index: len(full_contents[index] or ""))
+        representatives[group] = representative
+        followers.extend((index, group) for index in members if index != representative)
+
+    rep_indexes = list(representatives.values())
+    responses = invoke_batch(
+        llm,
+        [build_sentiment_prompt(ticker, texts[index]) for index in rep_indexes],
+        limiter=limiter,
+        max_concurrency=max_concurrency,
+        scheduler=scheduler,
+        priority=priority
+    )
+
+    insight_indexes = []
+    for index, response in zip(rep_indexes, responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error in sentiment analysis: {str(response)}")
+            news_items[index]["sentiment"] = "neutral"
+            news_items[index]["llm_failed"] = True
+            continue
+        news_items[index]["sentiment"] = parse_sentiment(response.content)
+        full_content = full_contents[index]
+        if full_content and len(full_content) > 100:
+            insight_indexes.append(index)
+        else:
+            completed.add(index)
+
+    insight_responses = invoke_batch(
+        llm,
+        [build_insight_prompt(ticker, full_contents[index]) for index in insight_indexes],
+        limiter=limiter,
+        max_concurrency=max_concurrency,
+        scheduler=scheduler,
+        priority=max(priority, PRIORITY_MEDIUM)
+    )
+    for index, response in zip(insight_indexes, insight_responses):
+        if isinstance(response, Exception):
+            logger.error(f"Error generating insights: {str(response)}")
+            news_items[index]["llm_failed"] = True
+            continue
+        completed.add(index)
+        insight = parse_insight(response.content)
+        if insight is not None:
+            news_items[index]["insight"] = insight
+
+    for index, group in followers:
+        representative = news_items[representatives[group]]
+        news_items[index]["sentiment"] = representative["sentiment"]
+        if "insight" in representative:
+            news_items[index]["insight"] = representative["insight"]
+        if representative.get("llm_failed"):
+            news_items[index]["llm_failed"] = True
+        if representatives[group] in completed:
+            completed.add(index)
+
+    if store is not None and completed:
+        records = []
+        for index in sorted(completed):
+            news = news_items[index]
+            record = {
+                "_id": record_ids[index],
+                "url": news.get("url", ""),
+                "ticker": ticker,
+                "content_hash": content_hash(texts[index]),
+                "sentiment": news["sentiment"]
+            }
+            if "insight" in news:
+                record["insight"] = news["insight"]
+            if cluster_ids.get(index):
+                record["cluster_id"] = cluster_ids[index]
+            records.append(record)
+        store.put_many(records)
+
+    return news_items
+
+def _apply_record(news, record):
+    news["sentiment"] = record["sentiment"]
+    if record.get("insight"):
+        news["insight"] = record["insight"]
+
+def apply_stored_sentiment(ticker, news_items, store):
+    """Fills sentiment/insight from precomputed records only; unseen articles stay neutral."""
+    records = store.get_latest(ticker, [news.get("url", "") for news in news_items])
+    for news in news_items:
+        record = records.get(news.get("url", ""))
+        if record is None:
+            news["sentiment"] = "neutral"
+            continue
+        _apply_record(news, record)
+    return news_items
@@ -0,0 +1,120 @@
+import hashlib
+import logging
+from datetime import datetime
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_COLLECTION = "article_sentiment"
+
+def content_hash(text):
+    """Stable hash of the classified text (unlike hash(), it is not salted per process)."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class SentimentStore:
+    """Sidecar Mongo collection holding sentiment labels and insights per article.
+
+    Records are keyed by article URL, ticker, a hash of the classified text,
+    the prompt version and the model name, so an article is only sent to the
+    LLM again when its content, the prompts or the model change.
+    """
+
+    def __init__(self, collection, model_name, prompt_version):
+        self.collection = collection
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        """Creates the lookup index once per process; safe to call repeatedly."""
+        if self._indexes_ready:
+            return
+        try:
+            self.collection.create_index(
+                [("url", pymongo.ASCENDING), ("ticker", pymongo.ASCENDING)],
+                name="url_ticker"
+            )
+            self.collection.create_index(
+                [("cluster_id", pymongo.ASCENDING), ("ticker", pymongo.ASCENDING)],
+                name="cluster_ticker"
+            )
+            self._indexes_ready = True
+        except Exception as e:
+            logger.error(f"Error creating sentiment store indexes: {str(e)}")
+
+    def record_id(self, url, ticker, text):
+        """Returns the _id for an (article, ticker, content, prompt, model) combination."""
+        key = "|".join([url or "", ticker, content_hash(text), str(self.prompt_version), str(self.model_name)])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_many(self, record_ids):
+        """Returns a dict of _id -> stored record for the ids that exist."""
+        if not record_ids:
+            return {}
+        self.ensure_indexes()
+        try:
+            cursor = self.collection.find({"_id": {"$in": list(set(record_ids))}})
+            return {doc["_id"]: doc for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error reading sentiment store: {str(e)}")
+            return {}
+
+    def get_latest(self, ticker, urls):
+        """Returns url -> newest record for a ticker under the current prompt and model.
+
+        Used by readers that only want precomputed results and do not have the
+        article text needed to rebuild the exact record id.
+        """
+        urls = [url for url in set(urls) if url]
+        if not urls:
+            return {}
+        self.ensure_indexes()
+        try:
+            cursor = self.collection.find({
+                "url": {"$in": urls},
+                "ticker": ticker,
+                "prompt_version": self.prompt_version,
+                "model": self.model_name
+            }).sort("updated_at", pymongo.ASCENDING)
+            return {doc["url"]: doc for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error reading sentiment store: {str(e)}")
+            return {}
+
+    def get_by_clusters(self, ticker, cluster_ids):
+        """Returns cluster_id -> newest record of any article in that near-duplicate cluster."""
+        cluster_ids = [cluster_id for cluster_id in set(cluster_ids) if cluster_id]
+        if not cluster_ids:
+            return {}
+        self.ensure_indexes()
+        try:
+            cursor = self.collection.find({
+                "cluster_id": {"$in": cluster_ids},
+                "ticker": ticker,
+                "prompt_version": self.prompt_version,
+                "model": self.model_name
+            }).sort("updated_at", pymongo.ASCENDING)
+            return {doc["cluster_id"]: doc for doc in cursor}
+        except Exception as e:
+            logger.error(f"Error reading sentiment store: {str(e)}")
+            return {}
+
+    def put_many(self, records):
+        """Upserts records; each needs _id, url, ticker, content_hash and sentiment (cluster_id is optional)."""
+        if not records:
+            return
+        now = datetime.now()
+        operations = []
+        for record in records:
+            fields = dict(record)
+            fields.update({
+                "prompt_version": self.prompt_version,
+                "model": self.model_name,
+                "updated_at": now
+            })
+            operations.append(pymongo.UpdateOne({"_id": fields.pop("_id")}, {"$set": fields}, upsert=True))
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing sentiment store: {str(e)}")
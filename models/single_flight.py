@@ -0,0 +1,83 @@
+import threading
+
+_groups = []
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers share its result.
+
+    A caller that arrives while the same key is in flight waits for that call
+    instead of starting another, and gets its return value (passed through
+    ``copy`` so callers never share a mutable result) or its exception; if the
+    call was interrupted (KeyboardInterrupt, SystemExit) waiters get a
+    RuntimeError instead. The
+    key is forgotten as soon as the call finishes, so later callers compute
+    afresh. Coalescing is per process.
+    """
+
+    def __init__(self, name, copy=None):
+        self.name = name
+        self.copy = copy
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+        _groups.append(self)
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if isinstance(call.error, Exception):
+                raise call.error
+            if call.error is not None:
+                # KeyboardInterrupt, SystemExit and the like belong to the leader's thread.
+                raise RuntimeError(f"{self.name} call for {key!r} was interrupted") from call.error
+            return self.copy(call.result) if self.copy is not None else call.result
+
+        try:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+            # No caller can join any more; waiters copy call.result, so the
+            # leader takes its own copy before they are released.
+            if call.waiters and self.copy is not None:
+                return self.copy(call.result)
+            return call.result
+        finally:
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            calls = self.executions + self.collapsed
+            return {
+                "calls": calls,
+                "executions": self.executions,
+                "collapsed": self.collapsed,
+                "collapsed_ratio": round(self.collapsed / calls, 4) if calls else 0.0,
+                "in_flight": len(self._calls)
+            }
+
+def single_flight_stats():
+    """Stats of every SingleFlight group in this process, keyed by name."""
+    return {group.name: group.stats() for group in _groups}
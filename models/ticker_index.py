@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import bisect
+import logging
+import unicodedata
+
+from models.lazy import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+TICKER_INDEX_FILE = os.getenv(
+    "TICKER_INDEX_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vnstock.json")
+)
+SEARCH_MAX_LIMIT = 50
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+def fold_accents(text):
+    """Lower-cases text and strips Vietnamese diacritics ("Đường" -> "duong")."""
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split(fold_accents(text)) if token]
+
+class TickerIndex:
+    """Prefix trie over tickers plus an accent-insensitive token index over company names.
+
+    Every trie node keeps the sorted tickers below it, so a prefix lookup is a
+    walk of len(prefix) dict hops. Name tokens are kept sorted for bisect, so
+    the last (possibly partial) word of a query matches by prefix while the
+    other words must match whole tokens.
+    """
+
+    def __init__(self, names):
+        self.names = {ticker.upper(): name for ticker, name in names.items()}
+        self._trie = {'tickers': [], 'children': {}}
+        for ticker in sorted(self.names):
+            node = self._trie
+            node['tickers'].append(ticker)
+            for ch in ticker:
+                node = node['children'].setdefault(ch, {'tickers': [], 'children': {}})
+                node['tickers'].append(ticker)
+
+        self._token_tickers = {}
+        for ticker, name in self.names.items():
+            for token in tokenize(name):
+                self._token_tickers.setdefault(token, set()).add(ticker)
+        self._tokens = sorted(self._token_tickers)
+
+    def __len__(self):
+        return len(self.names)
+
+    def contains(self, ticker):
+        return ticker.upper() in self.names
+
+    def name(self, ticker):
+        return self.names.get(ticker.upper())
+
+    def tickers_with_prefix(self, prefix):
+        node = self._trie
+        for ch in prefix.upper():
+            node = node['children'].get(ch)
+            if node is None:
+                return []
+        return node['tickers']
+
+    def _tickers_for_token_prefix(self, prefix):
+        matches = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches |= self._token_tickers[token]
+        return matches
+
+    def search_names(self, query):
+        """Returns tickers whose name contains every query word (the last one as a prefix)."""
+        tokens = tokenize(query)
+        if not tokens:
+            return set()
+        matches = self._tickers_for_token_prefix(tokens[-1])
+        for token in tokens[:-1]:
+            if not matches:
+                break
+            matches &= self._token_tickers.get(token, set())
+        return matches
+
+    def search(self, query, limit=10):
+        """Returns up to limit {"ticker", "name"} matches: exact ticker, ticker prefix, then name."""
+        query = query.strip()
+        if not query:
+            return []
+        limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+
+        ordered = []
+        compact = fold_accents(query).replace(' ', '').upper()
+        if compact.isalnum():
+            ordered.extend(self.tickers_with_prefix(compact)[:limit])
+        if len(ordered) < limit:
+            seen = set(ordered)
+            ordered.extend(t for t in sorted(self.search_names(query)) if t not in seen)
+        return [{"ticker": ticker, "name": self.names[ticker]} for ticker in ordered[:limit]]
+
+@lazy_singleton
+def _load_ticker_index():
+    with open(TICKER_INDEX_FILE, 'r', encoding='utf-8') as f:
+        return TickerIndex(json.load(f))
+
+def get_ticker_index():
+    """Returns the shared index, loading vnstock.json on first use (None if it cannot be read)."""
+    try:
+        return _load_ticker_index()
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not load ticker index from {TICKER_INDEX_FILE}: {str(e)}")
+        return None
+
+def is_known_ticker(ticker):
+    """True when the ticker is listed, or when no ticker list is available to check against."""
+    index = get_ticker_index()
+    return index is None or index.contains(ticker)
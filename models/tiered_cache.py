@@ -0,0 +1,335 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join("data", "cache"))
+# Disk tiers rescan their directory for expired and oversized entries after this many writes.
+DISK_CACHE_EVICT_EVERY = int(os.getenv("DISK_CACHE_EVICT_EVERY", "200"))
+
+_caches = []
+
+def _sizeof(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_sizeof(key) + _sizeof(item) for key, item in value.items())
+    if hasattr(value, 'memory_usage'):
+        try:
+            return int(value.memory_usage(deep=False).sum())
+        except Exception:
+            pass
+    return 64
+
+def key_digest(key):
+    """Stable file name for a cache key (tuples of strings, numbers and None)."""
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+class MemoryTier:
+    """Byte-bounded in-process LRU with an optional per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and time.time() > expires_at:
+                del self._entries[key]
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions
+            }
+
+class DiskTier:
+    """Pickled entries under a directory shared by every process on the host.
+
+    Each entry is one ``<digest[:2]>/<digest>.pkl`` file holding its expiry
+    time and value, written atomically. Expired entries read as missing. Every
+    DISK_CACHE_EVICT_EVERY writes the directory is scanned on a background
+    thread: expired files are deleted, then the least recently written ones
+    until the total fits in max_bytes.
+
+    Unpickling runs code chosen by whoever wrote the file, so ``root`` must be
+    writable only by the service user. Directories are created with mode 0700,
+    and a root that is group- or world-writable is never read.
+    """
+
+    name = "disk"
+
+    def __init__(self, root, ttl, max_bytes, evict_every=DISK_CACHE_EVICT_EVERY):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        self._evicting = False
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.errors = 0
+        self._scanned = {"entries": None, "bytes": None}
+        self._root_checked = False
+
+    def _root_private(self):
+        """True when root exists and only its owner can write to it."""
+        if self._root_checked:
+            return True
+        try:
+            mode = os.stat(self.root).st_mode
+        except FileNotFoundError:
+            return False
+        if mode & 0o022:
+            logger.error(f"Cache directory {self.root} is writable by other users; not reading it")
+            return False
+        self._root_checked = True
+        return True
+
+    def _path(self, key):
+        digest = key_digest(key)
+        return os.path.join(self.root, digest[:2], f"{digest}.pkl")
+
+    def get(self, key):
+        if not self._root_private():
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Unreadable cache entry {path}: {str(e)}")
+            return None
+        if time.time() > expires_at:
+            return None
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((time.time() + self.ttl, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self.evict_in_background()
+
+    def _begin_eviction(self):
+        with self._lock:
+            if self._evicting:
+                return False
+            self._evicting = True
+            return True
+
+    def _end_eviction(self):
+        with self._lock:
+            self._evicting = False
+
+    def evict_in_background(self):
+        """Starts an eviction scan on a daemon thread unless one is already running."""
+        if self._begin_eviction():
+            # The scan walks the whole directory, so it runs off the request thread.
+            threading.Thread(target=self._evict_in_background, name="disk-cache-evict", daemon=True).start()
+
+    def _evict_in_background(self):
+        try:
+            self._evict()
+        except Exception as e:
+            logger.error(f"Disk cache eviction in {self.root} failed: {str(e)}")
+        finally:
+            self._end_eviction()
+
+    def evict(self):
+        """Runs an eviction scan now; returns the files removed, or 0 when another scan is running."""
+        if not self._begin_eviction():
+            return 0
+        try:
+            return self._evict()
+        finally:
+            self._end_eviction()
+
+    def _evict(self):
+        """Deletes expired entries, then the oldest until under max_bytes; returns the count removed."""
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith('.tmp'):
+                    # Only stale temporaries, left by a process that died mid-write, are removed.
+                    if now - stat.st_mtime > 3600:
+                        entries.append((True, stat.st_mtime, stat.st_size, path))
+                    continue
+                # An entry is written once with expiry mtime + ttl.
+                entries.append((stat.st_mtime + self.ttl < now, stat.st_mtime, stat.st_size, path))
+        # Expired entries first, then least recently written.
+        entries.sort(key=lambda entry: (not entry[0], entry[1]))
+        total = sum(entry[2] for entry in entries)
+        removed = 0
+        for expired, _, size, path in entries:
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+            self._scanned = {"entries": len(entries) - removed, "bytes": total}
+        return removed
+
+    def stats(self):
+        """Entry count and size from the last scan (None until one finishes; the first call starts one)."""
+        with self._lock:
+            scanned = self._scanned["entries"] is not None
+        if not scanned:
+            self.evict_in_background()
+        with self._lock:
+            return {
+                "entries": self._scanned["entries"],
+                "bytes": self._scanned["bytes"],
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "errors": self.errors
+            }
+
+class TieredCache:
+    """Looks a key up in each tier in turn, copying hits into the faster tiers.
+
+    Tiers are objects with ``get(key)`` (None when missing) and
+    ``put(key, value)``, usually a MemoryTier in front of a shared DiskTier.
+    Hits and misses are counted per tier and reported by ``stats``.
+    """
+
+    def __init__(self, name, tiers):
+        self.name = name
+        self.tiers = list(tiers)
+        self._lock = threading.Lock()
+        self._hits = [0] * len(self.tiers)
+        self._lookups = [0] * len(self.tiers)
+        _caches.append(self)
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logger.warning(f"{self.name} cache tier {index} failed: {str(e)}")
+                value = None
+            with self._lock:
+                self._lookups[index] += 1
+                if value is not None:
+                    self._hits[index] += 1
+            if value is not None:
+                for upper in self.tiers[:index]:
+                    upper.put(key, value)
+                return value
+        return None
+
+    def put(self, key, value):
+        if value is None:
+            return
+        for index, tier in enumerate(self.tiers):
+            try:
+                tier.put(key, value)
+            except Exception as e:
+                logger.warning(f"{self.name} cache tier {index} failed: {str(e)}")
+
+    def clear(self):
+        for tier in self.tiers:
+            if hasattr(tier, 'clear'):
+                tier.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = list(self._hits)
+            lookups = list(self._lookups)
+        tiers = []
+        for tier, tier_hits, tier_lookups in zip(self.tiers, hits, lookups):
+            entry = {
+                "tier": getattr(tier, 'name', type(tier).__name__),
+                "hits": tier_hits,
+                "misses": tier_lookups - tier_hits,
+                "hit_ratio": round(tier_hits / tier_lookups, 4) if tier_lookups else 0.0
+            }
+            if hasattr(tier, 'stats'):
+                entry.update(tier.stats())
+            tiers.append(entry)
+        requests = lookups[0] if lookups else 0
+        total_hits = sum(hits)
+        return {
+            "hits": total_hits,
+            "misses": requests - total_hits,
+            "hit_ratio": round(total_hits / requests, 4) if requests else 0.0,
+            "tiers": tiers
+        }
+
+def cache_stats():
+    """Stats of every TieredCache in this process, keyed by cache name."""
+    return {cache.name: cache.stats() for cache in _caches}
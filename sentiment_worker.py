@@ -0,0 +1,322 @@
+"""Background worker that precomputes sentiment for newly ingested news.
+
+Tails the news collections (change streams when the deployment supports them,
+otherwise ``post_time`` polling), fetches each new article, classifies it for
+every ticker it mentions and saves the result to the sentiment store, so
+/analyze can run with SENTIMENT_MODE=precomputed and never call the LLM.
+
+Run next to the web app:
+
+    python sentiment_worker.py --mode auto --interval 60
+"""
+import os
+import time
+import logging
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pymongo
+from dotenv import load_dotenv
+
+from models.article_fetcher import ArticleFetcher, ArticleTextCache
+from models.llm_client import LLM_MODEL, create_llm
+from models.llm_scheduler import PRIORITY_LOW, LLMScheduler, create_quota_state
+from models.near_duplicates import ArticleClusterIndex, ARTICLE_CLUSTER_COLLECTION
+from models.news_feed import TRENDING_SNAPSHOT_TTL, refresh_trending_snapshots
+from models.news_index import SemanticNewsIndex
+from models.news_sources import NEWS_COLLECTION_NAMES, get_news_collections
+from models.sentiment import build_article_text, classify_articles, SENTIMENT_PROMPT_VERSION
+from models.sentiment_store import SentimentStore, SENTIMENT_COLLECTION
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sentiment_worker")
+
+WORKER_STATE_COLLECTION = "sentiment_worker_state"
+# Articles whose sentiment could not be stored (LLM errors, exhausted budget)
+# are retried with exponential backoff, up to SENTIMENT_MAX_ATTEMPTS times.
+WORKER_RETRY_COLLECTION = "sentiment_worker_retry"
+SENTIMENT_MAX_ATTEMPTS = int(os.getenv("SENTIMENT_MAX_ATTEMPTS", "5"))
+SENTIMENT_RETRY_BASE = float(os.getenv("SENTIMENT_RETRY_BASE", "60"))
+
+ARTICLE_PROJECTION = {"_id": 1, "title": 1, "description": 1, "full_url": 1, "post_time": 1, "tickers": 1}
+
+class SentimentWorker:
+    """Classifies new articles source by source and remembers how far it got."""
+
+    def __init__(self, db, llm, fetcher, store, batch_size=50, backfill_days=30, semantic_index=None,
+                 clusters=None, scheduler=None):
+        self.db = db
+        self.llm = llm
+        self.fetcher = fetcher
+        self.store = store
+        self.batch_size = batch_size
+        self.backfill_days = backfill_days
+        self.semantic_index = semantic_index
+        self.clusters = clusters
+        self.scheduler = scheduler
+        self.news_collections = get_news_collections(db)
+        self.state = db[WORKER_STATE_COLLECTION]
+        self.retries = db[WORKER_RETRY_COLLECTION]
+        self._trending_refreshed_at = 0.0
+
+    def load_watermark(self, source):
+        """Returns (post_time, _id) of the last processed article of a source."""
+        doc = self.state.find_one({"_id": source})
+        if doc is None:
+            start = (datetime.now() - timedelta(days=self.backfill_days)).timestamp()
+            return start, None
+        return doc["post_time"], doc.get("last_id")
+
+    def save_watermark(self, source, post_time, last_id):
+        self.state.update_one(
+            {"_id": source},
+            {"$set": {"post_time": post_time, "last_id": last_id, "updated_at": datetime.now()}},
+            upsert=True
+        )
+
+    def next_batch(self, source):
+        post_time, last_id = self.load_watermark(source)
+        if last_id is None:
+            position = {"post_time": {"$gte": post_time}}
+        else:
+            position = {"$or": [
+                {"post_time": {"$gt": post_time}},
+                {"post_time": post_time, "_id": {"$gt": last_id}}
+            ]}
+        query = {"$and": [position, {"tickers": {"$exists": True, "$ne": []}}]}
+        cursor = self.news_collections[source].find(query, ARTICLE_PROJECTION).sort(
+            [("post_time", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+        ).limit(self.batch_size)
+        return list(cursor)
+
+    def process_articles(self, articles):
+        """Fetches and classifies raw news documents for all their tickers.
+
+        Returns the set of article _ids with at least one ticker whose
+        sentiment did not reach the store.
+        """
+        urls = [article.get("full_url", "") for article in articles]
+        texts = self.fetcher.fetch_many(urls)
+
+        by_ticker = defaultdict(lambda: ([], [], []))
+        for article in articles:
+            url = article.get("full_url", "")
+            news = {
+                "title": article.get("title", ""),
+                "description": article.get("description", ""),
+                "url": url
+            }
+            for ticker in article.get("tickers") or []:
+                items, contents, ids = by_ticker[ticker]
+                items.append(dict(news))
+                contents.append(texts.get(url, ""))
+                ids.append(article["_id"])
+
+        unstored = set()
+        for ticker, (items, contents, ids) in by_ticker.items():
+            classify_articles(self.llm, ticker, items, contents,
+                              store=self.store, clusters=self.clusters,
+                              scheduler=self.scheduler, priority=PRIORITY_LOW)
+            record_ids = {}
+            for news, content, article_id in zip(items, contents, ids):
+                text = build_article_text(news, content)
+                # Articles without any text are never classified, so there is nothing to store.
+                if text.strip():
+                    record_ids[self.store.record_id(news["url"], ticker, text)] = article_id
+            stored = self.store.get_many(list(record_ids))
+            unstored.update(article_id for record_id, article_id in record_ids.items() if record_id not in stored)
+        return unstored
+
+    def record_outcomes(self, source, articles, unstored):
+        """Queues unstored articles for a retry and forgets retried ones that succeeded."""
+        now = time.time()
+        for article in articles:
+            key = f"{source}:{article['_id']}"
+            if article["_id"] not in unstored:
+                continue
+            doc = self.retries.find_one_and_update(
+                {"_id": key},
+                {"$set": {"source": source, "article_id": article["_id"], "updated_at": datetime.now()},
+                 "$inc": {"attempts": 1}},
+                upsert=True,
+                return_document=pymongo.ReturnDocument.AFTER
+            )
+            attempts = doc.get("attempts", 1)
+            if attempts >= SENTIMENT_MAX_ATTEMPTS:
+                logger.warning(f"{source}: giving up on article {article['_id']} after {attempts} attempts")
+            self.retries.update_one({"_id": key},
+                                    {"$set": {"retry_at": now + SENTIMENT_RETRY_BASE * 2 ** (attempts - 1)}})
+        done = [f"{source}:{article['_id']}" for article in articles if article["_id"] not in unstored]
+        if done:
+            self.retries.delete_many({"_id": {"$in": done}})
+
+    def retry_batch(self, source):
+        """Articles of a source whose earlier attempt failed and whose backoff has passed."""
+        due = self.retries.find({
+            "source": source,
+            "attempts": {"$lt": SENTIMENT_MAX_ATTEMPTS},
+            "retry_at": {"$lte": time.time()}
+        }).limit(self.batch_size)
+        article_ids = [doc["article_id"] for doc in due]
+        if not article_ids:
+            return []
+        return list(self.news_collections[source].find({"_id": {"$in": article_ids}}, ARTICLE_PROJECTION))
+
+    def retry_failed(self):
+        """Reprocesses due retries of every source; returns how many were attempted."""
+        attempted = 0
+        for source in self.news_collections:
+            articles = self.retry_batch(source)
+            if articles:
+                self.record_outcomes(source, articles, self.process_articles(articles))
+                attempted += len(articles)
+        return attempted
+
+    def refresh_trending(self):
+        """Recomputes the trending snapshots served by the web app once they are due."""
+        if time.monotonic() - self._trending_refreshed_at < TRENDING_SNAPSHOT_TTL:
+            return
+        self._trending_refreshed_at = time.monotonic()
+        try:
+            refresh_trending_snapshots(self.db)
+        except Exception as e:
+            logger.error(f"Error refreshing trending snapshots: {str(e)}")
+
+    def sync_semantic_index(self):
+        """Embeds every article (tagged or not) added since the last sync into the semantic index."""
+        if self.semantic_index is None:
+            return 0
+        try:
+            return self.semantic_index.sync(self.news_collections, fetcher=self.fetcher)
+        except Exception as e:
+            logger.error(f"Error updating semantic news index: {str(e)}")
+            return 0
+
+    def poll_once(self):
+        """Processes one batch per source; returns the number of articles handled."""
+        self.sync_semantic_index()
+        self.refresh_trending()
+        self.retry_failed()
+        processed = 0
+        for source in self.news_collections:
+            articles = self.next_batch(source)
+            if not articles:
+                continue
+            unstored = self.process_articles(articles)
+            # Failed articles are tracked in the retry collection, so the watermark can move past them.
+            self.record_outcomes(source, articles, unstored)
+            processed += len(articles)
+            last = articles[-1]
+            self.save_watermark(source, last["post_time"], last["_id"])
+            logger.info(f"{source}: classified {len(articles) - len(unstored)} of {len(articles)} articles "
+                        f"up to post_time {last['post_time']}")
+        return processed
+
+    def catch_up(self):
+        while self.poll_once():
+            pass
+
+    def run_polling(self, interval):
+        while True:
+            try:
+                if not self.poll_once():
+                    time.sleep(interval)
+            except pymongo.errors.PyMongoError as e:
+                logger.error(f"Mongo error while polling: {str(e)}")
+                time.sleep(interval)
+
+    def run_change_streams(self, flush_seconds=5):
+        """Catches up by polling, then classifies inserts as change events arrive."""
+        self.catch_up()
+        sources_by_collection = {name: source for source, name in NEWS_COLLECTION_NAMES.items()}
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "ns.coll": {"$in": list(sources_by_collection)}
+        }}]
+        pending = defaultdict(list)
+        last_flush = last_retry = time.monotonic()
+        with self.db.watch(pipeline, full_document="updateLookup") as stream:
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    document = change.get("fullDocument") or {}
+                    if document.get("tickers") and "post_time" in document:
+                        pending[sources_by_collection[change["ns"]["coll"]]].append(document)
+                buffered = sum(len(docs) for docs in pending.values())
+                if buffered and (buffered >= self.batch_size or time.monotonic() - last_flush >= flush_seconds):
+                    for source, documents in pending.items():
+                        documents.sort(key=lambda doc: (doc["post_time"], doc["_id"]))
+                        self.record_outcomes(source, documents, self.process_articles(documents))
+                        self.save_watermark(source, documents[-1]["post_time"], documents[-1]["_id"])
+                        logger.info(f"{source}: classified {len(documents)} streamed articles")
+                    pending.clear()
+                    self.sync_semantic_index()
+                    last_flush = time.monotonic()
+                elif change is None:
+                    self.refresh_trending()
+                    if time.monotonic() - last_retry >= SENTIMENT_RETRY_BASE:
+                        self.retry_failed()
+                        last_retry = time.monotonic()
+                    time.sleep(0.5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute news sentiment in the background.")
+    parser.add_argument("--mode", choices=["auto", "poll", "changestream"], default="auto",
+                        help="auto uses change streams when available and falls back to polling")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between polls when idle")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--backfill-days", type=int, default=30,
+                        help="how far back to start on the first run")
+    parser.add_argument("--once", action="store_true", help="catch up once and exit")
+    parser.add_argument("--no-semantic-index", action="store_true",
+                        help="do not maintain the FAISS semantic news index")
+    args = parser.parse_args()
+
+    load_dotenv()
+    os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", "credentials.json")
+
+    client = pymongo.MongoClient(os.getenv("MONGODB_URI"),
+                                 maxPoolSize=10,
+                                 connectTimeoutMS=5000,
+                                 serverSelectionTimeoutMS=5000)
+    db = client["Soni_Agent"]
+
+    llm = create_llm()
+    if llm is None:
+        raise SystemExit("LLM is not available; the sentiment worker cannot run")
+
+    clusters = ArticleClusterIndex(db[ARTICLE_CLUSTER_COLLECTION])
+    clusters.rebuild_bands()
+
+    worker = SentimentWorker(
+        db,
+        llm,
+        ArticleFetcher(cache=ArticleTextCache()),
+        SentimentStore(db[SENTIMENT_COLLECTION], LLM_MODEL, SENTIMENT_PROMPT_VERSION),
+        batch_size=args.batch_size,
+        backfill_days=args.backfill_days,
+        semantic_index=None if args.no_semantic_index else SemanticNewsIndex(),
+        clusters=clusters,
+        scheduler=LLMScheduler(create_quota_state())
+    )
+
+    if args.once:
+        worker.catch_up()
+        return
+
+    if args.mode in ("auto", "changestream"):
+        try:
+            worker.run_change_streams()
+            return
+        except pymongo.errors.PyMongoError as e:
+            if args.mode == "changestream":
+                raise
+            logger.warning(f"Change streams unavailable ({str(e)}), falling back to polling")
+    worker.run_polling(args.interval)
+
+if __name__ == "__main__":
+    main()
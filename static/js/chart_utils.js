@@ -125,6 +125,53 @@ async function fetchStockData(endpoint, params = {}) {
     }
 }
 
+// Chuyển dữ liệu giá dạng cột (time, open, high, low, close, volume) thành các dãy điểm cho biểu đồ
+function expandHistory(data) {
+    const line = [];
+    const candle = [];
+    const volume = [];
+    const times = (data && data.time) || [];
+    for (let i = 0; i < times.length; i++) {
+        const time = times[i];
+        const open = data.open[i];
+        const close = data.close[i];
+        if (close !== null) {
+            line.push({ time, value: close });
+        }
+        if (open !== null && close !== null) {
+            candle.push({ time, open, high: data.high[i], low: data.low[i], close });
+        }
+        if (data.volume[i] !== null) {
+            volume.push({ time, value: data.volume[i] });
+        }
+    }
+    return { line, candle, volume };
+}
+
+// Chuyển ma trận lợi nhuận năm x tháng thành các ô của biểu đồ nhiệt
+function expandMonthlyReturns(data) {
+    const heatmap = [];
+    const years = (data && data.years) || [];
+    const months = (data && data.months) || [];
+    years.forEach((year, row) => {
+        months.forEach((month, col) => {
+            const value = data.values[row][col];
+            if (value !== null) {
+                heatmap.push({ x: month, y: year, value, formattedValue: `${(value * 100).toFixed(2)}%` });
+            }
+        });
+    });
+    return { ...data, heatmap };
+}
+
+// Ghép nhãn và tỷ lệ sở hữu thành danh sách cổ đông
+function expandShareholders(data) {
+    const labels = (data && data.labels) || [];
+    return {
+        shareholders: labels.map((category, i) => ({ category, value: data.values[i] }))
+    };
+}
+
 // Hiển thị thông báo lỗi
 function showError(containerId, message) {
     const container = document.getElementById(containerId);
@@ -186,11 +186,11 @@ async function loadCombinedChart(containerId, symbol, startDate = null, endDate
         }
 
         // Lấy dữ liệu từ API
-        const data = await fetchStockData('stock/history', {
+        const data = expandHistory(await fetchStockData('stock/history', {
             symbol,
             start_date: startDate,
             end_date: endDate
-        });
+        }));
 
         // Kiểm tra dữ liệu
         if (!data || !data.candle || data.candle.length === 0) {
@@ -238,11 +238,11 @@ async function loadMonthlyReturnsHeatmap(containerId, symbol, startDate = null,
         }
 
         // Lấy dữ liệu từ API
-        const data = await fetchStockData('stock/monthly_returns', {
+        const data = expandMonthlyReturns(await fetchStockData('stock/monthly_returns', {
             symbol,
             start_date: startDate,
             end_date: endDate
-        });
+        }));
 
         // Kiểm tra dữ liệu
         if (!data || !data.heatmap || data.heatmap.length === 0) {
@@ -117,9 +117,9 @@ async function loadShareholdersPieChart(containerId, symbol, options = {}) {
         showLoading(containerId);
 
         // Lấy dữ liệu từ API
-        const data = await fetchStockData('stock/shareholders', {
+        const data = expandShareholders(await fetchStockData('stock/shareholders', {
             symbol
-        });
+        }));
 
         // Kiểm tra dữ liệu
         if (!data || !data.shareholders || data.shareholders.length === 0) {
@@ -280,11 +280,11 @@ async function loadStockChart(containerId, symbol, chartType = 'line', startDate
         }
 
         // Lấy dữ liệu từ API
-        const data = await fetchStockData('stock/history', {
+        const data = expandHistory(await fetchStockData('stock/history', {
             symbol,
             start_date: startDate,
             end_date: endDate
-        });
+        }));
 
         // Kiểm tra dữ liệu
         if (!data || (data.line && data.line.length === 0)) {
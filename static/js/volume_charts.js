@@ -143,11 +143,11 @@ async function loadVolumeChart(containerId, symbol, startDate = null, endDate =
         }
 
         // Lấy dữ liệu từ API
-        const data = await fetchStockData('stock/history', {
+        const data = expandHistory(await fetchStockData('stock/history', {
             symbol,
             start_date: startDate,
             end_date: endDate
-        });
+        }));
 
         // Kiểm tra dữ liệu
         if (!data || (data.volume && data.volume.length === 0)) {
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+def date_tick_labels(ax, dates, max_labels=12, fmt='%Y-%m-%d', rotation=45):
+    """Labels a bar-index x axis with at most max_labels evenly spaced dates."""
+    labels = pd.to_datetime(pd.Series(dates)).dt.strftime(fmt).tolist()
+    count = len(labels)
+
+    def format_tick(value, pos):
+        index = int(round(value))
+        if 0 <= index < count and abs(value - index) < 1e-6:
+            return labels[index]
+        return ''
+
+    ax.xaxis.set_major_locator(MaxNLocator(nbins=max_labels, integer=True))
+    ax.xaxis.set_major_formatter(FuncFormatter(format_tick))
+    ax.tick_params(axis='x', labelrotation=rotation)
+
+def draw_candlesticks(ax, df, width=0.6, up_color='green', down_color='red',
+                      wick_color='black', alpha=0.8, max_labels=12):
+    """Draws OHLC candles with one PolyCollection for bodies and one LineCollection for wicks.
+
+    Bars are placed at integer x positions (0..n-1) so gaps for weekends and
+    holidays are skipped; the x axis is labelled sparsely with dates from
+    ``df['time']``. Returns the ``(bodies, wicks)`` collections.
+    """
+    opens = df['open'].to_numpy(dtype=float)
+    highs = df['high'].to_numpy(dtype=float)
+    lows = df['low'].to_numpy(dtype=float)
+    closes = df['close'].to_numpy(dtype=float)
+    count = len(opens)
+    x = np.arange(count, dtype=float)
+
+    up = closes >= opens
+    bottoms = np.minimum(opens, closes)
+    tops = np.maximum(opens, closes)
+    left = x - width / 2
+    right = x + width / 2
+
+    body_verts = np.empty((count, 4, 2))
+    body_verts[:, 0, 0] = left
+    body_verts[:, 0, 1] = bottoms
+    body_verts[:, 1, 0] = left
+    body_verts[:, 1, 1] = tops
+    body_verts[:, 2, 0] = right
+    body_verts[:, 2, 1] = tops
+    body_verts[:, 3, 0] = right
+    body_verts[:, 3, 1] = bottoms
+
+    wick_segments = np.empty((count, 2, 2))
+    wick_segments[:, 0, 0] = x
+    wick_segments[:, 0, 1] = lows
+    wick_segments[:, 1, 0] = x
+    wick_segments[:, 1, 1] = highs
+
+    colors = np.where(up, up_color, down_color)
+
+    wicks = LineCollection(wick_segments, colors=wick_color, alpha=0.7, linewidths=1)
+    bodies = PolyCollection(body_verts, facecolors=colors, edgecolors=colors,
+                            linewidths=0.5, alpha=alpha)
+    ax.add_collection(wicks)
+    ax.add_collection(bodies)
+
+    if count:
+        pad = (np.nanmax(highs) - np.nanmin(lows)) * 0.05 or 1.0
+        ax.set_ylim(np.nanmin(lows) - pad, np.nanmax(highs) + pad)
+    ax.set_xlim(-1, count)
+
+    if 'time' in df.columns:
+        date_tick_labels(ax, df['time'], max_labels=max_labels)
+
+    return bodies, wicks
@@ -0,0 +1,67 @@
+import os
+
+from models.tiered_cache import CACHE_DIR, DiskTier, MemoryTier, TieredCache
+from visualizations.render_pool import submit_charts
+
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CHART_DISK_CACHE_MAX_BYTES = int(os.getenv("CHART_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CHART_DISK_CACHE_TTL = int(os.getenv("CHART_DISK_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Rendered chart output (PNG bytes or base64). Keys are tuples that end with
+# the price store's data version, e.g.
+# ``(symbol, chart_type, start_date, end_date, interval, data_version)``, so
+# new bars change the key in every process at once; entries for old versions
+# are never hit again and leave both tiers through LRU, TTL and size eviction.
+chart_cache = TieredCache("charts", [
+    MemoryTier(CHART_CACHE_MAX_BYTES),
+    DiskTier(os.path.join(CACHE_DIR, "charts"), CHART_DISK_CACHE_TTL, CHART_DISK_CACHE_MAX_BYTES)
+])
+
+def chart_key(symbol, chart_type, start_date=None, end_date=None, interval='1D', data_version=None):
+    """Builds a cache key; returns None (never cached) when the data has no version."""
+    if data_version is None:
+        return None
+    return (symbol.upper(), chart_type, start_date, end_date, interval, data_version)
+
+def _is_cacheable(value):
+    if value is None:
+        return False
+    if isinstance(value, tuple):
+        return bool(value) and value[0] is not None
+    return True
+
+class CachedChartBatch:
+    """Serves cached charts immediately and renders only the misses.
+
+    ``keys`` maps chart names to cache keys; a missing or ``None`` key means
+    the chart is always rendered and never stored. A task may also be a
+    callable returning the ``(fn, args, kwargs)`` tuple; it is called only on
+    a miss, so inputs fetched in this process are skipped for cached charts.
+    """
+
+    def __init__(self, tasks, keys, cache=chart_cache, mode=None):
+        self.keys = keys
+        self.cache = cache
+        self.cached = {}
+        misses = {}
+        for name, task in tasks.items():
+            key = keys.get(name)
+            value = cache.get(key) if key is not None else None
+            if value is None:
+                misses[name] = task() if callable(task) else task
+            else:
+                self.cached[name] = value
+        self._batch = submit_charts(misses, mode=mode)
+
+    def results(self, timeout=None):
+        results = dict(self.cached)
+        for name, value in self._batch.results(timeout=timeout).items():
+            key = self.keys.get(name)
+            if key is not None and _is_cacheable(value):
+                self.cache.put(key, value)
+            results[name] = value
+        return results
+
+def submit_cached_charts(tasks, keys, mode=None):
+    """Like render_pool.submit_charts, but reads and fills the chart cache."""
+    return CachedChartBatch(tasks, keys, mode=mode)
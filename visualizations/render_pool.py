@@ -0,0 +1,90 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from models.lazy import lazy_singleton
+
+logger = logging.getLogger(__name__)
+
+# "process" renders charts in parallel worker processes, "sync" renders them
+# one after another in the calling thread.
+CHART_RENDER_MODE = os.getenv("CHART_RENDER_MODE", "process")
+CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", str(min(6, os.cpu_count() or 1))))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "120"))
+CHART_RENDER_START_METHOD = os.getenv("CHART_RENDER_START_METHOD") or None
+
+@lazy_singleton
+def get_render_executor():
+    """Returns the shared chart rendering process pool, creating it on first use."""
+    context = multiprocessing.get_context(CHART_RENDER_START_METHOD)
+    return ProcessPoolExecutor(max_workers=CHART_RENDER_WORKERS, mp_context=context)
+
+def shutdown_render_executor():
+    """Stops the rendering pool; a new one is created on the next submission."""
+    executor = get_render_executor.reset()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _run_task(name, func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Error rendering chart {name}: {str(e)}")
+        return None
+
+class ChartBatch:
+    """Handle for a set of charts rendering concurrently.
+
+    ``tasks`` maps a chart name to ``(func, args, kwargs)``. ``func`` must be a
+    module-level function so it can be pickled into worker processes; it
+    returns whatever the chart produces (PNG bytes, a base64 string or a
+    ``(plot_url, error)`` tuple). A chart that fails yields ``None``.
+    """
+
+    def __init__(self, tasks, mode=None):
+        self.tasks = tasks
+        self.mode = mode or CHART_RENDER_MODE
+        self._futures = {}
+        if self.mode == 'process' and tasks:
+            try:
+                executor = get_render_executor()
+                for name, (func, args, kwargs) in tasks.items():
+                    self._futures[name] = executor.submit(func, *args, **kwargs)
+            except Exception as e:
+                logger.warning(f"Falling back to synchronous chart rendering: {str(e)}")
+                self._cancel()
+
+    def _cancel(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+
+    def results(self, timeout=None):
+        """Waits for every chart and returns a dict of name -> rendered output."""
+        timeout = CHART_RENDER_TIMEOUT if timeout is None else timeout
+        results = {}
+        for name, (func, args, kwargs) in self.tasks.items():
+            future = self._futures.get(name)
+            if future is None:
+                results[name] = _run_task(name, func, args, kwargs)
+                continue
+            try:
+                results[name] = future.result(timeout=timeout)
+            except BrokenProcessPool as e:
+                logger.error(f"Render pool broke while rendering {name}: {str(e)}")
+                shutdown_render_executor()
+                results[name] = _run_task(name, func, args, kwargs)
+            except Exception as e:
+                logger.error(f"Error rendering chart {name}: {str(e)}")
+                results[name] = None
+        return results
+
+def submit_charts(tasks, mode=None):
+    """Starts rendering all charts at once and returns a ChartBatch to collect them."""
+    return ChartBatch(tasks, mode=mode)
+
+def render_charts(tasks, mode=None, timeout=None):
+    """Renders all charts concurrently and waits for them."""
+    return submit_charts(tasks, mode=mode).results(timeout=timeout)
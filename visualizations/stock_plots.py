@@ -1,137 +1,251 @@
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
+import os
+import copy
+# Matplotlib, seaborn and vnstock take seconds to import, so they are loaded
+# on first use; the backend is chosen here so it applies whenever that is.
+os.environ.setdefault('MPLBACKEND', 'Agg')
+import numpy as np
 import pandas as pd
-import seaborn as sns
 import base64
 from io import BytesIO
-from vnstock import Vnstock
+from models.indicators import IndicatorEngine, compute_indicators
+from models.monthly_returns import MonthlyReturnsStore, month_return_sums, returns_matrix
+from models.price_store import PriceStore, PRICE_STORE_DIR, CACHEABLE_INTERVALS
+from models.single_flight import SingleFlight
+from models.tiered_cache import CACHE_DIR, DiskTier, MemoryTier, TieredCache
 
-def get_stock_data(symbol, start_date, end_date, interval='1D'):
-    """Fetches historical stock data."""
+# Upstream history responses, shared by all workers. Past bars are kept by the
+# price store, so this mostly spares repeated fetches of the still-forming bar
+# and of weekly/monthly intervals; the TTL bounds how stale those can be.
+PRICE_CACHE_TTL = int(os.getenv("PRICE_CACHE_TTL", "60"))
+price_cache = TieredCache("prices", [
+    MemoryTier(int(os.getenv("PRICE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))), ttl=PRICE_CACHE_TTL),
+    DiskTier(os.path.join(CACHE_DIR, "prices"), PRICE_CACHE_TTL,
+             int(os.getenv("PRICE_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024))))
+])
+
+def get_vnstock():
+    """Returns a Vnstock client, importing vnstock on first use."""
+    from vnstock import Vnstock
+    return Vnstock()
+
+def new_figure(**kwargs):
+    """Creates a matplotlib Figure, importing matplotlib on first use."""
+    from matplotlib.figure import Figure
+    return Figure(**kwargs)
+
+def fetch_stock_history(symbol, start_date, end_date, interval='1D'):
+    """Fetches historical stock data directly from vnstock."""
     try:
-        stock = Vnstock().stock(symbol=symbol, source="VCI")
+        stock = get_vnstock().stock(symbol=symbol, source="VCI")
         df = stock.quote.history(start=start_date, end=end_date, interval=interval)
         return df
     except Exception as e:
         print(f"Error fetching stock data: {str(e)}")
         return None
 
-def plot_volume_chart(symbol, start_date, end_date, interval='1D', save_path=None):
+def cached_fetch_stock_history(symbol, start_date, end_date, interval='1D'):
+    """fetch_stock_history through price_cache; returns a copy callers may modify."""
+    key = (symbol.upper(), str(start_date), str(end_date), interval)
+    df = price_cache.get(key)
+    if df is None:
+        df = fetch_stock_history(symbol, start_date, end_date, interval)
+        if df is None:
+            return None
+        price_cache.put(key, df)
+    return df.copy()
+
+price_store = PriceStore(PRICE_STORE_DIR, cached_fetch_stock_history)
+
+# Concurrent requests for the same data (e.g. many users opening a trending
+# ticker) wait for one upstream call; each caller gets its own copy.
+stock_data_flight = SingleFlight("stock_data", copy=copy.deepcopy)
+shareholders_flight = SingleFlight("shareholders", copy=copy.deepcopy)
+internal_reports_flight = SingleFlight("internal_reports", copy=copy.deepcopy)
+
+def get_stock_data(symbol, start_date, end_date, interval='1D'):
+    """Fetches historical stock data, served from the local price store when possible."""
+    return stock_data_flight.do((symbol.upper(), str(start_date), str(end_date), interval),
+                                _load_stock_data, symbol, start_date, end_date, interval)
+
+def _load_stock_data(symbol, start_date, end_date, interval):
+    try:
+        return price_store.get_range(symbol, start_date, end_date, interval)
+    except Exception as e:
+        print(f"Error reading price store: {str(e)}")
+        return cached_fetch_stock_history(symbol, start_date, end_date, interval)
+
+indicator_engine = IndicatorEngine()
+monthly_returns_store = MonthlyReturnsStore(price_store)
+
+def get_indicators(symbol, df, interval='1D'):
+    """Returns a frame of technical indicators aligned with the rows of df.
+
+    Stored series are computed over their whole history, so averages are warmed
+    up before the first requested bar, and cached per (symbol, interval) with
+    incremental updates; other frames are computed directly.
+    """
+    times = df['time'].to_numpy().astype('datetime64[ns]').astype('i8')
+    values = None
+    if interval in CACHEABLE_INTERVALS and len(times):
+        try:
+            bars = price_store.read_bars(symbol, interval)
+            series_times, series_values = indicator_engine.compute(
+                (symbol.upper(), interval), bars['time'], bars['high'], bars['low'], bars['close']
+            )
+            positions = np.minimum(np.searchsorted(series_times, times), max(len(series_times) - 1, 0))
+            if len(series_times) and np.array_equal(series_times[positions], times):
+                values = {name: column[positions] for name, column in series_values.items()}
+        except Exception as e:
+            print(f"Error computing stored indicators: {str(e)}")
+    if values is None:
+        values = compute_indicators(df)
+    return pd.DataFrame(values, index=df.index)
+
+def get_data_version(symbol, interval='1D'):
+    """Returns the price store version of a series, or None when it is not stored locally."""
+    try:
+        return price_store.data_version(symbol, interval)
+    except Exception as e:
+        print(f"Error reading price store version: {str(e)}")
+        return None
+
+def get_data_last_modified(symbol, interval='1D'):
+    """Returns when a stored series last changed (Unix timestamp), or None."""
+    try:
+        return price_store.last_modified(symbol, interval)
+    except Exception as e:
+        print(f"Error reading price store metadata: {str(e)}")
+        return None
+
+def is_range_stored(symbol, start_date, end_date, interval='1D'):
+    """True when the price store already holds every day of the range."""
+    try:
+        return price_store.covers(symbol, start_date, end_date, interval)
+    except Exception as e:
+        print(f"Error reading price store metadata: {str(e)}")
+        return False
+
+class StockDataContext:
+    """Loads the price frame for a single request once and shares it between plots."""
+
+    def __init__(self, symbol, start_date, end_date, interval='1D'):
+        self.symbol = symbol
+        self.start_date = start_date
+        self.end_date = end_date
+        self.interval = interval
+        self._df = None
+        self._loaded = False
+
+    def get_data(self):
+        """Returns a private copy of the frame so callers can mutate it freely."""
+        if not self._loaded:
+            self._df = get_stock_data(self.symbol, self.start_date, self.end_date, self.interval)
+            self._loaded = True
+        if self._df is None:
+            return None
+        return self._df.copy()
+
+    def load(self):
+        """Fetches the frame now so the context can be shipped to render workers."""
+        self.get_data()
+        return self
+
+def load_stock_data(symbol, start_date, end_date, interval='1D', context=None):
+    """Returns stock data from the request context when given, otherwise fetches it."""
+    if context is not None:
+        return context.get_data()
+    return get_stock_data(symbol, start_date, end_date, interval)
+
+def figure_to_png(fig, **savefig_kwargs):
+    """Renders a Figure to PNG bytes without touching pyplot state."""
+    img = BytesIO()
+    fig.savefig(img, format='png', **savefig_kwargs)
+    return img.getvalue()
+
+def _finish_figure(fig, save_path):
+    """Saves a Figure to save_path, or returns it as a base64 PNG."""
+    if save_path:
+        fig.savefig(save_path)
+        return save_path, None
+    plot_url = base64.b64encode(figure_to_png(fig)).decode('utf-8')
+    return plot_url, None
+
+def plot_volume_chart(symbol, start_date, end_date, interval='1D', save_path=None, context=None):
     """Plots the volume chart for a given stock symbol."""
-    df = get_stock_data(symbol, start_date, end_date, interval)
+    df = load_stock_data(symbol, start_date, end_date, interval, context)
     if df is None or df.empty:
         return None, "Không thể lấy dữ liệu cổ phiếu"
     
-    plt.figure(figsize=(10, 5))
-    plt.bar(df['time'], df['volume'], color='g', alpha=0.7)
-    plt.title(f'Biểu đồ khối lượng giao dịch - {symbol}')
-    plt.xlabel('Ngày')
-    plt.ylabel('Khối lượng')
-    plt.grid(alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    fig = new_figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.bar(df['time'], df['volume'], color='g', alpha=0.7)
+    ax.set_title(f'Biểu đồ khối lượng giao dịch - {symbol}')
+    ax.set_xlabel('Ngày')
+    ax.set_ylabel('Khối lượng')
+    ax.grid(alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
     
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        return save_path, None
-    else:
-        img = BytesIO()
-        plt.savefig(img, format='png')
-        plt.close()
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-        return plot_url, None
-
-def plot_line_chart(symbol, start_date, end_date, interval='1D', save_path=None):
+    return _finish_figure(fig, save_path)
+
+def plot_line_chart(symbol, start_date, end_date, interval='1D', save_path=None, context=None):
     """Plots the line chart for a given stock symbol."""
-    df = get_stock_data(symbol, start_date, end_date, interval)
+    df = load_stock_data(symbol, start_date, end_date, interval, context)
     if df is None or df.empty:
         return None, "Không thể lấy dữ liệu cổ phiếu"
     
-    plt.figure(figsize=(10, 5))
-    plt.plot(df['time'], df['close'], label=symbol, color='b')
-    plt.title(f'Biểu đồ giá đóng cửa - {symbol}')
-    plt.xlabel('Ngày')
-    plt.ylabel('Giá đóng cửa')
-    plt.legend()
-    plt.grid(alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    indicators = get_indicators(symbol, df, interval)
     
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        return save_path, None
-    else:
-        img = BytesIO()
-        plt.savefig(img, format='png')
-        plt.close()
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-        return plot_url, None
-
-def plot_candlestick(symbol, start_date, end_date, interval='1D', save_path=None):
+    fig = new_figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(df['time'], df['close'], label=symbol, color='b')
+    for column in indicators.columns:
+        if column.startswith('sma_'):
+            ax.plot(df['time'], indicators[column], label=column.replace('sma_', 'MA'), linewidth=1)
+        elif column.startswith('bollinger_upper_'):
+            lower = indicators[column.replace('upper', 'lower')]
+            ax.fill_between(df['time'], lower, indicators[column], color='gray', alpha=0.15, label='Bollinger')
+    ax.set_title(f'Biểu đồ giá đóng cửa - {symbol}')
+    ax.set_xlabel('Ngày')
+    ax.set_ylabel('Giá đóng cửa')
+    ax.legend()
+    ax.grid(alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    
+    return _finish_figure(fig, save_path)
+
+def plot_candlestick(symbol, start_date, end_date, interval='1D', save_path=None, context=None):
     """Plots the candlestick chart for a given stock symbol using matplotlib."""
-    df = get_stock_data(symbol, start_date, end_date, interval)
+    df = load_stock_data(symbol, start_date, end_date, interval, context)
     if df is None or df.empty:
         return None, "Không thể lấy dữ liệu cổ phiếu"
     
-    df['time'] = pd.to_datetime(df['time'])
+    from visualizations.candlestick import draw_candlesticks
     
-    fig, ax = plt.subplots(figsize=(12, 6))
-    
-    width = 0.6
-    width2 = 0.1
-    
-    up_color = 'green'
-    down_color = 'red'
+    df['time'] = pd.to_datetime(df['time'])
     
-    for i, (idx, row) in enumerate(df.iterrows()):
-        if row['close'] >= row['open']:
-            color = up_color
-            bottom = row['open']
-            height = row['close'] - row['open']
-        else:
-            color = down_color
-            bottom = row['close']
-            height = row['open'] - row['close']
-        
-        rect = plt.Rectangle((i-width/2, bottom), width, height, 
-                             fill=True, color=color, alpha=0.8)
-        ax.add_patch(rect)
-        
-        plt.plot([i, i], [row['low'], row['high']], color='black', alpha=0.7)
+    fig = new_figure(figsize=(12, 6))
+    ax = fig.subplots()
     
-    plt.xticks(range(0, len(df)), [d.strftime('%Y-%m-%d') for d in df['time']], rotation=45)
-    plt.xlim(-1, len(df))
+    draw_candlesticks(ax, df, width=0.6, up_color='green', down_color='red')
     
-    plt.title(f'Biểu đồ nến - {symbol}')
-    plt.xlabel('Ngày')
-    plt.ylabel('Giá')
-    plt.grid(alpha=0.3)
-    plt.tight_layout()
+    ax.set_title(f'Biểu đồ nến - {symbol}')
+    ax.set_xlabel('Ngày')
+    ax.set_ylabel('Giá')
+    ax.grid(alpha=0.3)
+    fig.tight_layout()
     
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        return save_path, None
-    else:
-        img = BytesIO()
-        plt.savefig(img, format='png')
-        plt.close()
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-        return plot_url, None
-
-def plot_volume_and_closed_price(symbol, start_date, end_date, interval='1D', save_path=None):
+    return _finish_figure(fig, save_path)
+
+def plot_volume_and_closed_price(symbol, start_date, end_date, interval='1D', save_path=None, context=None):
     """Plots a combo chart with volume as bars and close price as a line using matplotlib."""
-    df = get_stock_data(symbol, start_date, end_date, interval)
+    df = load_stock_data(symbol, start_date, end_date, interval, context)
     if df is None or df.empty:
         return None, "Không thể lấy dữ liệu cổ phiếu"
     
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig = new_figure(figsize=(12, 6))
+    ax1 = fig.subplots()
     
     ax1.bar(df['time'], df['volume'], color='blue', alpha=0.5, label='Khối lượng')
     ax1.set_xlabel('Ngày')
@@ -143,39 +257,30 @@ def plot_volume_and_closed_price(symbol, start_date, end_date, interval='1D', sa
     ax2.set_ylabel('Giá đóng cửa', color='red')
     ax2.tick_params(axis='y', labelcolor='red')
     
-    plt.title(f'Giá đóng cửa và khối lượng giao dịch - {symbol}')
-    plt.xticks(rotation=45)
+    ax2.set_title(f'Giá đóng cửa và khối lượng giao dịch - {symbol}')
+    ax1.tick_params(axis='x', labelrotation=45)
     
     lines1, labels1 = ax1.get_legend_handles_labels()
     lines2, labels2 = ax2.get_legend_handles_labels()
     ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
     
-    plt.grid(alpha=0.3)
-    plt.tight_layout()
+    ax2.grid(alpha=0.3)
+    fig.tight_layout()
     
-    if save_path:
-        plt.savefig(save_path)
-        plt.close()
-        return save_path, None
-    else:
-        img = BytesIO()
-        plt.savefig(img, format='png')
-        plt.close()
-        img.seek(0)
-        plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-        return plot_url, None
-
-def plot_shareholders_piechart(symbol, save_path=None):
-    """Plots a pie chart of shareholders for a given stock symbol."""
+    return _finish_figure(fig, save_path)
+
+def get_shareholders_breakdown(symbol, threshold=0.03):
+    """Returns shareholders above threshold plus a grouped 'Khác' row, with share_own_percent in percent."""
+    return shareholders_flight.do((symbol.upper(), threshold), _load_shareholders_breakdown, symbol, threshold)
+
+def _load_shareholders_breakdown(symbol, threshold):
     try:
-        company = Vnstock().stock(symbol=symbol, source="VCI").company
+        company = get_vnstock().stock(symbol=symbol, source="VCI").company
         shareholders_df = company.shareholders()
         
         if shareholders_df is None or shareholders_df.empty:
             return None, "Không thể lấy dữ liệu cổ đông"
         
-        threshold = 0.03  
-        
         total_quantity = shareholders_df['quantity'].sum()
         shareholders_df['share_own_percent'] = shareholders_df['quantity'] / total_quantity
         
@@ -191,14 +296,33 @@ def plot_shareholders_piechart(symbol, save_path=None):
         
         major_shareholders['share_own_percent'] = (major_shareholders['quantity'] / major_shareholders['quantity'].sum()) * 100
         
-        fig, ax = plt.subplots(figsize=(10, 6))
+        return major_shareholders, None
+    except Exception as e:
+        return None, f"Lỗi khi lấy dữ liệu cổ đông: {str(e)}"
+
+def plot_shareholders_piechart(symbol, save_path=None, breakdown=None):
+    """Plots a pie chart of shareholders for a given stock symbol.
+
+    breakdown is a (data, error) pair from get_shareholders_breakdown; pass it
+    when the chart is rendered in another process so the fetch is coalesced
+    in the caller's.
+    """
+    try:
+        major_shareholders, error = breakdown if breakdown is not None else get_shareholders_breakdown(symbol)
+        if major_shareholders is None:
+            return None, error
+        
+        import matplotlib
+        
+        fig = new_figure(figsize=(10, 6))
+        ax = fig.subplots()
         explode = [0.1 if label == 'Khác' else 0 for label in major_shareholders['share_holder']]
         
         ax.pie(
             major_shareholders['share_own_percent'],
             labels=major_shareholders['share_holder'],
             autopct='%1.1f%%',
-            colors=plt.cm.Paired.colors,
+            colors=matplotlib.colormaps['Paired'].colors,
             startangle=140,
             pctdistance=0.8,
             labeldistance=1.1,
@@ -206,41 +330,36 @@ def plot_shareholders_piechart(symbol, save_path=None):
         )
         
         ax.set_title(f"Cổ đông lớn {symbol}")
-        plt.tight_layout()
+        fig.tight_layout()
         
-        if save_path:
-            plt.savefig(save_path)
-            plt.close()
-            return save_path, None
-        else:
-            img = BytesIO()
-            plt.savefig(img, format='png')
-            plt.close()
-            img.seek(0)
-            plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-            return plot_url, None
+        return _finish_figure(fig, save_path)
     except Exception as e:
         return None, f"Lỗi khi tạo biểu đồ cổ đông: {str(e)}"
 
-def plot_monthly_returns_heatmap(symbol, start_date, end_date, interval='1D', save_path=None):
+def compute_monthly_returns(df, symbol=None, interval='1D'):
+    """Returns a year x month DataFrame of mean daily returns (as fractions).
+
+    With a symbol, whole months come from the shared monthly returns store
+    instead of being regrouped from the frame.
+    """
+    if symbol is not None:
+        try:
+            return monthly_returns_store.matrix(symbol, df, interval)
+        except Exception as e:
+            print(f"Error reading monthly returns store: {str(e)}")
+    times = df['time'].to_numpy().astype('datetime64[ns]')
+    return returns_matrix(*month_return_sums(times, df['close'].to_numpy(dtype=float)))
+
+def plot_monthly_returns_heatmap(symbol, start_date, end_date, interval='1D', save_path=None, context=None):
     """Creates a heatmap of monthly average returns for a given stock symbol."""
-    df = get_stock_data(symbol, start_date, end_date, interval)
+    df = load_stock_data(symbol, start_date, end_date, interval, context)
     if df is None or df.empty:
         return None, "Không thể lấy dữ liệu cổ phiếu"
     
     try:
-        df['time'] = pd.to_datetime(df['time'])
-        df.set_index('time', inplace=True)
-        
-        df['returns'] = df['close'].pct_change() * 100
+        import seaborn as sns
         
-        return_pivot = pd.pivot_table(
-            df, 
-            index=df.index.year, 
-            columns=df.index.month, 
-            values='returns', 
-            aggfunc='mean'
-        )
+        return_pivot = compute_monthly_returns(df, symbol, interval) * 100
         
         month_names = {
             1: 'Tháng 1', 2: 'Tháng 2', 3: 'Tháng 3', 4: 'Tháng 4',
@@ -249,37 +368,32 @@ def plot_monthly_returns_heatmap(symbol, start_date, end_date, interval='1D', sa
         }
         return_pivot.columns = [month_names.get(col, col) for col in return_pivot.columns]
         
-        plt.figure(figsize=(12, 8))
+        fig = new_figure(figsize=(12, 8))
+        ax = fig.subplots()
         
         sns.heatmap(
             return_pivot, 
             annot=True, 
             cmap='RdYlGn', 
             center=0, 
-            fmt='.2f'
+            fmt='.2f',
+            ax=ax
         )
         
-        plt.title(f'Lợi nhuận trung bình hàng tháng - {symbol} ({start_date} đến {end_date})', fontsize=15)
-        plt.xlabel('Tháng', fontsize=12)
-        plt.ylabel('Năm', fontsize=12)
-        plt.tight_layout()
+        ax.set_title(f'Lợi nhuận trung bình hàng tháng - {symbol} ({start_date} đến {end_date})', fontsize=15)
+        ax.set_xlabel('Tháng', fontsize=12)
+        ax.set_ylabel('Năm', fontsize=12)
+        fig.tight_layout()
         
-        if save_path:
-            plt.savefig(save_path)
-            plt.close()
-            return save_path, None
-        else:
-            img = BytesIO()
-            plt.savefig(img, format='png')
-            plt.close()
-            img.seek(0)
-            plot_url = base64.b64encode(img.getvalue()).decode('utf-8')
-            return plot_url, None
+        return _finish_figure(fig, save_path)
     except Exception as e:
         return None, f"Lỗi khi tạo biểu đồ heatmap: {str(e)}"
 
 def get_internal_reports(symbol):
     """Fetches internal reports for a given stock symbol."""
+    return internal_reports_flight.do(symbol.upper(), _load_internal_reports, symbol)
+
+def _load_internal_reports(symbol):
     try:
         from vnstock.explorer.vci import Company
         company = Company(symbol)